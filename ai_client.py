@@ -0,0 +1,338 @@
+"""
+AI proposal generation client.
+
+Wraps the chat-completion call behind a small backend interface so the app
+can stream tokens as they arrive, reuse earlier replies from a persistent
+cache (keyed by a hash of the prompt and model parameters) and bound each
+request with a timeout and retry-with-backoff policy. ``StubBackend`` stands
+in for the API in tests and offline runs, and ``HTTPBackend`` talks to any
+OpenAI-compatible endpoint such as mock_completion_server.py.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import Future
+
+from metrics import estimate_tokens, increment, registry, span
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ai_responses")
+
+AIParams = namedtuple("AIParams", ["model", "max_tokens", "temperature"])
+DEFAULT_PARAMS = AIParams("gpt-3.5-turbo", 1500, 0.7)
+
+RetryPolicy = namedtuple("RetryPolicy", ["timeout", "max_retries", "backoff", "max_backoff"])
+DEFAULT_RETRY = RetryPolicy(timeout=60, max_retries=3, backoff=1.0, max_backoff=20.0)
+
+
+class AIGenerationError(RuntimeError):
+    """Raised when a completion still fails after all retries."""
+
+
+# ----------------- Backends -----------------
+class OpenAIBackend:
+    """
+    Streams chat completions from the OpenAI API (openai>=0.27 interface).
+    """
+
+    name = "openai"
+    RETRYABLE = {"Timeout", "APIError", "APIConnectionError", "RateLimitError", "ServiceUnavailableError", "TryAgain"}
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+
+    def stream(self, prompt, params, timeout):
+        import openai
+
+        response = openai.ChatCompletion.create(
+            model=params.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=params.max_tokens,
+            temperature=params.temperature,
+            stream=True,
+            request_timeout=timeout,
+            api_key=self.api_key,
+        )
+        for chunk in response:
+            delta = chunk.choices[0].delta
+            text = delta.get("content") if hasattr(delta, "get") else getattr(delta, "content", None)
+            if text:
+                yield text
+
+    def is_retryable(self, exc):
+        return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in self.RETRYABLE
+
+
+class HTTPBackend:
+    """
+    Streams chat completions from an OpenAI-compatible HTTP endpoint
+    (``{base_url}/chat/completions`` with server-sent events). Used for
+    self-hosted models and for the local mock completion server.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url, api_key=None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+    def stream(self, prompt, params, timeout):
+        body = json.dumps({
+            "model": params.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": params.max_tokens,
+            "temperature": params.temperature,
+            "stream": True,
+        }).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(f"{self.base_url}/chat/completions", data=body, headers=headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            for raw in response:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                text = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if text:
+                    yield text
+
+    def is_retryable(self, exc):
+        if isinstance(exc, urllib.error.HTTPError):
+            return exc.code == 429 or exc.code >= 500
+        return isinstance(exc, (TimeoutError, ConnectionError, urllib.error.URLError))
+
+
+class StubBackend:
+    """
+    Offline backend that streams a canned reply word by word. ``reply`` may be
+    a string or a callable taking the prompt; ``failures`` makes the first N
+    calls raise ConnectionError to exercise the retry path.
+    """
+
+    name = "stub"
+
+    def __init__(self, reply=None, delay=0.0, failures=0):
+        self.reply = reply
+        self.delay = delay
+        self.failures = failures
+        self.calls = 0
+
+    def stream(self, prompt, params, timeout):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Stub backend failure.")
+        if callable(self.reply):
+            text = self.reply(prompt)
+        elif self.reply is not None:
+            text = self.reply
+        else:
+            text = f"[stub {params.model}] Proposal draft for a {len(prompt)}-character prompt."
+        for word in text.split(" "):
+            if self.delay:
+                time.sleep(self.delay)
+            yield word + " "
+
+    def is_retryable(self, exc):
+        return True
+
+
+def make_backend(name=None, api_key=None, base_url=None):
+    """
+    Builds the backend named by ``name`` or the PROPOSAL_AI_BACKEND
+    environment variable (default "openai"). The "http" backend reads its
+    endpoint from ``base_url`` or PROPOSAL_AI_BASE_URL.
+    """
+    name = name or os.environ.get("PROPOSAL_AI_BACKEND", "openai")
+    if name == "openai":
+        return OpenAIBackend(api_key)
+    if name == "http":
+        base_url = base_url or os.environ.get("PROPOSAL_AI_BASE_URL")
+        if not base_url:
+            raise ValueError("The http AI backend needs a base_url (or PROPOSAL_AI_BASE_URL).")
+        return HTTPBackend(base_url, api_key)
+    if name == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown AI backend {name!r}.")
+
+
+def settings_from_mapping(settings):
+    """
+    Reads optional overrides (backend, base_url, model, max_tokens,
+    temperature, timeout, max_retries, backoff) from a mapping such as
+    ``st.secrets["openai"]``.
+
+    Returns: backend, AIParams, RetryPolicy
+    """
+    backend = make_backend(settings.get("backend"), settings.get("api_key"), settings.get("base_url"))
+    params = AIParams(
+        settings.get("model", DEFAULT_PARAMS.model),
+        int(settings.get("max_tokens", DEFAULT_PARAMS.max_tokens)),
+        float(settings.get("temperature", DEFAULT_PARAMS.temperature)),
+    )
+    retry = RetryPolicy(
+        float(settings.get("timeout", DEFAULT_RETRY.timeout)),
+        int(settings.get("max_retries", DEFAULT_RETRY.max_retries)),
+        float(settings.get("backoff", DEFAULT_RETRY.backoff)),
+        DEFAULT_RETRY.max_backoff,
+    )
+    return backend, params, retry
+
+
+# ----------------- Persistent Response Cache -----------------
+def cache_key(prompt, params):
+    blob = json.dumps({"prompt": prompt, "params": params._asdict()}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    One JSON file per completed reply under ``directory``. Writes go through a
+    temp file and os.replace, so concurrent sessions never read a partial
+    entry.
+    """
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)["text"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, text, params):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(key) + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"text": text, "params": params._asdict(), "created": time.time()}, f)
+        os.replace(tmp, self._path(key))
+
+
+# ----------------- Generation -----------------
+# cache key -> Future for the reply of the request currently calling the backend.
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def generate_completion(prompt, backend, params=DEFAULT_PARAMS, cache=None, retry=DEFAULT_RETRY, on_text=None):
+    """
+    Returns ``(text, cached)`` for a prompt.
+
+    A cached reply is returned without calling the backend. Otherwise the
+    reply is streamed and ``on_text`` is called with the accumulated text
+    after every chunk. Retryable failures restart the request after an
+    exponential backoff. Identical prompts in flight at the same time (a
+    double-clicked button) wait for the first one and share its reply (or
+    its error) rather than paying twice; they count as cached.
+    """
+    key = cache_key(prompt, params)
+    if cache is not None:
+        text = cache.get(key)
+        if text is not None:
+            increment("ai_cache_hits", model=params.model)
+            return text, True
+
+    with _inflight_lock:
+        reply = _inflight.get(key)
+        owner = reply is None
+        if owner:
+            reply = _inflight[key] = Future()
+    if not owner:
+        text = reply.result()
+        if on_text is not None:
+            on_text(text)
+        return text, True
+
+    # Only the owner removes the entry, and only once waiters can read the outcome from it.
+    try:
+        text, cached = _complete(key, prompt, backend, params, cache, retry, on_text)
+    except BaseException as exc:
+        reply.set_exception(exc)
+        raise
+    else:
+        reply.set_result(text)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    return text, cached
+
+
+def _complete(key, prompt, backend, params, cache, retry, on_text):
+    if cache is not None:
+        # Another request may have finished and cached this reply since the first check.
+        text = cache.get(key)
+        if text is not None:
+            increment("ai_cache_hits", model=params.model)
+            return text, True
+        increment("ai_cache_misses", model=params.model)
+
+    backend_name = type(backend).__name__
+    attempt = 0
+    with span("llm_call", model=params.model, backend=backend_name):
+        while True:
+            parts = []
+            start = time.perf_counter()
+            try:
+                for chunk in backend.stream(prompt, params, retry.timeout):
+                    if not parts:
+                        registry.observe("llm_first_token", time.perf_counter() - start, model=params.model)
+                    parts.append(chunk)
+                    if on_text is not None:
+                        on_text("".join(parts))
+                break
+            except Exception as exc:
+                if attempt >= retry.max_retries or not backend.is_retryable(exc):
+                    increment("ai_failures", model=params.model)
+                    raise AIGenerationError(f"AI generation failed after {attempt + 1} attempt(s): {exc}") from exc
+                increment("ai_retries", model=params.model)
+                time.sleep(min(retry.backoff * 2 ** attempt, retry.max_backoff))
+                attempt += 1
+
+    text = "".join(parts).strip()
+    increment("ai_prompt_tokens", estimate_tokens(prompt, params.model), model=params.model)
+    increment("ai_completion_tokens", estimate_tokens(text, params.model), model=params.model)
+    if cache is not None and text:
+        cache.put(key, text, params)
+    return text, False
+
+
+# ----------------- Section-Parallel Generation -----------------
+async def generate_sections(sections, backend, params=DEFAULT_PARAMS, cache=None, retry=DEFAULT_RETRY,
+                            concurrency=4, on_section=None):
+    """
+    Generates every ``(title, prompt)`` in ``sections`` concurrently, at most
+    ``concurrency`` at a time, so total latency tracks the slowest section
+    rather than the sum. Each section gets its own ``params.max_tokens``
+    budget and goes through generate_completion (cache, retries) on a worker
+    thread. ``on_section(index, title, text)`` fires as each one finishes.
+
+    Returns: a list of (title, text) in the original section order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(index, title, prompt):
+        async with semaphore:
+            text, _ = await asyncio.to_thread(generate_completion, prompt, backend, params, cache, retry)
+        if on_section is not None:
+            on_section(index, title, text)
+        return title, text
+
+    return list(await asyncio.gather(*(run(i, title, prompt) for i, (title, prompt) in enumerate(sections))))
+
+
+def assemble_sections(sections):
+    return "\n\n".join(f"## {title}\n\n{text}" for title, text in sections)
@@ -0,0 +1,326 @@
+"""
+Batch quote / proposal generator.
+
+Reads many project definitions from JSONL or CSV, prices their cart lines
+with the same cost logic as the app, renders the Markdown proposals across a
+process pool and streams each one to an output directory as soon as it is
+ready. Input is read lazily and only a bounded window of projects is in
+flight, so memory stays flat however large the portfolio is.
+
+    python batch_quotes.py projects.jsonl --out quotes/ --workers 8
+
+JSONL: one project per line::
+
+    {"id": "P-001", "overhead_percent": 39, "escalation_percent": 3,
+     "scope": {"Project Name": "...", "Partner Name": "...", "Estimated N": 200,
+               "Budget Estimate": 150000, "Study Length (Months)": 12, "Project Start Date": "2026-01-01"},
+     "phases": [{"Title": "Launch", "Description": "...", "DurationWeeks": 6, "DependsOn": []}],
+     "lines": [{"Category": "Data Collection & Management", "Subcategory": "Self-Reported Survey",
+                "Task": "Self-Reported Survey Administration", "Quantity": 200, "Phase": "Launch"}]}
+
+CSV: one row per cart line with a "Project ID" column; rows of a project must
+be contiguous. Scope fields use the scope column names above, line fields
+are Category, Subcategory, Task, Quantity, Phase, optional Direct Cost and
+optional Phase Weeks. A line without a Direct Cost is priced from the task
+library.
+
+A JSONL line or CSV project that can't be parsed becomes an error row in
+index.csv naming its line number, and the rest of the batch carries on.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+
+from burn import project_burn
+from cart import CartTotals
+from pricing_engine import DEFAULT_RATE_CARD, RateCard, default_templates, price_cart_lines
+from proposal import generate_proposal
+from scheduler import DependencyCycleError, plan_project
+from task_library import CATALOG_PATH, load_catalog, unpriced
+
+DEFAULT_OVERHEAD_PERCENT = 39
+SCOPE_FIELDS = ["Project Name", "Project Description", "Partner Name", "Project Type", "Estimated N",
+                "Budget Estimate", "Study Length (Months)", "Timeline", "Project Start Date", "Project Goals"]
+INDEX_FIELDS = ["id", "project_name", "partner", "lines", "direct_cost", "overhead", "total_cost", "file", "error"]
+
+# A project definition the reader couldn't parse; run_batch writes it to index.csv as an error row.
+UnreadableProject = namedtuple("UnreadableProject", ["id", "error"])
+
+
+# ----------------- Input Readers -----------------
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                project = json.loads(line)
+            except ValueError as e:
+                yield UnreadableProject("", f"Line {number}: invalid JSON ({e}).")
+                continue
+            if not isinstance(project, dict):
+                yield UnreadableProject("", f"Line {number}: a project must be an object.")
+                continue
+            yield project
+
+
+def _csv_project(project_id, group):
+    """
+    One project from its (line number, row) pairs. Raises ValueError naming
+    the line of the first row that can't be parsed.
+    """
+    first_number, first = group[0]
+    scope = {field: first[field] for field in SCOPE_FIELDS if first.get(field)}
+    phases, seen = [], set()
+    lines = []
+    for number, row in group:
+        if not row.get("Category") or not row.get("Task"):
+            raise ValueError(f"Line {number}: Category and Task are required.")
+        try:
+            phase = (row.get("Phase") or "").strip()
+            if phase and phase not in seen:
+                seen.add(phase)
+                phases.append({"Title": phase, "Description": "", "DurationWeeks": int(row.get("Phase Weeks") or 4)})
+            line = {"Category": row["Category"], "Subcategory": row.get("Subcategory", ""), "Task": row["Task"],
+                    "Quantity": _number(row.get("Quantity") or 1, 1)}
+            if phase:
+                line["Phase"] = phase
+            if row.get("Direct Cost"):
+                line["Direct Cost"] = float(row["Direct Cost"])
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Line {number}: {e}") from None
+        lines.append(line)
+    project = {"id": project_id, "scope": scope, "phases": phases, "lines": lines}
+    if first.get("Overhead Percent"):
+        try:
+            project["overhead_percent"] = float(first["Overhead Percent"])
+        except ValueError as e:
+            raise ValueError(f"Line {first_number}: {e}") from None
+    return project
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        # line_num is read as each row is produced, so it is that row's (last) line in the file.
+        rows = ((reader.line_num, row) for row in reader)
+        for project_id, group in itertools.groupby(rows, key=lambda item: item[1].get("Project ID", "")):
+            try:
+                project = _csv_project(project_id, list(group))
+            except ValueError as e:
+                yield UnreadableProject(project_id, str(e))
+                continue
+            yield project
+
+
+def read_projects(path):
+    if path.lower().endswith(".csv"):
+        return read_csv(path)
+    return read_jsonl(path)
+
+
+# ----------------- Quoting -----------------
+def _as_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)) if value else date.today()
+
+
+def _number(value, default=0):
+    try:
+        return int(value) if float(value).is_integer() else float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_scope(scope):
+    """
+    Fills in the derived scope fields the app computes on the Scope tab.
+    """
+    scope = dict(scope)
+    scope["Project Start Date"] = _as_date(scope.get("Project Start Date"))
+    scope["Study Length (Months)"] = _number(scope.get("Study Length (Months)", 12), 12)
+    scope["Budget Estimate"] = _number(scope.get("Budget Estimate", 0))
+    scope.setdefault("Project End Date", scope["Project Start Date"] + relativedelta(months=scope["Study Length (Months)"]))
+    return scope
+
+
+def layout_phases(phases, start_date):
+    """
+    Dates the phases from ``start_date`` the way the Scope tab does: end to
+    end unless a phase lists DependsOn (indices of the phases it follows).
+    """
+    rows = plan_project(start_date, phases).rows
+    laid_out = []
+    for phase, row in zip(phases, rows):
+        laid_out.append({"Title": phase.get("Title", ""), "Description": phase.get("Description", ""),
+                         "Start": row["Start"], "End": row["End"], "DurationWeeks": int(phase.get("DurationWeeks", 4))})
+    return laid_out
+
+
+def price_project_lines(lines, catalog, rate_card):
+    """
+    Returns cart entries with a Direct Cost on every line, pricing the ones
+    that don't carry one in a single vectorized call.
+    """
+    entries = [dict(line) for line in lines]
+    for entry in entries:
+        entry.setdefault("Quantity", 1)
+    todo = [i for i, entry in enumerate(entries) if entry.get("Direct Cost") in (None, "")]
+    if todo:
+        categories, subcategories, quantities, base_costs, overrides = [], [], [], [], []
+        template_priced = default_templates().template_priced
+        for i in todo:
+            entry = entries[i]
+            task = catalog.task(entry["Category"], entry.get("Subcategory") or None, entry["Task"])
+            entry["Subcategory"] = task["Subcategory"]
+            modifiers = entry.get("Modifiers") or {}
+            if unpriced(task, modifiers, template_priced):
+                raise ValueError(f"{task['Task Name']!r} has no Base Cost in the task library; "
+                                 "give the line a Direct Cost or a Base Cost modifier.")
+            categories.append(entry["Category"])
+            subcategories.append(entry["Subcategory"])
+            quantities.append(entry["Quantity"])
+            base_costs.append(modifiers.get("Base Cost", task["Base Cost"]))
+            overrides.append(modifiers)
+        costs = price_cart_lines(categories, subcategories, quantities, base_costs, overrides, rate_card)
+        for i, cost in zip(todo, costs):
+            entries[i]["Direct Cost"] = float(cost)
+    return entries
+
+
+def quote_project(project, rate_card=DEFAULT_RATE_CARD, overhead_percent=DEFAULT_OVERHEAD_PERCENT,
+                  catalog_path=CATALOG_PATH):
+    """
+    Prices one project definition and renders its proposal. Runs inside the
+    worker processes; the catalog is loaded once per worker.
+
+    Returns: a dict with the index fields and the Markdown under "markdown";
+    a project that can't be quoted comes back with "error" set instead, so
+    one bad row never stops the batch.
+    """
+    result = {"id": "", "project_name": "", "partner": "", "lines": 0, "error": ""}
+    try:
+        _quote_into(result, project, rate_card, overhead_percent, catalog_path)
+    except DependencyCycleError as e:
+        result["error"] = f"Phase dependency cycle: {e.args[0]}"
+    except (KeyError, ValueError) as e:
+        result["error"] = str(e)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if result["error"]:
+        result.pop("markdown", None)
+    return result
+
+
+def _quote_into(result, project, rate_card, overhead_percent, catalog_path):
+    if not isinstance(project, dict):
+        raise ValueError("A project must be an object.")
+    result["id"] = project.get("id", "")
+    scope = normalize_scope(project.get("scope", {}))
+    overhead_percent = float(project.get("overhead_percent", overhead_percent))
+    result.update(project_name=scope.get("Project Name", ""), partner=scope.get("Partner Name", ""),
+                  lines=len(project.get("lines", [])))
+    sprint_log = price_project_lines(project.get("lines", []), load_catalog(catalog_path), rate_card)
+    phases = layout_phases(project.get("phases", []), scope["Project Start Date"])
+    totals = CartTotals.from_lines(sprint_log)
+    result.update(direct_cost=totals.direct_cost, overhead=round(totals.overhead(overhead_percent), 2),
+                  total_cost=round(totals.total(overhead_percent), 2))
+    burn = project_burn(sprint_log, phases, scope["Project Start Date"], scope["Study Length (Months)"],
+                        overhead_percent, _number(project.get("escalation_percent", 0)))
+    result["markdown"] = generate_proposal(scope, phases, sprint_log, totals, overhead_percent, burn)
+
+
+def _file_name(n, result):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", str(result["id"] or result["project_name"])).strip("-")[:60]
+    return f"{n:05d}-{slug or 'project'}.md"
+
+
+def run_batch(projects, out_dir, workers=None, rate_card=DEFAULT_RATE_CARD,
+              overhead_percent=DEFAULT_OVERHEAD_PERCENT, catalog_path=CATALOG_PATH, window=None):
+    """
+    Quotes every project across a process pool, writing proposals and an
+    index.csv summary to ``out_dir`` as results arrive. At most ``window``
+    projects are read ahead of the writer.
+
+    Returns: (number of projects quoted, number that failed)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 4
+    done_count = failed = 0
+    projects = iter(projects)
+
+    with open(os.path.join(out_dir, "index.csv"), "w", newline="", encoding="utf-8") as index_file, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        index = csv.DictWriter(index_file, fieldnames=INDEX_FIELDS, extrasaction="ignore")
+        index.writeheader()
+        pending = {}
+        submitted = 0
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                project = next(projects, None)
+                if project is None:
+                    exhausted = True
+                    break
+                submitted += 1
+                if isinstance(project, UnreadableProject):
+                    index.writerow({"id": project.id, "lines": 0, "error": project.error})
+                    done_count += 1
+                    failed += 1
+                    continue
+                pending[pool.submit(quote_project, project, rate_card, overhead_percent, catalog_path)] = submitted
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                n = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself failed (crashed, or the project couldn't be sent to it).
+                    result = {"id": "", "project_name": "", "partner": "", "lines": 0,
+                              "error": f"{type(e).__name__}: {e}"}
+                markdown = result.pop("markdown", None)
+                if markdown is not None:
+                    result["file"] = _file_name(n, result)
+                    with open(os.path.join(out_dir, result["file"]), "w", encoding="utf-8") as f:
+                        f.write(markdown)
+                else:
+                    failed += 1
+                index.writerow(result)
+                done_count += 1
+    return done_count, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Price and render proposals for many projects at once.")
+    parser.add_argument("input", help="Project definitions (.jsonl or .csv).")
+    parser.add_argument("--out", default="quotes", help="Output directory (default: quotes).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--overhead", type=float, default=DEFAULT_OVERHEAD_PERCENT, help="Default overhead / indirect %%.")
+    parser.add_argument("--tier1-rate", type=float, default=DEFAULT_RATE_CARD.tier1_rate)
+    parser.add_argument("--tier2-rate", type=float, default=DEFAULT_RATE_CARD.tier2_rate)
+    parser.add_argument("--tier3-rate", type=float, default=DEFAULT_RATE_CARD.tier3_rate)
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Task library CSV used to price lines.")
+    args = parser.parse_args(argv)
+
+    rate_card = RateCard(args.tier1_rate, args.tier2_rate, args.tier3_rate)
+    done_count, failed = run_batch(read_projects(args.input), args.out, args.workers, rate_card,
+                                   args.overhead, args.catalog)
+    print(f"Quoted {done_count} project(s) into {args.out} ({failed} failed, see index.csv).")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
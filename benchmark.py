@@ -0,0 +1,343 @@
+"""
+Reproducible benchmark suite for the pricing and rendering paths.
+
+Drives unit_pricing.py headlessly through Streamlit's app-testing harness
+(with the AI backend set to the offline stub, so no API calls are made) and
+times the paths that matter as the cart grows:
+
+* rerun latency of the whole app with a seeded cart of 10 / 100 / 1,000 /
+  10,000 lines: cold (fresh session), idle (nothing changed) and after an
+  overhead edit, plus the peak traced Python memory of a cold run;
+* pricing throughput of compute_task_cost (the single-line price_task it
+  delegates to) and of the vectorized price_cart_lines;
+* proposal document generation time per cart size.
+
+Results are written as JSON together with the per-span breakdown collected by
+metrics.py, and compared against a saved baseline: any metric more than
+``--threshold`` worse than the baseline is reported and makes the run exit
+non-zero, so it can gate a deploy.
+
+Timings only compare on the same kind of machine, so baselines are kept per
+environment (Python, NumPy and Streamlit versions, CPU model and count)
+under benchmarks/baseline-<key>.json and stay out of version control: each
+machine that gates a deploy records its own with --save-baseline. Comparing
+against a baseline from a different environment is refused unless
+--allow-env-mismatch is given.
+
+    python benchmark.py                      # run, write benchmarks/latest.json, compare
+    python benchmark.py --save-baseline      # run and make this this machine's baseline
+    python benchmark.py --sizes 10 100 --repeats 3
+"""
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+import metrics
+from batch_quotes import layout_phases, price_project_lines
+from cart import CartTotals
+from pricing_engine import DEFAULT_RATE_CARD, price_cart_lines, price_task
+from proposal import generate_proposal
+from task_library import load_catalog
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unit_pricing.py")
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.25
+# Timing differences below this many seconds are treated as noise.
+MIN_SIGNIFICANT_SECONDS = 0.005
+# Environment fields that must match for two runs' timings to be comparable.
+ENVIRONMENT_FIELDS = ("python", "machine", "cpu", "cpu_count", "numpy", "streamlit")
+OVERHEAD_PERCENT = 39
+PHASE_TITLES = ["Discovery", "Launch", "Data Collection", "Analysis"]
+SEED = 20240501
+
+
+# ----------------- Fixtures -----------------
+def synthetic_project(size, catalog, seed=SEED):
+    """
+    A deterministic project with ``size`` cart lines drawn from the task
+    library and spread over four phases.
+
+    Returns: scope, phases, cart lines
+    """
+    rng = random.Random(seed + size)
+    records = [record for record in catalog.records if record["Priced"]]
+    lines = []
+    for _ in range(size):
+        record = rng.choice(records)
+        lines.append({"Category": record["Category"], "Subcategory": record["Subcategory"],
+                      "Task": record["Task Name"], "Quantity": rng.randint(1, 20),
+                      "Phase": rng.choice(PHASE_TITLES)})
+    lines = price_project_lines(lines, catalog, DEFAULT_RATE_CARD)
+    scope = {"Project Name": f"Benchmark {size}", "Project Description": "Synthetic benchmark project.",
+             "Partner Name": "Benchmark Partner", "Project Type": "Pilot Study", "Estimated N": 200,
+             "Budget Estimate": 250000, "Study Length (Months)": 12, "Timeline": "Standard",
+             "Project Start Date": date(2026, 1, 5), "Project End Date": date(2027, 1, 5),
+             "Project Goals": "Measure the app."}
+    phases = [{"Title": title, "Description": f"{title} phase.", "DurationWeeks": 6, "DependsOn": [i - 1] if i else []}
+              for i, title in enumerate(PHASE_TITLES)]
+    for phase, dated in zip(phases, layout_phases(phases, scope["Project Start Date"])):
+        phase["Start"], phase["End"] = dated["Start"], dated["End"]
+    return scope, phases, lines
+
+
+def _app(scope, phases, lines):
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+
+    # Bare-mode AppTest runs warn about the missing script context on every cached call.
+    set_log_level("error")
+
+    at = AppTest.from_file(APP_PATH, default_timeout=600)
+    at.secrets["openai"] = {"api_key": "benchmark", "backend": "stub"}
+    at.session_state["scope_info"] = dict(scope)
+    at.session_state["phases"] = [dict(phase) for phase in phases]
+    at.session_state["sprint_log"] = [dict(line) for line in lines]
+    return at
+
+
+def _run(at):
+    gc.collect()
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"App raised during the benchmark: {at.exception[0].value}")
+    return elapsed
+
+
+def _median(samples):
+    return statistics.median(samples) if samples else 0.0
+
+
+# ----------------- Benchmarks -----------------
+def bench_reruns(size, catalog, repeats):
+    """
+    Median cold, idle and edited rerun latency and the peak traced memory of
+    a cold run, for one cart size.
+    """
+    scope, phases, lines = synthetic_project(size, catalog)
+    cold, idle, edited = [], [], []
+    for i in range(repeats):
+        at = _app(scope, phases, lines)
+        cold.append(_run(at))
+        idle.append(_run(at))
+        overhead = next(w for w in at.sidebar.number_input if w.label.startswith("Overhead"))
+        overhead.set_value(OVERHEAD_PERCENT + 1 + i % 2)
+        edited.append(_run(at))
+
+    at = _app(scope, phases, lines)
+    tracemalloc.start()
+    try:
+        _run(at)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"rerun_cold_seconds": _median(cold), "rerun_idle_seconds": _median(idle),
+            "rerun_edit_seconds": _median(edited), "rerun_cold_peak_mb": peak / 2 ** 20}
+
+
+def bench_proposal(size, catalog, repeats):
+    scope, phases, lines = synthetic_project(size, catalog)
+    totals = CartTotals.from_lines(lines)
+    samples = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        generate_proposal(scope, phases, lines, totals, OVERHEAD_PERCENT)
+        samples.append(time.perf_counter() - start)
+    return {"proposal_seconds": _median(samples)}
+
+
+def bench_pricing(catalog, repeats, calls=10_000, batch=100_000):
+    """
+    Throughput of compute_task_cost (the app's thin wrapper over price_task,
+    which can't be imported without running the Streamlit script) and of
+    the vectorized batch pricer the cart and optimizer use.
+    """
+    rng = random.Random(SEED)
+    records = [rng.choice(catalog.records) for _ in range(calls)]
+    quantities = [rng.randint(1, 50) for _ in range(calls)]
+    single = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for record, quantity in zip(records, quantities):
+            price_task(record["Category"], record["Subcategory"], quantity, None, DEFAULT_RATE_CARD)
+        single.append(calls / (time.perf_counter() - start))
+
+    records = [rng.choice(catalog.records) for _ in range(batch)]
+    categories = [r["Category"] for r in records]
+    subcategories = [r["Subcategory"] for r in records]
+    base_costs = np.array([float(r["Base Cost"]) for r in records])
+    quantities = np.array([rng.randint(1, 50) for _ in range(batch)])
+    vectorized = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        price_cart_lines(categories, subcategories, quantities, base_costs, None, DEFAULT_RATE_CARD)
+        vectorized.append(batch / (time.perf_counter() - start))
+    # Best of the repeats, as timeit does: slower samples measure other load on the machine, not the code.
+    return {"compute_task_cost_per_sec": max(single), "price_cart_lines_per_sec": max(vectorized)}
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeats=DEFAULT_REPEATS, log=print):
+    catalog = load_catalog()
+    results = {}
+    log("pricing throughput ...")
+    results.update(bench_pricing(catalog, repeats))
+
+    # The first app run in a process pays for imports and the catalog parse; keep it out of the numbers.
+    _run(_app(*synthetic_project(1, catalog)))
+    metrics.registry.reset()
+    spans = {}
+    for size in sizes:
+        log(f"cart of {size} lines ...")
+        for name, value in bench_reruns(size, catalog, repeats).items():
+            results[f"{name}[{size}]"] = value
+        for name, value in bench_proposal(size, catalog, repeats).items():
+            results[f"{name}[{size}]"] = value
+        spans[size] = metrics.snapshot()["spans"][:25]
+        metrics.registry.reset()
+    return results, spans
+
+
+# ----------------- Baseline Comparison -----------------
+def _higher_is_better(name):
+    return "_per_sec" in name
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Returns: one row per metric present in both runs (name, baseline,
+    current, relative change, regressed); a positive change always means
+    worse, whether the metric is a time or a throughput.
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None or before <= 0:
+            continue
+        change = (before - current) / before if _higher_is_better(name) else (current - before) / before
+        regressed = change > threshold
+        if regressed and name.endswith("_seconds") and current - before < MIN_SIGNIFICANT_SECONDS:
+            regressed = False
+        rows.append((name, before, current, change, regressed))
+    return rows
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(APP_PATH), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    import streamlit
+
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpu": _cpu_model(), "cpu_count": os.cpu_count(), "numpy": np.__version__, "streamlit": streamlit.__version__,
+            "commit": commit, "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+
+def environment_key(env):
+    """
+    Short digest of the fields that make timings comparable.
+    """
+    fields = json.dumps([env.get(field) for field in ENVIRONMENT_FIELDS], default=str)
+    return hashlib.sha256(fields.encode("utf-8")).hexdigest()[:12]
+
+
+def environment_mismatches(current, baseline):
+    """
+    Returns: (field, baseline value, current value) for every comparable
+    field that differs.
+    """
+    return [(field, baseline.get(field), current.get(field)) for field in ENVIRONMENT_FIELDS
+            if baseline.get(field) != current.get(field)]
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True, default=str)
+        f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark app reruns, pricing and proposal generation.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Cart sizes to run.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="Samples per measurement (median is kept).")
+    parser.add_argument("--out", default=os.path.join(BENCH_DIR, "latest.json"), help="Where to write the results.")
+    parser.add_argument("--baseline", help="Baseline to compare with (default: this environment's, "
+                                           "benchmarks/baseline-<key>.json).")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline.")
+    parser.add_argument("--allow-env-mismatch", action="store_true",
+                        help="Compare against a baseline recorded in a different environment anyway.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown that counts as a regression (default: 0.25).")
+    args = parser.parse_args(argv)
+
+    env = environment()
+    baseline_path = args.baseline or os.path.join(BENCH_DIR, f"baseline-{environment_key(env)}.json")
+    results, spans = run_suite(args.sizes, args.repeats, log=lambda msg: print(msg, file=sys.stderr))
+    report = {"environment": env, "sizes": args.sizes, "repeats": args.repeats,
+              "results": results, "spans": {str(size): rows for size, rows in spans.items()}}
+    _write_json(args.out, report)
+
+    for name, value in results.items():
+        print(f"{name:40s} {value:14.4f}")
+    regressions = []
+    if args.save_baseline:
+        _write_json(baseline_path, report)
+        print(f"\nSaved baseline to {baseline_path}")
+    elif not os.path.exists(baseline_path):
+        print(f"\nNo baseline for this environment ({baseline_path}); run with --save-baseline to record one.")
+    else:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        mismatches = environment_mismatches(env, baseline.get("environment", {}))
+        if mismatches:
+            print(f"\nThe baseline in {baseline_path} was recorded in a different environment:")
+            for field, before, current in mismatches:
+                print(f"  {field}: {before} -> {current}")
+            if not args.allow_env_mismatch:
+                print("Timings from different environments aren't comparable; record a baseline here with "
+                      "--save-baseline, or pass --allow-env-mismatch to compare anyway.")
+                return 2
+        print(f"\nCompared with baseline from {baseline['environment'].get('commit') or '?'} "
+              f"({baseline['environment'].get('timestamp', '?')}):")
+        for name, before, current, change, regressed in compare(results, baseline["results"], args.threshold):
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:40s} {before:14.4f} -> {current:14.4f} ({change:+.1%}){flag}")
+            if regressed:
+                regressions.append(name)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Monthly cost burn / cash-flow projection.
+
+Spreads each cart line's direct cost evenly over the days of its phase
+window (lines without a dated phase run across the whole study), applies an
+annual rate escalation compounded per project year, and adds overhead. The
+spread is one (lines x months) matrix built from day overlaps with NumPy, so
+a five-year study with thousands of lines projects in milliseconds. Monthly
+totals roll up to calendar quarters for sponsors who report that way.
+"""
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+BurnProjection = namedtuple("BurnProjection", ["months", "matrix", "direct", "overhead", "total", "cumulative",
+                                               "escalation_percent", "overhead_percent"])
+BurnPeriods = namedtuple("BurnPeriods", ["labels", "direct", "overhead", "total", "cumulative"])
+
+
+def _day(value):
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return np.datetime64(value, "D")
+
+
+def _month_start(day):
+    return day.astype("datetime64[M]")
+
+
+def line_windows(lines, phases, project_start, study_months):
+    """
+    First and last day (inclusive) over which each line is spent: its
+    phase's Start/End when the line names a dated phase, otherwise the study
+    period from ``project_start``.
+
+    Returns: (starts, ends) datetime64[D] arrays aligned with ``lines``.
+    """
+    start = _day(project_start)
+    study_end = _day(start.item() + relativedelta(months=int(study_months))) - np.timedelta64(1, "D")
+    windows = {}
+    for phase in phases:
+        if phase.get("Title") and phase.get("Start") and phase.get("End"):
+            windows.setdefault(phase["Title"], (_day(phase["Start"]), _day(phase["End"])))
+    starts = np.full(len(lines), start)
+    ends = np.full(len(lines), max(study_end, start))
+    for i, line in enumerate(lines):
+        window = windows.get(line.get("Phase"))
+        if window is not None:
+            starts[i], ends[i] = window[0], max(window)
+    return starts, ends
+
+
+def project_burn(lines, phases, project_start, study_months, overhead_percent=0, escalation_percent=0):
+    """
+    Projects the cart's spending month by month.
+
+    Each line's Direct Cost is split across months in proportion to the days
+    of its window falling in each month, then multiplied by
+    (1 + escalation_percent/100) ** project_year, where project year 0 is the
+    first twelve months from the start month.
+
+    Returns: BurnProjection; ``months`` are datetime64[M] values covering the
+    study and every phase, ``matrix`` is the escalated direct cost per line
+    per month and the rest are per-month totals.
+    """
+    starts, ends = line_windows(lines, phases, project_start, study_months)
+    costs = np.fromiter((float(line.get("Direct Cost", 0) or 0) for line in lines), dtype=float, count=len(lines))
+    first = _month_start(_day(project_start))
+    last = max(first + np.timedelta64(max(int(study_months), 1) - 1, "M"),
+               _month_start(ends.max()) if len(ends) else first)
+    months = np.arange(first, last + np.timedelta64(1, "M"))
+    edges = np.append(months, last + np.timedelta64(1, "M")).astype("datetime64[D]")
+
+    # Day overlap of every window with every month; lines sharing a phase share a window, so work per window.
+    windows, inverse = np.unique(np.stack([starts.astype(np.int64), ends.astype(np.int64)], axis=1),
+                                 axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    lo = np.maximum(windows[:, :1], edges[:-1].astype(np.int64)[None, :])
+    hi = np.minimum(windows[:, 1:] + 1, edges[1:].astype(np.int64)[None, :])
+    overlap = np.clip(hi - lo, 0, None).astype(float)
+    spread = overlap / np.maximum(overlap.sum(axis=1, keepdims=True), 1.0)
+
+    year = np.arange(len(months)) // 12
+    escalation = (1 + escalation_percent / 100) ** year
+    matrix = costs[:, None] * spread[inverse] * escalation[None, :]
+    direct = matrix.sum(axis=0)
+    overhead = direct * overhead_percent / 100
+    total = direct + overhead
+    return BurnProjection(months, matrix, direct, overhead, total, np.cumsum(total),
+                          escalation_percent, overhead_percent)
+
+
+def monthly(projection):
+    """
+    Returns: BurnPeriods with "YYYY-MM" labels.
+    """
+    labels = [str(month) for month in projection.months]
+    return BurnPeriods(labels, projection.direct, projection.overhead, projection.total, projection.cumulative)
+
+
+def quarterly(projection):
+    """
+    Rolls the monthly series up to calendar quarters.
+
+    Returns: BurnPeriods with "YYYY-Qn" labels.
+    """
+    if not len(projection.months):
+        return BurnPeriods([], np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0))
+    index = projection.months.astype(np.int64)  # months since 1970-01
+    quarter = index // 3
+    starts = np.flatnonzero(np.r_[True, quarter[1:] != quarter[:-1]])
+    labels = [f"{1970 + q // 4}-Q{q % 4 + 1}" for q in quarter[starts]]
+    direct = np.add.reduceat(projection.direct, starts)
+    overhead = np.add.reduceat(projection.overhead, starts)
+    total = direct + overhead
+    return BurnPeriods(labels, direct, overhead, total, np.cumsum(total))
+
+
+def burn_rows(periods):
+    """
+    Yields (period, direct, overhead, total, cumulative) rows rounded to cents.
+    """
+    for row in zip(periods.labels, periods.direct, periods.overhead, periods.total, periods.cumulative):
+        yield (row[0],) + tuple(round(float(value), 2) for value in row[1:])
@@ -0,0 +1,151 @@
+"""
+Running cart aggregates.
+
+CartTotals keeps the direct cost, per-category and per-phase rollups of the
+project cart up to date in O(1) per added or removed line, so the dashboard,
+the AI prompt and the proposal document read the same totals instead of each
+rebuilding a DataFrame and re-running groupby on every rerun.
+"""
+import itertools
+
+from pricing_engine import DEFAULT_RATE_CARD, price_cart_lines
+
+# Shared across all CartTotals so a revision never repeats, even for a rebuilt cart.
+_revisions = itertools.count(1)
+
+
+def _to_cents(amount):
+    return int(round(float(amount) * 100))
+
+
+class CartTotals:
+    """
+    Incrementally maintained cart rollups.
+
+    Amounts are accumulated in integer cents so repeated adds and removes
+    never drift. A category or phase drops out of the rollup once its last
+    line is removed; lines without a Phase are left out of ``by_phase``.
+    ``revision`` changes on every edit, so callers can tell whether the cart
+    changed without comparing its lines.
+    """
+
+    def __init__(self):
+        self.revision = next(_revisions)
+        self.line_count = 0
+        self._direct_cents = 0
+        self._category_cents = {}
+        self._category_lines = {}
+        self._phase_cents = {}
+        self._phase_lines = {}
+
+    @classmethod
+    def from_lines(cls, lines):
+        totals = cls()
+        for line in lines:
+            totals.add(line)
+        return totals
+
+    @staticmethod
+    def _bump(cents, counts, key, amount, step):
+        cents[key] = cents.get(key, 0) + amount
+        counts[key] = counts.get(key, 0) + step
+        if counts[key] == 0:
+            del cents[key]
+            del counts[key]
+
+    def _apply(self, line, sign):
+        amount = sign * _to_cents(line.get("Direct Cost", 0))
+        self.revision = next(_revisions)
+        self.line_count += sign
+        self._direct_cents += amount
+        self._bump(self._category_cents, self._category_lines, line.get("Category", ""), amount, sign)
+        if line.get("Phase"):
+            self._bump(self._phase_cents, self._phase_lines, line["Phase"], amount, sign)
+
+    def copy(self):
+        """
+        An independent copy with the same revision: it describes the same
+        cart until either one is edited, which gives it a fresh revision.
+        """
+        other = CartTotals.__new__(CartTotals)
+        other.revision = self.revision
+        other.line_count = self.line_count
+        other._direct_cents = self._direct_cents
+        other._category_cents = dict(self._category_cents)
+        other._category_lines = dict(self._category_lines)
+        other._phase_cents = dict(self._phase_cents)
+        other._phase_lines = dict(self._phase_lines)
+        return other
+
+    def add(self, line):
+        self._apply(line, 1)
+
+    def remove(self, line):
+        self._apply(line, -1)
+
+    @property
+    def direct_cost(self):
+        return self._direct_cents / 100
+
+    @property
+    def by_category(self):
+        return {key: cents / 100 for key, cents in self._category_cents.items()}
+
+    @property
+    def by_phase(self):
+        return {key: cents / 100 for key, cents in self._phase_cents.items()}
+
+    def overhead(self, overhead_percent):
+        return self.direct_cost * (overhead_percent / 100)
+
+    def total(self, overhead_percent):
+        return self.direct_cost + self.overhead(overhead_percent)
+
+
+# ----------------- Cart Edits -----------------
+def add_to_cart(lines, totals, entry):
+    lines.append(entry)
+    totals.add(entry)
+
+
+def remove_from_cart(lines, totals, idx):
+    entry = lines.pop(idx)
+    totals.remove(entry)
+    return entry
+
+
+def edit_cart(lines, totals, updates=None, removals=(), rate_card=DEFAULT_RATE_CARD, templates=None):
+    """
+    Applies a batch of cart edits in place: ``updates`` maps a line index to
+    its new field values (Quantity, Phase) and ``removals`` lists line
+    indexes to drop. Indexes refer to the cart before the edit. Lines whose
+    quantity changes are re-priced together, keeping their per-unit base
+    cost, and the totals are adjusted line by line rather than rebuilt.
+    Edited lines are replaced with new dicts, never changed in place, so
+    scenario snapshots can keep sharing the old ones.
+
+    Returns: (updated indexes, removed indexes), both relative to the cart
+    before the edit.
+    """
+    removals = sorted(set(removals), reverse=True)
+    updates = {idx: fields for idx, fields in (updates or {}).items() if idx not in removals}
+    requantified = [idx for idx, fields in updates.items()
+                    if "Quantity" in fields and fields["Quantity"] != lines[idx].get("Quantity")]
+    if requantified:
+        old = [lines[idx] for idx in requantified]
+        costs = price_cart_lines([line.get("Category", "") for line in old], [line.get("Subcategory", "") for line in old],
+                                 [updates[idx]["Quantity"] for idx in requantified],
+                                 [line.get("Direct Cost", 0) / line["Quantity"] if line.get("Quantity") else 0 for line in old],
+                                 [line.get("Modifiers") or {} for line in old], rate_card, templates)
+        for idx, cost in zip(requantified, costs):
+            updates[idx] = dict(updates[idx], **{"Direct Cost": float(cost)})
+    for idx, fields in updates.items():
+        updated = dict(lines[idx], **fields)
+        if not updated.get("Phase"):
+            updated.pop("Phase", None)
+        totals.remove(lines[idx])
+        totals.add(updated)
+        lines[idx] = updated
+    for idx in removals:
+        remove_from_cart(lines, totals, idx)
+    return sorted(updates), removals[::-1]
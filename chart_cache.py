@@ -0,0 +1,233 @@
+"""
+Rendered-chart cache for the dashboard.
+
+Charts are drawn once per distinct input and kept as PNG bytes in a bounded
+LRU cache keyed by a content hash of the data they plot, so reruns caused by
+unrelated widgets (typing in the project description, etc.) don't redraw
+them. Figures are built with matplotlib.figure.Figure rather than pyplot, so
+nothing is left in pyplot's global figure registry, and each one is cleared
+as soon as it has been rasterized. matplotlib itself is imported on the
+first cache miss, so sessions that never draw a chart don't pay for it.
+"""
+import hashlib
+import io
+import itertools
+import json
+import threading
+from collections import OrderedDict
+
+from metrics import increment, span
+
+MAX_ENTRIES = 64
+MAX_BYTES = 32 * 1024 * 1024
+# Gantt charts taller than this stop being readable; callers trim to the critical path.
+MAX_GANTT_ROWS = 60
+
+
+class ChartCache:
+    """
+    Process-wide LRU cache of rendered PNGs, bounded by entry count and by
+    total size. Shared by every session, hence the lock.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(kind, payload):
+        blob = json.dumps([kind, payload], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get_or_render(self, kind, payload, draw):
+        """
+        Returns the PNG for ``(kind, payload)``, calling ``draw(payload)`` to
+        build a Figure only on a miss.
+        """
+        key = self.key(kind, payload)
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                increment("chart_cache_hits", kind=kind)
+                return png
+            self.misses += 1
+        increment("chart_cache_misses", kind=kind)
+        with span("chart_render", kind=kind):
+            png = _rasterize(draw(payload))
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = png
+                self._size += len(png)
+            self._evict()
+        return png
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, png = self._entries.popitem(last=False)
+            self._size -= len(png)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def _rasterize(fig):
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+chart_cache = ChartCache()
+
+
+def _figure(**kwargs):
+    from matplotlib.figure import Figure
+
+    return Figure(**kwargs)
+
+
+# ----------------- Dashboard Charts -----------------
+def _draw_category_bar(payload):
+    fig = _figure(figsize=(5, 3))
+    ax = fig.subplots()
+    ax.bar([label for label, _ in payload], [value for _, value in payload])
+    ax.set_xlabel("Category")
+    ax.set_ylabel("Direct Cost ($)")
+    ax.set_title("Direct Cost by Category")
+    return fig
+
+
+def _draw_phase_pie(payload):
+    fig = _figure()
+    ax = fig.subplots()
+    ax.pie([value for _, value in payload], labels=[label for label, _ in payload], autopct="%1.1f%%", startangle=90)
+    ax.set_title("Direct Cost Distribution by Phase")
+    return fig
+
+
+def _draw_gantt(payload):
+    import matplotlib.dates as mdates
+
+    fig = _figure(figsize=(10, len(payload) * 0.5 + 1))
+    ax = fig.subplots()
+    for i, (title, start, end, critical) in enumerate(payload):
+        if start and end:
+            start_num = mdates.date2num(start)
+            end_num = mdates.date2num(end)
+            duration = end_num - start_num
+            ax.barh(i, duration, left=start_num, height=0.3, color="tomato" if critical else "skyblue")
+            ax.text(start_num + duration/2, i, title, va="center", ha="center", color="black")
+    ax.set_yticks(range(len(payload)))
+    ax.set_yticklabels([title for title, _, _, _ in payload])
+    ax.invert_yaxis()
+    ax.xaxis_date()
+    ax.set_xlabel("Date")
+    ax.set_title("Project Timeline" + (" (critical path in red)" if any(row[3] for row in payload) else ""))
+    return fig
+
+
+def category_bar_png(cost_by_category):
+    return chart_cache.get_or_render("category_bar", list(cost_by_category.items()), _draw_category_bar)
+
+
+def phase_pie_png(cost_by_phase):
+    return chart_cache.get_or_render("phase_pie", list(cost_by_phase.items()), _draw_phase_pie)
+
+
+def gantt_png(phases):
+    """
+    ``phases`` is a list of phase (or scheduled task) dicts with Title, Start,
+    End and an optional Critical flag.
+    """
+    payload = [(phase["Title"], phase.get("Start"), phase.get("End"), bool(phase.get("Critical"))) for phase in phases]
+    return chart_cache.get_or_render("gantt", payload, _draw_gantt)
+
+
+def _draw_cost_histogram(payload):
+    edges, counts, budget = payload
+    fig = _figure(figsize=(6, 3))
+    ax = fig.subplots()
+    ax.stairs(counts, edges, fill=True)
+    if budget:
+        ax.axvline(budget, color="red", linestyle="--", label="Budget")
+        ax.legend()
+    ax.set_xlabel("Total Project Cost ($)")
+    ax.set_ylabel("Scenarios")
+    ax.set_title("Scenario Cost Distribution")
+    return fig
+
+
+def _draw_tornado(payload):
+    base_total, bars = payload
+    fig = _figure(figsize=(6, len(bars) * 0.5 + 1))
+    ax = fig.subplots()
+    for i, (label, low, high) in enumerate(reversed(bars)):
+        ax.barh(i, low - base_total, left=base_total, color="tab:blue")
+        ax.barh(i, high - base_total, left=base_total, color="tab:orange")
+    ax.axvline(base_total, color="black", linewidth=1)
+    ax.set_yticks(range(len(bars)))
+    ax.set_yticklabels([label for label, _, _ in reversed(bars)])
+    ax.set_xlabel("Total Project Cost ($)")
+    ax.set_title("Sensitivity (low / high)")
+    return fig
+
+
+def cost_histogram_png(edges, counts, budget=None):
+    """
+    Histogram of scenario totals; pass the bin edges and counts rather than
+    the raw scenarios so the cache key stays small.
+    """
+    return chart_cache.get_or_render("cost_histogram", [list(edges), list(counts), budget], _draw_cost_histogram)
+
+
+def tornado_png(base_total, bars):
+    """
+    ``bars`` is a list of (label, total at low, total at high).
+    """
+    return chart_cache.get_or_render("tornado", [base_total, [list(bar) for bar in bars]], _draw_tornado)
+
+
+def _draw_burn(payload):
+    labels, direct, cumulative = payload
+    fig = _figure(figsize=(10, 3.5))
+    ax = fig.subplots()
+    positions = range(len(labels))
+    ax.bar(positions, direct, color="skyblue", label="Direct")
+    ax.set_xticks(list(positions))
+    ax.set_xticklabels(labels, rotation=90 if len(labels) > 12 else 0, fontsize=8)
+    ax.set_ylabel("Direct Spend per Period ($)")
+    ax.set_title("Projected Direct Spending")
+    cumulative_ax = ax.twinx()
+    cumulative_ax.plot(list(positions), cumulative, color="black", marker=".", label="Cumulative Direct")
+    cumulative_ax.set_ylabel("Cumulative ($)")
+    cumulative_ax.set_ylim(bottom=0)
+    handles, names = ax.get_legend_handles_labels()
+    more_handles, more_names = cumulative_ax.get_legend_handles_labels()
+    ax.legend(handles + more_handles, names + more_names, loc="upper left", fontsize=8)
+    return fig
+
+
+def burn_png(periods):
+    """
+    Direct spend per period with its running total; ``periods`` is a
+    burn.BurnPeriods. Overhead is a flat percentage of direct cost, so it is
+    left out of the picture: the chart then stays cached across overhead
+    edits instead of being redrawn for every change of the percentage.
+    """
+    direct = [round(float(v), 2) for v in periods.direct]
+    payload = [list(periods.labels), direct, [round(v, 2) for v in itertools.accumulate(direct)]]
+    return chart_cache.get_or_render("burn", payload, _draw_burn)
@@ -0,0 +1,217 @@
+"""
+Built-in instrumentation.
+
+Timing spans and counters kept in process memory, with no external service:
+
+* ``span(name, **labels)`` times a block (also usable as a decorator via
+  ``timed``) into a latency histogram;
+* ``increment(name, amount, **labels)`` bumps a counter (tokens, cache hits);
+* ``prometheus_text()`` renders everything in the Prometheus text exposition
+  format, ``snapshot()`` as plain data for the debug panel or JSON;
+* with PROPOSAL_METRICS_LOG set to a path, every finished span and counter
+  bump is also appended to that file as one JSON object per line.
+
+Metrics are process-wide, so they cover every Streamlit session (and the
+batch CLI) served by the process.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Histogram bucket upper bounds, in seconds.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RECENT_SPANS = 200
+LOG_PATH = os.environ.get("PROPOSAL_METRICS_LOG", "")
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of span histograms, counters and the most recent spans.
+    """
+
+    def __init__(self, log_path=LOG_PATH):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self.log_path = log_path
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+            self.recent.append({"ts": time.time(), "span": name, "seconds": seconds, "labels": dict(key[1])})
+        self._log({"type": "span", "name": name, "seconds": round(seconds, 6), "labels": dict(key[1])})
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._log({"type": "counter", "name": name, "amount": amount, "labels": dict(key[1])})
+
+    def _log(self, event):
+        if not self.log_path:
+            return
+        event["ts"] = time.time()
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.recent.clear()
+
+    def snapshot(self):
+        """
+        Returns: {"spans": [...], "counters": [...]} with one entry per
+        name/label combination (count, total, mean and max seconds for spans).
+        """
+        with self._lock:
+            spans = [{"name": name, "labels": dict(labels), "count": h.count, "total_seconds": h.total,
+                      "mean_seconds": h.total / h.count if h.count else 0.0, "max_seconds": h.max}
+                     for (name, labels), h in self._histograms.items()]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+        return {"spans": sorted(spans, key=lambda s: s["total_seconds"], reverse=True),
+                "counters": sorted(counters, key=lambda c: (c["name"], sorted(c["labels"].items())))}
+
+    def prometheus_text(self, prefix="proposal_"):
+        """
+        Spans become ``<prefix><name>_seconds`` histograms and counters
+        ``<prefix><name>_total``, in the Prometheus text exposition format.
+        """
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        for name in sorted({name for (name, _), _ in histograms}):
+            metric = f"{prefix}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (hist_name, labels), h in histograms:
+                if hist_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.buckets):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{render_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{render_labels(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{metric}_sum{render_labels(labels)} {h.total:.6f}")
+                lines.append(f"{metric}_count{render_labels(labels)} {h.count}")
+        for name in sorted({name for (name, _), _ in counters}):
+            metric = f"{prefix}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in counters:
+                if counter_name == name:
+                    lines.append(f"{metric}{render_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class span:
+    """
+    Context manager timing a block into ``registry``:
+
+        with span("chart_render", kind="gantt"):
+            ...
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Control-flow exceptions such as Streamlit's rerun derive from BaseException, not Exception.
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        labels = dict(self.labels, error=exc_type.__name__) if failed else self.labels
+        registry.observe(self.name, time.perf_counter() - self._start, **labels)
+        return False
+
+
+def timed(name, **labels):
+    """
+    Decorator form of ``span``.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def increment(name, amount=1, **labels):
+    registry.increment(name, amount, **labels)
+
+
+def prometheus_text():
+    return registry.prometheus_text()
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+# ----------------- Token Estimates -----------------
+_encodings = {}
+
+
+def estimate_tokens(text, model=None):
+    """
+    Token count of ``text``: exact with tiktoken when it is installed,
+    otherwise the usual ~4 characters per token estimate.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return max(1, len(text) // 4) if text else 0
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return len(encoding.encode(text))
@@ -0,0 +1,100 @@
+"""
+Local mock of an OpenAI-compatible chat completion server.
+
+Answers POST /v1/chat/completions with a canned reply after a configurable
+delay, streamed as server-sent events when the request asks for it. Point
+the app at it with backend = "http" and base_url = "http://127.0.0.1:8765/v1"
+under [openai] in the Streamlit secrets, or start it in-process with
+serve_in_thread() from tests and benchmarks.
+
+    python mock_completion_server.py --port 8765 --delay 0.5
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _reply_for(prompt):
+    first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+    return f"Mock completion ({len(prompt)} prompt characters) for: {first_line}"
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        reply = _reply_for(prompt)
+        self.server.request_count += 1
+        time.sleep(self.server.delay)
+
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in reply.split(" "):
+                chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+            return
+
+        body = json.dumps({
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split())},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host="127.0.0.1", port=8765, delay=0.0):
+    server = ThreadingHTTPServer((host, port), MockCompletionHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.request_count = 0
+    return server
+
+
+def serve_in_thread(port=0, delay=0.0):
+    """
+    Starts a mock server on a background thread (``port=0`` picks a free
+    port). Returns the server and its base URL; call server.shutdown() when
+    done.
+    """
+    server = make_server(port=port, delay=delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completion server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.delay)
+    print(f"Mock completion server listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
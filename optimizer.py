@@ -0,0 +1,230 @@
+"""
+Budget-constrained cart optimizer.
+
+Picks task quantities from the task library that maximize a value score
+without the cart's total (direct cost plus overhead) going over budget.
+Every task has a weight and quantity bounds; it earns its full weight at its
+maximum quantity and proportionally less below it, so the default bounds of
+0..1 with weight 1 maximize plain task coverage.
+
+The solver is a multiple-choice knapsack over a discretized budget: one
+NumPy pass per task over all budget levels, with each task's candidate
+quantities priced up front in a single vectorized call. Costs are rounded up
+to the budget grid so any DP solution is feasible; leftover budget is then
+topped up greedily. Problems too large for the time budget fall back to a
+greedy fill by value per dollar, which also runs as a baseline: the better
+of the two carts wins.
+"""
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from pricing_engine import DEFAULT_RATE_CARD, default_templates, price_cart_lines
+from task_library import unpriced
+
+DEFAULT_RESOLUTION = 2000
+MAX_DP_CELLS = 60_000_000
+MAX_QUANTITY_OPTIONS = 16
+TIME_BUDGET = 1.0
+
+TaskChoice = namedtuple("TaskChoice", ["category", "subcategory", "task", "base_cost", "modifiers",
+                                       "weight", "min_qty", "max_qty"])
+OptimizedCart = namedtuple("OptimizedCart", ["lines", "direct_cost", "total_cost", "value", "method",
+                                             "feasible", "message"])
+
+
+def choices_from_catalog(catalog, task_modifiers=None, weights=None, bounds=None, template_units=1, templates=None):
+    """
+    One TaskChoice per catalog task. ``weights`` and ``bounds`` map task
+    names to a weight and to (min_qty, max_qty); unlisted tasks get weight 1
+    and bounds 0..1, or 0..``template_units`` for template-priced tasks
+    (surveys, clinical measures and the like are bought by the unit).
+    Tasks that can't be priced (see task_library.unpriced) are left out.
+    """
+    if templates is None:
+        templates = default_templates()
+    template_priced = templates.template_priced
+    task_modifiers = task_modifiers or {}
+    weights = weights or {}
+    bounds = bounds or {}
+    choices = []
+    for record in catalog.records:
+        name = record["Task Name"]
+        modifiers = task_modifiers.get(name, {})
+        if unpriced(record, modifiers, template_priced):
+            continue
+        templated = (record["Category"], record["Subcategory"]) in template_priced
+        low, high = bounds.get(name, (0, template_units if templated else 1))
+        choices.append(TaskChoice(record["Category"], record["Subcategory"], name,
+                                  float(modifiers.get("Base Cost", record["Base Cost"])), modifiers,
+                                  float(weights.get(name, 1)), int(low), int(high)))
+    return choices
+
+
+def _quantity_options(low, high):
+    options = [0] if low == 0 else []
+    if high >= max(low, 1):
+        start = max(low, 1)
+        count = min(MAX_QUANTITY_OPTIONS, high - start + 1)
+        options.extend(int(q) for q in np.unique(np.round(np.linspace(start, high, count))))
+    return options or [0]
+
+
+def _price_options(choices, options, rate_card, templates):
+    """
+    Direct cost of every candidate quantity of every task, in one call.
+    """
+    flat = [(i, q) for i, qs in enumerate(options) for q in qs]
+    costs = price_cart_lines([choices[i].category for i, _ in flat], [choices[i].subcategory for i, _ in flat],
+                             [q for _, q in flat], [choices[i].base_cost for i, _ in flat],
+                             [choices[i].modifiers for i, _ in flat], rate_card, templates)
+    # Zero units cost nothing, even for template tasks with fixed hours.
+    costs[np.array([q for _, q in flat]) == 0] = 0.0
+    priced, pos = [], 0
+    for qs in options:
+        priced.append(costs[pos:pos + len(qs)])
+        pos += len(qs)
+    return priced
+
+
+def _solve_dp(costs, values, budget, resolution, deadline):
+    """
+    Multiple-choice knapsack: exactly one option per task. Returns the
+    chosen option index per task, or None if the deadline passes first.
+    """
+    unit = budget / resolution
+    bins = [np.ceil(c / unit - 1e-9).astype(np.intp) for c in costs]
+    best = np.full(resolution + 1, -np.inf)
+    best[0] = 0.0
+    choice = np.zeros((len(costs), resolution + 1), dtype=np.int8)
+    for i, (task_bins, task_values) in enumerate(zip(bins, values)):
+        if i % 256 == 0 and time.perf_counter() > deadline:
+            return None
+        new = np.full(resolution + 1, -np.inf)
+        for k, (b, v) in enumerate(zip(task_bins, task_values)):
+            if b > resolution:
+                continue
+            shifted = np.full(resolution + 1, -np.inf)
+            shifted[b:] = best[:resolution + 1 - b] + v
+            better = shifted > new
+            new[better] = shifted[better]
+            choice[i, better] = k
+        best = new
+    level = int(np.argmax(best))
+    if not np.isfinite(best[level]):
+        return None
+    picks = np.zeros(len(costs), dtype=np.intp)
+    for i in range(len(costs) - 1, -1, -1):
+        picks[i] = choice[i, level]
+        level -= bins[i][picks[i]]
+    return picks
+
+
+def _fill_greedy(picks, costs, values, budget):
+    """
+    Raises quantities by value per extra dollar while the budget allows.
+    """
+    spent = sum(costs[i][k] for i, k in enumerate(picks))
+    moves = []
+    for i, k in enumerate(picks):
+        for j in range(len(costs[i])):
+            extra_cost = costs[i][j] - costs[i][k]
+            extra_value = values[i][j] - values[i][k]
+            if extra_value > 0:
+                moves.append((extra_value / extra_cost if extra_cost > 0 else np.inf, i, j))
+    for _, i, j in sorted(moves, reverse=True):
+        extra_cost = costs[i][j] - costs[i][picks[i]]
+        if values[i][j] > values[i][picks[i]] and spent + extra_cost <= budget + 1e-9:
+            spent += extra_cost
+            picks[i] = j
+    return picks
+
+
+def _value(values, picks):
+    return sum(float(values[i][k]) for i, k in enumerate(picks))
+
+
+def optimize_cart(choices, budget, overhead_percent=0, required_categories=(), locked_lines=(),
+                  rate_card=DEFAULT_RATE_CARD, templates=None, resolution=DEFAULT_RESOLUTION, time_budget=TIME_BUDGET):
+    """
+    Chooses a quantity for every TaskChoice so that the cart's total cost
+    stays within ``budget``. ``locked_lines`` (existing cart entries) are kept
+    as they are and count against the budget. Each category in
+    ``required_categories`` gets at least one unit of its best value-per-cost
+    task unless a locked line or a minimum quantity already covers it.
+
+    Returns: OptimizedCart; ``feasible`` is False when the locked lines and
+    minimum quantities alone exceed the budget, and is always checked
+    against the returned cart's actual total.
+    """
+    deadline = time.perf_counter() + time_budget
+    locked_lines = [dict(line) for line in locked_lines]
+    locked_cost = sum(float(line.get("Direct Cost", 0)) for line in locked_lines)
+    direct_budget = budget / (1 + overhead_percent / 100) - locked_cost
+    messages = []
+
+    bounds = [[c.min_qty, max(c.min_qty, c.max_qty)] for c in choices]
+    covered = {line.get("Category") for line in locked_lines}
+    covered |= {c.category for c, (low, _) in zip(choices, bounds) if low > 0}
+    options = [_quantity_options(low, high) for low, high in bounds]
+    costs = _price_options(choices, options, rate_card, templates)
+    for category in required_categories:
+        if category in covered:
+            continue
+        candidates = [i for i, c in enumerate(choices) if c.category == category and bounds[i][1] > 0]
+        if not candidates:
+            messages.append(f"No selectable tasks in required category {category!r}.")
+            continue
+        first_unit_cost = lambda i: costs[i][options[i].index(0) + 1 if 0 in options[i] else 0]
+        best = max(candidates, key=lambda i: choices[i].weight / max(first_unit_cost(i), 0.01))
+        keep = [k for k, q in enumerate(options[best]) if q > 0]
+        bounds[best][0] = 1
+        options[best] = [options[best][k] for k in keep]
+        costs[best] = costs[best][keep]
+        covered.add(category)
+    values = [np.array([c.weight * q / high if high else 0.0 for q in qs])
+              for c, qs, (_, high) in zip(choices, options, bounds)]
+
+    floor = np.array([int(np.argmin(c)) for c in costs], dtype=np.intp)
+    if sum(float(c.min()) for c in costs) > direct_budget + 1e-9:
+        messages.append("Locked lines and minimum quantities alone exceed the budget.")
+        return _result(choices, options, costs, values, floor, locked_lines, overhead_percent, "minimum", False,
+                       messages, budget)
+
+    if direct_budget <= 0:
+        # Nothing left to spend: the DP grid needs a positive budget, and only free options fit anyway.
+        return _result(choices, options, costs, values, floor, locked_lines, overhead_percent, "minimum", True,
+                       messages, budget)
+
+    method, picks = "greedy", _fill_greedy(floor.copy(), costs, values, direct_budget)
+    cells = sum(len(qs) for qs in options) * (resolution + 1)
+    if cells <= MAX_DP_CELLS:
+        dp_picks = _solve_dp(costs, values, direct_budget, resolution, deadline)
+        if dp_picks is not None:
+            dp_picks = _fill_greedy(dp_picks, costs, values, direct_budget)
+            # The budget grid rounds costs up, so the greedy fill can occasionally win.
+            if _value(values, dp_picks) >= _value(values, picks):
+                method, picks = "knapsack", dp_picks
+    return _result(choices, options, costs, values, picks, locked_lines, overhead_percent, method, True, messages,
+                   budget)
+
+
+def _result(choices, options, costs, values, picks, locked_lines, overhead_percent, method, feasible, messages, budget):
+    lines = list(locked_lines)
+    value = 0.0
+    for i, k in enumerate(picks):
+        quantity = options[i][k]
+        if quantity <= 0:
+            continue
+        choice = choices[i]
+        lines.append({"Category": choice.category, "Subcategory": choice.subcategory, "Task": choice.task,
+                      "Quantity": quantity, "Direct Cost": round(float(costs[i][k]), 2), "Modifiers": choice.modifiers})
+        value += float(values[i][k])
+    direct = round(sum(float(line.get("Direct Cost", 0)) for line in lines), 2)
+    total = round(direct * (1 + overhead_percent / 100), 2)
+    # Whatever the solver believed, the cart is only feasible if its actual cost fits.
+    if feasible and total > budget + 0.005:
+        feasible = False
+        messages = messages + [f"The cart's total of ${total:,.2f} exceeds the budget."]
+    return OptimizedCart(lines, direct, total, value, method, feasible, " ".join(messages))
@@ -0,0 +1,244 @@
+"""
+Headless pricing engine for the Research Project Scoping Tool.
+
+Prices whole arrays of cart lines (category, subcategory, units, overrides)
+against one or more rate cards in a single NumPy pass. Nothing in here
+imports Streamlit, so the quoting desk, batch jobs and the app share it.
+
+Per-category hour defaults come from rate_templates.csv, compiled once into
+a RateTemplateTable keyed by (category, subcategory). The same file decides
+which cart lines are priced from their template at all: every row naming
+both a category and a subcategory.
+"""
+import csv
+import os
+from collections import namedtuple
+
+import numpy as np
+
+TIERS = ("tier1", "tier2", "tier3")
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rate_templates.csv")
+
+# ----------------- Rate Cards -----------------
+RateCard = namedtuple("RateCard", ["tier1_rate", "tier2_rate", "tier3_rate"])
+DEFAULT_RATE_CARD = RateCard(300, 200, 100)
+
+PricedLines = namedtuple("PricedLines", ["labor_cost", "tier1_hours", "tier2_hours", "tier3_hours"])
+
+# Staff roles named in the task library, by the rate tier (0-2) they bill at.
+STAFF_ROLE_TIERS = {
+    "pi": 0, "principal investigator": 0, "research scientist": 0, "strategy consultant": 0, "advisor": 0,
+    "project manager": 1, "analyst": 1, "facilitator": 1, "irb specialist": 1, "nurse": 1,
+    "coordinator": 2, "research assistant": 2, "survey administrator": 2, "lab technician": 2,
+}
+
+
+def staff_role_rate(staff_roles, rate_card=DEFAULT_RATE_CARD):
+    """
+    Hourly rate of a task's lead staff role, the first one listed in a
+    "Staff Role(s)" cell such as "Coordinator, PI".
+
+    Returns: the rate, or None when no role is listed or the lead role has
+    no tier in STAFF_ROLE_TIERS.
+    """
+    lead = (staff_roles or "").split(",")[0].strip().lower()
+    tier = STAFF_ROLE_TIERS.get(lead)
+    return None if tier is None else float(rate_card[tier])
+
+
+# ----------------- Compiled Rate Templates -----------------
+class RateTemplateTable:
+    """
+    Precompiled hour templates keyed by (category, subcategory).
+
+    Every template has a fixed and a per-unit hour value for each tier, so a
+    line's hours are ``fixed + per_unit * units``. A blank subcategory is the
+    category-wide template and a blank category the catch-all; lookups fall
+    back in that order and are memoized, so each pair costs one dict hit.
+
+    Cart lines of a (category, subcategory) pair with its own row are
+    ``template_priced``: they cost their template labor per unit, and
+    ``unit_labels`` / ``default_units`` say what a unit is called and how
+    many the Manual Builder starts with (None: the scope's Estimated N).
+    Lines matched only by a category-wide or catch-all row cost Base Cost
+    x quantity.
+    """
+
+    def __init__(self, templates):
+        keys = list(templates)
+        if ("", "") not in templates:
+            raise ValueError("Rate templates must define a catch-all row with a blank Category and Subcategory.")
+        self.keys = keys
+        self.fixed = np.array([[float(templates[key].get(f"{tier}_fixed", 0)) for tier in TIERS] for key in keys])
+        self.per_unit = np.array([[float(templates[key].get(f"{tier}_per_unit", 0)) for tier in TIERS] for key in keys])
+        self._index = {key: i for i, key in enumerate(keys)}
+        self._resolved = {}
+        self.template_priced = frozenset(key for key in keys if key[0] and key[1])
+        self.unit_labels = {key: templates[key].get("unit_label") or "Units" for key in self.template_priced}
+        self.default_units = {key: templates[key].get("default_units") for key in self.template_priced}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_csv(cls, path=TEMPLATES_PATH):
+        """
+        Loads templates from a CSV with Category, Subcategory and
+        "Tier N Fixed"/"Tier N Per Unit" columns. Missing hour cells count as 0.
+        Optional "Unit Label" and "Default Units" columns describe the units
+        of template-priced rows.
+        """
+        templates = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                key = ((row.get("Category") or "").strip(), (row.get("Subcategory") or "").strip())
+                if key in templates:
+                    raise ValueError(f"Duplicate rate template for {key} in {path}.")
+                template = {}
+                for n, tier in enumerate(TIERS, start=1):
+                    template[f"{tier}_fixed"] = float(row.get(f"Tier {n} Fixed") or 0)
+                    template[f"{tier}_per_unit"] = float(row.get(f"Tier {n} Per Unit") or 0)
+                template["unit_label"] = (row.get("Unit Label") or "").strip()
+                default_units = (row.get("Default Units") or "").strip()
+                template["default_units"] = int(float(default_units)) if default_units else None
+                templates[key] = template
+        return cls(templates)
+
+    def lookup(self, category, subcategory=""):
+        """
+        Returns the row index of the template that applies to a
+        (category, subcategory) pair.
+        """
+        key = (category, subcategory)
+        idx = self._resolved.get(key)
+        if idx is None:
+            for candidate in (key, (category, ""), ("", "")):
+                idx = self._index.get(candidate)
+                if idx is not None:
+                    break
+            self._resolved[key] = idx
+        return idx
+
+    def rows(self, categories, subcategories):
+        return np.fromiter((self.lookup(c, s) for c, s in zip(categories, subcategories)),
+                           dtype=np.intp, count=len(categories))
+
+
+_default_table = None
+_default_table_mtime = None
+
+
+def default_templates():
+    """
+    Returns the table compiled from rate_templates.csv, recompiling only when
+    the file changes on disk.
+    """
+    global _default_table, _default_table_mtime
+    mtime = os.path.getmtime(TEMPLATES_PATH)
+    if _default_table is None or mtime != _default_table_mtime:
+        _default_table = RateTemplateTable.from_csv(TEMPLATES_PATH)
+        _default_table_mtime = mtime
+    return _default_table
+
+
+def _as_rate_matrix(rate_cards):
+    rates = np.asarray(rate_cards, dtype=float)
+    if rates.ndim == 1:
+        rates = rates.reshape(1, 3)
+    if rates.shape[-1] != 3:
+        raise ValueError("Rate cards must provide exactly three tier rates.")
+    return rates
+
+
+# ----------------- Vectorized Pricing -----------------
+def line_hours(categories, subcategories, units, overrides=None, templates=None):
+    """
+    Computes per-tier hours for every line.
+
+    Overrides (a sequence aligned with the lines, entries may be None)
+    replace the template's ``tierN_fixed``/``tierN_per_unit`` values for that
+    line only; any other keys in them are ignored.
+
+    Returns: an (n_lines, 3) array of Tier 1/2/3 hours.
+    """
+    if templates is None:
+        templates = default_templates()
+    categories = np.asarray(categories, dtype=object).ravel()
+    subcategories = np.asarray(subcategories, dtype=object).ravel()
+    units = np.asarray(units, dtype=float).ravel()
+    if not (len(categories) == len(subcategories) == len(units)):
+        raise ValueError("categories, subcategories and units must have the same length.")
+
+    rows = templates.rows(categories, subcategories)
+    fixed = templates.fixed[rows]
+    per_unit = templates.per_unit[rows]
+
+    if overrides is not None:
+        for i, custom in enumerate(overrides):
+            if not custom:
+                continue
+            for t, tier in enumerate(TIERS):
+                if f"{tier}_fixed" in custom:
+                    fixed[i, t] = custom[f"{tier}_fixed"]
+                if f"{tier}_per_unit" in custom:
+                    per_unit[i, t] = custom[f"{tier}_per_unit"]
+
+    return fixed + per_unit * units[:, None]
+
+
+def price_lines(categories, subcategories, units, overrides=None, rate_cards=DEFAULT_RATE_CARD, templates=None):
+    """
+    Prices a batch of cart lines in one pass.
+
+    ``rate_cards`` is either a single (tier1, tier2, tier3) rate card or an
+    (n_cards, 3) array; with several cards the labor cost comes back as an
+    (n_lines, n_cards) matrix so a whole rate-card change can be repriced at
+    once.
+
+    Returns: PricedLines(labor_cost, tier1_hours, tier2_hours, tier3_hours)
+    """
+    hours = line_hours(categories, subcategories, units, overrides, templates)
+    rates = _as_rate_matrix(rate_cards)
+    labor_cost = hours @ rates.T
+    if np.ndim(rate_cards) == 1:
+        labor_cost = labor_cost[:, 0]
+    return PricedLines(labor_cost, hours[:, 0], hours[:, 1], hours[:, 2])
+
+
+def price_task(category, subcategory, num_units, custom_overrides=None, rate_card=DEFAULT_RATE_CARD, templates=None):
+    """
+    Single-line convenience wrapper around price_lines.
+
+    Returns: labor_cost, tier1_hours, tier2_hours, tier3_hours
+    """
+    priced = price_lines([category], [subcategory], [num_units], [custom_overrides], rate_card, templates)
+    return (float(priced.labor_cost[0]), float(priced.tier1_hours[0]),
+            float(priced.tier2_hours[0]), float(priced.tier3_hours[0]))
+
+
+def price_cart_lines(categories, subcategories, quantities, base_costs, overrides=None,
+                     rate_card=DEFAULT_RATE_CARD, templates=None):
+    """
+    Direct cost of each cart line, following the Manual Builder's rules:
+    template-priced lines (see RateTemplateTable) cost their template labor
+    for ``quantities`` units, everything else costs ``base_costs *
+    quantities``. Costs are rounded to cents like the cart entries the app
+    stores.
+
+    Returns: an array of direct costs aligned with the lines.
+    """
+    if templates is None:
+        templates = default_templates()
+    quantities = np.asarray(quantities, dtype=float).ravel()
+    base_costs = np.asarray(base_costs, dtype=float).ravel()
+    template_priced = templates.template_priced
+    templated = np.fromiter(((c, s) in template_priced for c, s in zip(categories, subcategories)),
+                            dtype=bool, count=len(quantities))
+    direct = base_costs * quantities
+    if templated.any():
+        idx = np.flatnonzero(templated)
+        line_overrides = None if overrides is None else [overrides[i] for i in idx]
+        priced = price_lines([categories[i] for i in idx], [subcategories[i] for i in idx], quantities[idx],
+                             line_overrides, rate_card, templates)
+        direct[idx] = priced.labor_cost
+    return np.round(direct, 2)
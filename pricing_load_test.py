@@ -0,0 +1,245 @@
+"""
+Load generator for pricing_server.py.
+
+Starts a pricing server in a subprocess (or targets a running one with
+--url), then keeps ``--concurrency`` keep-alive connections busy for
+``--duration`` seconds with quotes of random catalog tasks, and reports
+quotes per second, latency percentiles and how well the server coalesced the
+load into batches.
+
+    python pricing_load_test.py                                # single-quote requests
+    python pricing_load_test.py --quotes-per-request 50        # POST /v1/quotes
+    python pricing_load_test.py --url http://127.0.0.1:8780 --duration 30 --min-qps 2000
+
+With --min-qps the run exits non-zero when throughput falls below it.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import Pool
+from urllib.parse import urlsplit
+
+from task_library import load_catalog
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pricing_server.py")
+PAYLOAD_VARIANTS = 256
+SEED = 20240501
+
+
+# ----------------- Payloads -----------------
+def make_payloads(lines_per_quote, quotes_per_request, count=PAYLOAD_VARIANTS, seed=SEED):
+    """
+    Pre-encoded request bodies, so the clients spend their time waiting on
+    the server rather than building JSON.
+
+    Returns: list of (path, body bytes)
+    """
+    rng = random.Random(seed)
+    records = [record for record in load_catalog().records if record["Priced"]]
+    phases = ["Discovery", "Launch", "Data Collection", "Analysis"]
+
+    def quote(n):
+        lines = []
+        for _ in range(lines_per_quote):
+            record = rng.choice(records)
+            lines.append({"Category": record["Category"], "Subcategory": record["Subcategory"],
+                          "Task": record["Task Name"], "Quantity": rng.randint(1, 50), "Phase": rng.choice(phases)})
+        return {"id": f"LT-{n}", "lines": lines}
+
+    payloads = []
+    for n in range(count):
+        if quotes_per_request == 1:
+            payloads.append(("/v1/quote", json.dumps(quote(n)).encode("utf-8")))
+        else:
+            body = {"quotes": [quote(n * quotes_per_request + i) for i in range(quotes_per_request)]}
+            payloads.append(("/v1/quotes", json.dumps(body).encode("utf-8")))
+    return payloads
+
+
+# ----------------- Clients -----------------
+def _connection_loop(host, port, payloads, deadline, offset, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = offset
+    while time.perf_counter() < deadline:
+        path, body = payloads[i % len(payloads)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(1)
+    conn.close()
+
+
+def run_client(job):
+    """
+    One client process: ``connections`` threads, each with its own
+    keep-alive connection. Runs in a worker process so the clients' own
+    Python overhead isn't limited to one core.
+
+    Returns: (latencies in seconds, error count)
+    """
+    host, port, payloads, connections, deadline_in, offset = job
+    deadline = time.perf_counter() + deadline_in
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_connection_loop,
+                                args=(host, port, payloads, deadline, offset + c * 7, latencies, errors))
+               for c in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+
+# ----------------- Server -----------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _get(url, path):
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=5)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read().decode("utf-8")
+    finally:
+        conn.close()
+
+
+def start_server(extra_args=()):
+    """
+    Runs pricing_server.py in a subprocess on a free port and waits until it
+    answers. Returns: (process, base URL)
+    """
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, SERVER_PATH, "--port", str(port), *extra_args],
+                               stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"pricing_server.py exited with status {process.returncode}")
+        try:
+            if _get(url, "/v1/health")[0] == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("pricing_server.py did not start within 60 seconds")
+
+
+def server_counters(url):
+    """
+    The server's coalescing counters from GET /metrics, or {} if unavailable.
+    """
+    try:
+        status, text = _get(url, "/metrics")
+    except OSError:
+        return {}
+    if status != 200:
+        return {}
+    counters = {}
+    for name in ("pricing_batches", "pricing_batch_quotes", "pricing_batch_lines"):
+        match = re.search(rf"^proposal_{name}_total (\S+)$", text, re.MULTILINE)
+        counters[name] = float(match.group(1)) if match else 0.0
+    return counters
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the pricing server.")
+    parser.add_argument("--url", help="Base URL of a running server (default: start one).")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load for.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Keep-alive connections in total.")
+    parser.add_argument("--processes", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="Client processes the connections are spread over.")
+    parser.add_argument("--lines-per-quote", type=int, default=5)
+    parser.add_argument("--quotes-per-request", type=int, default=1,
+                        help="Above 1, requests go to POST /v1/quotes with this many quotes each.")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Seconds of load before measuring.")
+    parser.add_argument("--min-qps", type=float, default=0.0, help="Fail when quotes/second falls below this.")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if not url:
+        process, url = start_server()
+    try:
+        parts = urlsplit(url)
+        payloads = make_payloads(args.lines_per_quote, args.quotes_per_request)
+        processes = max(1, min(args.processes, args.concurrency))
+        per_process = [args.concurrency // processes + (i < args.concurrency % processes) for i in range(processes)]
+
+        def jobs(duration):
+            return [(parts.hostname, parts.port, payloads, connections, duration, i * 1000)
+                    for i, connections in enumerate(per_process)]
+
+        with Pool(processes) as pool:
+            if args.warmup > 0:
+                pool.map(run_client, jobs(args.warmup))
+            before = server_counters(url)
+            start = time.perf_counter()
+            results = pool.map(run_client, jobs(args.duration))
+            elapsed = time.perf_counter() - start
+        after = server_counters(url)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    latencies = sorted(latency for chunk, _ in results for latency in chunk)
+    errors = sum(count for _, count in results)
+    quotes = len(latencies) * args.quotes_per_request
+    qps = quotes / elapsed
+    print(f"{len(latencies)} requests, {quotes} quotes, {quotes * args.lines_per_quote} lines in {elapsed:.1f}s "
+          f"over {args.concurrency} connections ({processes} client processes)")
+    print(f"quotes/s      {qps:12.0f}")
+    print(f"lines/s       {qps * args.lines_per_quote:12.0f}")
+    print(f"requests/s    {len(latencies) / elapsed:12.0f}")
+    if latencies:
+        print(f"latency ms    p50 {_percentile(latencies, 0.5) * 1000:.2f}  p95 {_percentile(latencies, 0.95) * 1000:.2f}"
+              f"  p99 {_percentile(latencies, 0.99) * 1000:.2f}  max {latencies[-1] * 1000:.2f}"
+              f"  mean {statistics.fmean(latencies) * 1000:.2f}")
+    print(f"errors        {errors:12d}")
+    batches = after.get("pricing_batches", 0) - before.get("pricing_batches", 0)
+    if batches:
+        batch_quotes = after["pricing_batch_quotes"] - before["pricing_batch_quotes"]
+        batch_lines = after["pricing_batch_lines"] - before["pricing_batch_lines"]
+        print(f"coalescing    {batches:.0f} pricing calls, {batch_quotes / batches:.1f} quotes "
+              f"/ {batch_lines / batches:.1f} lines per call")
+    if errors or qps < args.min_qps:
+        if qps < args.min_qps:
+            print(f"\nThroughput {qps:.0f} quotes/s is below the required {args.min_qps:.0f}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,450 @@
+"""
+Local batch pricing API.
+
+A small HTTP/JSON service that prices cart lines with the same cost logic as
+the app (compute_task_cost / price_cart_lines) and the Budget tab's overhead
+and total math, for systems that need quotes without going through the UI.
+
+    python pricing_server.py --port 8780 --overhead 39
+
+POST /v1/quote prices one quote::
+
+    {"id": "Q-1", "overhead_percent": 39, "rate_card": {"tier1_rate": 325},
+     "lines": [{"Category": "Data Collection & Management", "Subcategory": "Self-Reported Survey",
+                "Task": "Self-Reported Survey Administration", "Quantity": 200, "Phase": "Launch"}]}
+
+and answers with every line's Direct Cost plus the quote's direct cost,
+overhead, total and category/phase rollups. POST /v1/quotes takes
+{"quotes": [...]} and answers {"quotes": [...]}, with an "error" entry in
+place of any quote that couldn't be priced. Lines follow batch_quotes.py: a
+line that already carries a Direct Cost is kept as is, Subcategory may be
+left out, and Modifiers may override the base cost or template hours.
+GET /v1/health reports the catalog and defaults; GET /metrics serves the
+metrics.py counters and spans in the Prometheus text format.
+
+Handler threads only parse and look tasks up in the (cached) catalog. The
+actual pricing is done by one coalescer thread: whatever quotes arrived while
+it was busy are priced together, one vectorized price_cart_lines call per
+rate card, so under load thousands of small quotes cost a handful of NumPy
+calls instead of one each. See pricing_load_test.py for a load generator.
+"""
+import argparse
+import json
+import math
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+from batch_quotes import DEFAULT_OVERHEAD_PERCENT
+from cart import CartTotals
+from pricing_engine import DEFAULT_RATE_CARD, RateCard, default_templates, price_cart_lines
+from task_library import CATALOG_PATH, load_catalog, unpriced
+
+DEFAULT_PORT = 8780
+# Most lines priced in one vectorized call, and most lines accepted in one request.
+MAX_BATCH_LINES = 50_000
+MAX_REQUEST_LINES = 100_000
+# How often the catalog file is checked for changes; lookups in between use the cached catalog.
+CATALOG_CHECK_SECONDS = 5.0
+REQUEST_TIMEOUT_SECONDS = 30.0
+
+
+class QuoteError(ValueError):
+    pass
+
+
+# ----------------- Quote Preparation -----------------
+class PendingQuote:
+    """
+    A parsed quote waiting for the coalescer: its entries, the indexes of the
+    lines still to price with their pricing inputs, and the Future its
+    handler thread waits on.
+    """
+
+    __slots__ = ("quote_id", "entries", "todo", "categories", "subcategories", "quantities", "base_costs",
+                 "overrides", "rate_card", "overhead_percent", "future")
+
+    def __init__(self, quote_id, rate_card, overhead_percent):
+        self.quote_id = quote_id
+        self.entries = []
+        self.todo = []
+        self.categories, self.subcategories, self.quantities, self.base_costs, self.overrides = [], [], [], [], []
+        self.rate_card = rate_card
+        self.overhead_percent = overhead_percent
+        self.future = Future()
+
+
+def _number(value, what, minimum=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise QuoteError(f"{what} must be a number.") from None
+    if not math.isfinite(value):
+        raise QuoteError(f"{what} must be a finite number.")
+    if minimum is not None and value < minimum:
+        raise QuoteError(f"{what} must be at least {minimum}.")
+    return value
+
+
+def parse_rate_card(value, default=DEFAULT_RATE_CARD):
+    """
+    A RateCard from a request's partial {"tier1_rate": ...} mapping, with the
+    missing tiers taken from ``default``.
+    """
+    if not value:
+        return default
+    if not isinstance(value, dict):
+        raise QuoteError("rate_card must be an object.")
+    unknown = set(value) - set(RateCard._fields)
+    if unknown:
+        raise QuoteError(f"Unknown rate_card field(s): {', '.join(sorted(unknown))}.")
+    return default._replace(**{field: _number(rate, f"rate_card.{field}", 0) for field, rate in value.items()})
+
+
+def prepare_quote(quote, catalog, rate_card=DEFAULT_RATE_CARD, overhead_percent=DEFAULT_OVERHEAD_PERCENT):
+    """
+    Validates a quote request and looks its tasks up in the catalog.
+
+    Raises QuoteError with the offending line's number on bad input.
+    Returns: PendingQuote
+    """
+    if not isinstance(quote, dict):
+        raise QuoteError("A quote must be an object.")
+    lines = quote.get("lines")
+    if not isinstance(lines, list) or not lines:
+        raise QuoteError("A quote needs a non-empty \"lines\" list.")
+    pending = PendingQuote(quote.get("id"), parse_rate_card(quote.get("rate_card"), rate_card),
+                           _number(quote.get("overhead_percent", overhead_percent), "overhead_percent", 0))
+    template_priced = default_templates().template_priced
+    for number, line in enumerate(lines, start=1):
+        if not isinstance(line, dict):
+            raise QuoteError(f"Line {number}: must be an object.")
+        entry = dict(line)
+        pending.entries.append(entry)
+        if entry.get("Direct Cost") not in (None, ""):
+            entry["Direct Cost"] = _number(entry["Direct Cost"], f"Line {number}: Direct Cost")
+            continue
+        if not isinstance(entry.get("Category"), str) or not isinstance(entry.get("Task"), str):
+            raise QuoteError(f"Line {number}: Category and Task must be strings.")
+        if not isinstance(entry.get("Subcategory") or "", str):
+            raise QuoteError(f"Line {number}: Subcategory must be a string.")
+        try:
+            task = catalog.task(entry["Category"], entry.get("Subcategory") or None, entry["Task"])
+        except KeyError as e:
+            raise QuoteError(f"Line {number}: {e.args[0] if e.args else e}") from None
+        entry["Subcategory"] = task["Subcategory"]
+        entry["Quantity"] = _number(entry.get("Quantity", 1), f"Line {number}: Quantity", 0)
+        modifiers = entry.get("Modifiers") or {}
+        if not isinstance(modifiers, dict):
+            raise QuoteError(f"Line {number}: Modifiers must be an object.")
+        if unpriced(task, modifiers, template_priced):
+            raise QuoteError(f"Line {number}: {task['Task Name']!r} has no Base Cost in the task library; "
+                             "give the line a Direct Cost or a Base Cost modifier.")
+        pending.todo.append(len(pending.entries) - 1)
+        pending.categories.append(entry["Category"])
+        pending.subcategories.append(entry["Subcategory"])
+        pending.quantities.append(entry["Quantity"])
+        pending.base_costs.append(_number(modifiers.get("Base Cost", task["Base Cost"]), f"Line {number}: Base Cost", 0))
+        pending.overrides.append(modifiers)
+    return pending
+
+
+def quote_result(pending):
+    """
+    The response body of a priced quote, with the app's Budget tab math.
+    """
+    totals = CartTotals.from_lines(pending.entries)
+    overhead_percent = pending.overhead_percent
+    return {"id": pending.quote_id, "lines": pending.entries, "rate_card": pending.rate_card._asdict(),
+            "overhead_percent": overhead_percent, "direct_cost": totals.direct_cost,
+            "overhead": round(totals.overhead(overhead_percent), 2),
+            "total_cost": round(totals.total(overhead_percent), 2),
+            "by_category": totals.by_category, "by_phase": totals.by_phase}
+
+
+# ----------------- Request Coalescing -----------------
+class PricingCoalescer:
+    """
+    Prices quotes submitted from many threads on one worker thread.
+
+    The worker takes the first waiting quote, then everything else queued by
+    then (up to ``max_lines`` lines, optionally waiting ``max_wait`` seconds
+    for stragglers), and prices each rate card's lines in one
+    price_cart_lines call. With no load a quote is priced on its own as soon
+    as it arrives; the busier the server, the larger the batches.
+    """
+
+    def __init__(self, max_lines=MAX_BATCH_LINES, max_wait=0.0, templates=None):
+        self.max_lines = max_lines
+        self.max_wait = max_wait
+        self.templates = templates
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="pricing-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, pending):
+        """
+        Returns: the quote's Future, resolved with quote_result(pending).
+        """
+        if not pending.todo:
+            pending.future.set_result(quote_result(pending))
+        else:
+            self._queue.put(pending)
+        return pending.future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        batch, line_count = [first], len(first.todo)
+        deadline = time.perf_counter() + self.max_wait
+        while line_count < self.max_lines:
+            try:
+                remaining = deadline - time.perf_counter()
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                self._queue.put(None)
+                break
+            batch.append(pending)
+            line_count += len(pending.todo)
+        return batch, line_count
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, line_count = self._collect(first)
+            metrics.increment("pricing_batches")
+            metrics.increment("pricing_batch_quotes", len(batch))
+            metrics.increment("pricing_batch_lines", line_count)
+            by_card = {}
+            for pending in batch:
+                by_card.setdefault(pending.rate_card, []).append(pending)
+            for rate_card, group in by_card.items():
+                try:
+                    self._price(rate_card, group)
+                except Exception as e:
+                    for pending in group:
+                        if not pending.future.done():
+                            pending.future.set_exception(e)
+
+    def _price(self, rate_card, group):
+        try:
+            costs = self._price_lines(rate_card, group)
+        except Exception:
+            if len(group) == 1:
+                raise
+            # Don't let one bad quote fail everyone else's: price the group quote by quote instead.
+            for pending in group:
+                try:
+                    self._price(rate_card, [pending])
+                except Exception as e:
+                    pending.future.set_exception(e)
+            return
+        offset = 0
+        for pending in group:
+            try:
+                for i, cost in zip(pending.todo, costs[offset:offset + len(pending.todo)]):
+                    pending.entries[i]["Direct Cost"] = cost
+                pending.future.set_result(quote_result(pending))
+            except Exception as e:
+                pending.future.set_exception(e)
+            offset += len(pending.todo)
+
+    def _price_lines(self, rate_card, group):
+        categories, subcategories, quantities, base_costs, overrides = [], [], [], [], []
+        for pending in group:
+            categories += pending.categories
+            subcategories += pending.subcategories
+            quantities += pending.quantities
+            base_costs += pending.base_costs
+            overrides += pending.overrides
+        with metrics.span("pricing_batch"):
+            return price_cart_lines(categories, subcategories, quantities, base_costs, overrides, rate_card,
+                                    self.templates).tolist()
+
+
+# ----------------- HTTP Server -----------------
+class PricingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every keep-alive reply stalls ~40ms on delayed ACKs.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path == "/v1/health":
+            catalog = self.server.catalog()
+            self._send(200, {"status": "ok", "catalog_tasks": len(catalog.records),
+                             "catalog_fingerprint": catalog.fingerprint,
+                             "rate_card": self.server.rate_card._asdict(),
+                             "overhead_percent": self.server.overhead_percent})
+        elif path == "/metrics":
+            self._send(200, metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send(404, {"error": f"No such endpoint: {self.path}"})
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/v1/quote", "/v1/quotes"):
+            self._send(404, {"error": f"No such endpoint: {self.path}"})
+            return
+        with metrics.span("pricing_request", endpoint=path):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": "The request body must be JSON."})
+                return
+            if path == "/v1/quote":
+                status, body = self._quote_one(request)
+            else:
+                status, body = self._quote_many(request)
+            self._send(status, body)
+
+    def _quote_one(self, request):
+        try:
+            future = self.server.submit(request)
+            result = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+        except QuoteError as e:
+            metrics.increment("pricing_quotes", outcome="rejected")
+            return 400, {"error": str(e)}
+        except Exception as e:
+            metrics.increment("pricing_quotes", outcome="failed")
+            return 500, {"error": f"Pricing failed: {e}"}
+        metrics.increment("pricing_quotes", outcome="priced")
+        return 200, result
+
+    def _quote_many(self, request):
+        quotes = request.get("quotes") if isinstance(request, dict) else None
+        if not isinstance(quotes, list):
+            return 400, {"error": "Expected {\"quotes\": [...]}."}
+        line_count = sum(len(q["lines"]) for q in quotes if isinstance(q, dict) and isinstance(q.get("lines"), list))
+        if line_count > MAX_REQUEST_LINES:
+            return 413, {"error": f"At most {MAX_REQUEST_LINES} lines per request."}
+        # Submit everything first so the whole request lands in as few batches as possible.
+        futures = []
+        for quote in quotes:
+            try:
+                futures.append(self.server.submit(quote))
+            except Exception as e:
+                futures.append(e)
+        results = []
+        for quote, future in zip(quotes, futures):
+            quote_id = quote.get("id") if isinstance(quote, dict) else None
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                results.append(future.result(timeout=REQUEST_TIMEOUT_SECONDS))
+                metrics.increment("pricing_quotes", outcome="priced")
+            except QuoteError as e:
+                metrics.increment("pricing_quotes", outcome="rejected")
+                results.append({"id": quote_id, "error": str(e)})
+            except Exception as e:
+                metrics.increment("pricing_quotes", outcome="failed")
+                results.append({"id": quote_id, "error": f"Pricing failed: {e}"})
+        return 200, {"quotes": results}
+
+
+class PricingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of keep-alive connections at once.
+    request_queue_size = 1024
+
+    def __init__(self, address, catalog_path=CATALOG_PATH, rate_card=DEFAULT_RATE_CARD,
+                 overhead_percent=DEFAULT_OVERHEAD_PERCENT, max_batch_lines=MAX_BATCH_LINES, max_wait=0.0):
+        super().__init__(address, PricingHandler)
+        self.catalog_path = catalog_path
+        self.rate_card = rate_card
+        self.overhead_percent = overhead_percent
+        self._catalog = load_catalog(catalog_path)
+        self._catalog_checked = time.monotonic()
+        self.coalescer = PricingCoalescer(max_batch_lines, max_wait, default_templates())
+
+    def catalog(self):
+        """
+        The cached catalog, re-checked against the file at most every
+        CATALOG_CHECK_SECONDS rather than on every request.
+        """
+        now = time.monotonic()
+        if now - self._catalog_checked > CATALOG_CHECK_SECONDS:
+            self._catalog = load_catalog(self.catalog_path)
+            self._catalog_checked = now
+        return self._catalog
+
+    def submit(self, quote):
+        return self.coalescer.submit(prepare_quote(quote, self.catalog(), self.rate_card, self.overhead_percent))
+
+    def server_close(self):
+        super().server_close()
+        self.coalescer.close()
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, **options):
+    return PricingServer((host, port), **options)
+
+
+def serve_in_thread(port=0, **options):
+    """
+    Starts a pricing server on a background thread (``port=0`` picks a free
+    port). Returns the server and its base URL; call server.shutdown() and
+    server.server_close() when done.
+    """
+    server = make_server(port=port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve cart pricing over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="Task library CSV.")
+    parser.add_argument("--overhead", type=float, default=DEFAULT_OVERHEAD_PERCENT,
+                        help="Default overhead percent for quotes that don't set one.")
+    parser.add_argument("--tier1-rate", type=float, default=DEFAULT_RATE_CARD.tier1_rate)
+    parser.add_argument("--tier2-rate", type=float, default=DEFAULT_RATE_CARD.tier2_rate)
+    parser.add_argument("--tier3-rate", type=float, default=DEFAULT_RATE_CARD.tier3_rate)
+    parser.add_argument("--max-batch-lines", type=int, default=MAX_BATCH_LINES,
+                        help="Most lines priced in one coalesced call.")
+    parser.add_argument("--max-wait-ms", type=float, default=0.0,
+                        help="How long the coalescer waits for more quotes before pricing a batch.")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, catalog_path=args.catalog,
+                         rate_card=RateCard(args.tier1_rate, args.tier2_rate, args.tier3_rate),
+                         overhead_percent=args.overhead, max_batch_lines=args.max_batch_lines,
+                         max_wait=args.max_wait_ms / 1000)
+    host, port = server.server_address[:2]
+    print(f"Pricing server listening on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
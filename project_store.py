@@ -0,0 +1,415 @@
+"""
+Persistent project store.
+
+Keeps projects (scope, phases, cart lines and task modifiers) in a local
+SQLite database so quotes survive the browser session and can be reopened
+and compared across users. Cart lines are indexed by project, category and
+phase, and cost rollups are computed in SQL. Lines added to a saved cart are
+queued and written behind in batches instead of one transaction per click;
+a batch that fails to write is kept for the next flush and reported on the
+next save or load.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+
+STORE_PATH = os.environ.get("PROJECT_STORE_PATH",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL DEFAULT '',
+    partner TEXT NOT NULL DEFAULT '',
+    project_type TEXT NOT NULL DEFAULT '',
+    overhead_percent REAL NOT NULL DEFAULT 0,
+    scope_json TEXT NOT NULL DEFAULT '{}',
+    modifiers_json TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS phases (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    start_date TEXT,
+    end_date TEXT,
+    duration_weeks INTEGER,
+    depends_on TEXT,
+    PRIMARY KEY (project_id, position)
+);
+CREATE TABLE IF NOT EXISTS cart_lines (
+    id INTEGER PRIMARY KEY,
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    subcategory TEXT NOT NULL DEFAULT '',
+    task TEXT NOT NULL DEFAULT '',
+    quantity REAL NOT NULL DEFAULT 0,
+    phase TEXT,
+    direct_cost REAL NOT NULL DEFAULT 0,
+    modifiers_json TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_projects_name ON projects(name);
+CREATE INDEX IF NOT EXISTS idx_projects_partner ON projects(partner);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_lines_position ON cart_lines(project_id, position);
+CREATE INDEX IF NOT EXISTS idx_cart_lines_category ON cart_lines(category, project_id);
+CREATE INDEX IF NOT EXISTS idx_cart_lines_phase ON cart_lines(phase, project_id);
+CREATE INDEX IF NOT EXISTS idx_phases_title ON phases(title, project_id);
+"""
+
+SCOPE_DATE_FIELDS = ("Project Start Date", "Project End Date")
+
+
+class WriteBehindError(RuntimeError):
+    """Raised when queued cart lines could not be written to the database."""
+
+
+def _json(value):
+    return json.dumps(value or {}, default=str, sort_keys=True)
+
+
+def _to_date(value):
+    if isinstance(value, str) and value:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _line_row(project_id, position, line):
+    return (project_id, position, line.get("Category", ""), line.get("Subcategory", ""), line.get("Task", ""),
+            line.get("Quantity", 0), line.get("Phase"), line.get("Direct Cost", 0), _json(line.get("Modifiers")))
+
+
+class ProjectStore:
+    """
+    SQLite-backed project repository shared by every session in the process.
+
+    Whole-project saves are written immediately. Lines added through
+    queue_add_line are buffered and applied in one transaction once
+    ``batch_size`` edits are pending or ``flush_interval`` seconds after the
+    first one, whichever comes first; call flush() to force them out (it
+    also runs at interpreter exit). Reads don't flush: they combine the
+    database with the still-queued lines, so browsing saved projects never
+    turns into a write. A flush on the timer thread has no caller to raise
+    to, so its WriteBehindError is raised by the next save_project or
+    load_project instead.
+    """
+
+    def __init__(self, path=STORE_PATH, batch_size=50, flush_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._lock = threading.RLock()
+        self._pending = []
+        self._timer = None
+        self._failure = None
+        atexit.register(self.flush)
+
+    def _migrate(self):
+        # Stores created before phase dependencies existed lack the column.
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(phases)")}
+        if "depends_on" not in columns:
+            self._conn.execute("ALTER TABLE phases ADD COLUMN depends_on TEXT")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # ----------------- Whole Projects -----------------
+    def save_project(self, scope, phases, sprint_log, task_modifiers=None, overhead_percent=0, project_id=None):
+        """
+        Inserts a project, or replaces every part of ``project_id``.
+
+        Returns: the project id.
+        """
+        self._raise_failure()
+        self.flush()
+        now = time.time()
+        fields = (scope.get("Project Name", ""), scope.get("Partner Name", ""), scope.get("Project Type", ""),
+                  overhead_percent, _json(scope), _json(task_modifiers))
+        with self._lock, self._conn:
+            if project_id is None:
+                cur = self._conn.execute(
+                    "INSERT INTO projects (name, partner, project_type, overhead_percent, scope_json, modifiers_json, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", fields + (now, now))
+                project_id = cur.lastrowid
+            else:
+                self._conn.execute(
+                    "UPDATE projects SET name = ?, partner = ?, project_type = ?, overhead_percent = ?, scope_json = ?, "
+                    "modifiers_json = ?, updated_at = ? WHERE id = ?", fields + (now, project_id))
+                self._conn.execute("DELETE FROM phases WHERE project_id = ?", (project_id,))
+                self._conn.execute("DELETE FROM cart_lines WHERE project_id = ?", (project_id,))
+            self._conn.executemany(
+                "INSERT INTO phases (project_id, position, title, description, start_date, end_date, duration_weeks, "
+                "depends_on) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(project_id, i, phase.get("Title", ""), phase.get("Description", ""),
+                  str(phase["Start"]) if phase.get("Start") else None, str(phase["End"]) if phase.get("End") else None,
+                  phase.get("DurationWeeks"), None if phase.get("DependsOn") is None else json.dumps(phase["DependsOn"]))
+                 for i, phase in enumerate(phases)])
+            self._conn.executemany(
+                "INSERT INTO cart_lines (project_id, position, category, subcategory, task, quantity, phase, "
+                "direct_cost, modifiers_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [_line_row(project_id, i, line) for i, line in enumerate(sprint_log)])
+        return project_id
+
+    def load_project(self, project_id):
+        """
+        Returns: dict with scope, phases, sprint_log, task_modifiers and
+        overhead_percent, shaped like the app's session state.
+        """
+        self._raise_failure()
+        with self._lock:
+            queued = [dict(line) for pid, line in self._pending if pid == project_id]
+            row = self._conn.execute("SELECT scope_json, modifiers_json, overhead_percent FROM projects WHERE id = ?",
+                                     (project_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No saved project with id {project_id}.")
+            phase_rows = self._conn.execute(
+                "SELECT title, description, start_date, end_date, duration_weeks, depends_on FROM phases "
+                "WHERE project_id = ? ORDER BY position", (project_id,)).fetchall()
+            line_rows = self._conn.execute(
+                "SELECT category, subcategory, task, quantity, phase, direct_cost, modifiers_json FROM cart_lines "
+                "WHERE project_id = ? ORDER BY position", (project_id,)).fetchall()
+        scope = json.loads(row[0])
+        for field in SCOPE_DATE_FIELDS:
+            if field in scope:
+                scope[field] = _to_date(scope[field])
+        phases = []
+        for title, desc, start, end, weeks, depends_on in phase_rows:
+            phase = {"Title": title, "Description": desc, "Start": _to_date(start), "End": _to_date(end),
+                     "DurationWeeks": weeks}
+            if depends_on is not None:
+                phase["DependsOn"] = json.loads(depends_on)
+            phases.append(phase)
+        sprint_log = []
+        for category, subcategory, task, quantity, phase, direct_cost, modifiers in line_rows:
+            line = {"Category": category, "Subcategory": subcategory, "Task": task,
+                    "Quantity": int(quantity) if float(quantity).is_integer() else quantity,
+                    "Direct Cost": direct_cost, "Modifiers": json.loads(modifiers)}
+            if phase:
+                line["Phase"] = phase
+            sprint_log.append(line)
+        sprint_log.extend(queued)
+        return {"scope": scope, "phases": phases, "sprint_log": sprint_log,
+                "task_modifiers": json.loads(row[1]), "overhead_percent": row[2]}
+
+    def delete_project(self, project_id):
+        self.flush()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+
+    def list_projects(self, partner=None, name_like=None, category=None, phase=None, limit=500):
+        """
+        Lists saved projects, newest first, with their SQL-computed totals.
+        Filters use the partner/name indexes and, for ``category`` and
+        ``phase``, only keep projects with at least one matching cart line.
+        """
+        with self._lock:
+            queued = list(self._pending)
+        where, args = [], []
+        if partner:
+            where.append("p.partner = ?")
+            args.append(partner)
+        if name_like:
+            where.append("p.name LIKE ?")
+            args.append(f"%{name_like}%")
+        for column, field, value in (("category", "Category", category), ("phase", "Phase", phase)):
+            if not value:
+                continue
+            clause = f"EXISTS (SELECT 1 FROM cart_lines c WHERE c.{column} = ? AND c.project_id = p.id)"
+            args.append(value)
+            matched = sorted({pid for pid, line in queued if line.get(field) == value})
+            if matched:
+                clause = f"({clause} OR p.id IN ({','.join('?' * len(matched))}))"
+                args.extend(matched)
+            where.append(clause)
+        sql = ("SELECT p.id, p.name, p.partner, p.project_type, p.overhead_percent, p.updated_at, "
+               "COUNT(c.id), COALESCE(SUM(c.direct_cost), 0) "
+               "FROM projects p LEFT JOIN cart_lines c ON c.project_id = p.id")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY p.id ORDER BY p.updated_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, args + [limit]).fetchall()
+            # Re-read under the same lock as the query so a flush in between can't count a line twice.
+            queued = list(self._pending)
+        counts, costs = {}, {}
+        for pid, line in queued:
+            counts[pid] = counts.get(pid, 0) + 1
+            costs[pid] = costs.get(pid, 0) + float(line.get("Direct Cost", 0))
+        rows = [(pid, name, partner_name, ptype, overhead, updated, lines + counts.get(pid, 0), direct + costs.get(pid, 0))
+                for pid, name, partner_name, ptype, overhead, updated, lines, direct in rows]
+        return [{"id": pid, "name": name, "partner": partner_name, "project_type": ptype, "lines": lines,
+                 "direct_cost": round(direct, 2), "overhead": round(direct * overhead / 100, 2),
+                 "total_cost": round(direct * (1 + overhead / 100), 2), "updated_at": updated}
+                for pid, name, partner_name, ptype, overhead, updated, lines, direct in rows]
+
+    # ----------------- SQL Rollups -----------------
+    def _rollup(self, column, field, project_ids):
+        placeholders = ",".join("?" * len(project_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT project_id, COALESCE({column}, ''), SUM(direct_cost) FROM cart_lines "
+                f"WHERE project_id IN ({placeholders}) GROUP BY project_id, {column}", list(project_ids)).fetchall()
+            queued = [(pid, line) for pid, line in self._pending if pid in project_ids]
+        totals = {(pid, key): total for pid, key, total in rows}
+        for pid, line in queued:
+            key = (pid, line.get(field) or "")
+            totals[key] = totals.get(key, 0) + float(line.get("Direct Cost", 0))
+        return [(pid, key, total) for (pid, key), total in totals.items()]
+
+    def cost_by_category(self, project_ids):
+        """
+        Returns: {project id: {category: direct cost}}
+        """
+        result = {pid: {} for pid in project_ids}
+        for pid, category, total in self._rollup("category", "Category", project_ids):
+            result[pid][category] = round(total, 2)
+        return result
+
+    def cost_by_phase(self, project_ids):
+        """
+        Returns: {project id: {phase: direct cost}}; lines without a phase are
+        reported under "".
+        """
+        result = {pid: {} for pid in project_ids}
+        for pid, phase, total in self._rollup("phase", "Phase", project_ids):
+            result[pid][phase] = round(total, 2)
+        return result
+
+    # ----------------- Write-Behind Cart Edits -----------------
+    def queue_add_line(self, project_id, line):
+        self._queue((project_id, dict(line)))
+
+    def edit_lines(self, project_id, updates=None, removals=()):
+        """
+        Applies a bulk cart edit in one transaction: ``updates`` maps a line
+        position to the full updated line and ``removals`` lists positions to
+        delete, all relative to the cart before the edit. Remaining lines are
+        renumbered to stay contiguous.
+        """
+        self.flush()
+        removals = set(removals)
+        with self._lock, self._conn:
+            for position, line in (updates or {}).items():
+                if position in removals:
+                    continue
+                self._conn.execute(
+                    "UPDATE cart_lines SET quantity = ?, phase = ?, direct_cost = ? WHERE project_id = ? AND position = ?",
+                    (line.get("Quantity", 0), line.get("Phase"), line.get("Direct Cost", 0), project_id, position))
+            if removals:
+                self._conn.executemany("DELETE FROM cart_lines WHERE project_id = ? AND position = ?",
+                                       [(project_id, position) for position in removals])
+                # Renumber through negative positions so the unique index never sees a duplicate.
+                remaining = [row[0] for row in self._conn.execute(
+                    "SELECT position FROM cart_lines WHERE project_id = ? ORDER BY position", (project_id,))]
+                self._conn.execute("UPDATE cart_lines SET position = -position - 1 WHERE project_id = ?", (project_id,))
+                self._conn.executemany("UPDATE cart_lines SET position = ? WHERE project_id = ? AND position = ?",
+                                       [(new, project_id, -old - 1) for new, old in enumerate(remaining)])
+            self._conn.execute("UPDATE projects SET updated_at = ? WHERE id = ?", (time.time(), project_id))
+
+    def _queue(self, edit):
+        with self._lock:
+            self._pending.append(edit)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Writes every queued cart line in a single transaction. If that fails,
+        the lines are put back at the head of the queue (except those of
+        projects deleted since, which have nowhere to go) and
+        WriteBehindError is raised.
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            edits, self._pending = self._pending, []
+            try:
+                self._write_lines(edits)
+            except sqlite3.Error as exc:
+                kept = self._requeue(edits)
+                dropped = len(edits) - kept
+                message = f"{len(edits)} queued cart line(s) couldn't be saved ({exc}); {kept} will be retried"
+                if dropped:
+                    message += f" and {dropped} for deleted projects were discarded"
+                raise WriteBehindError(message + ".") from exc
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except WriteBehindError as exc:
+            with self._lock:
+                self._failure = exc
+
+    def _raise_failure(self):
+        with self._lock:
+            failure, self._failure = self._failure, None
+        if failure is not None:
+            raise failure
+
+    def _requeue(self, edits):
+        """
+        Puts failed edits back in front of the queue. Returns: how many were kept.
+        """
+        ids = sorted({project_id for project_id, _ in edits})
+        try:
+            existing = {row[0] for row in self._conn.execute(
+                f"SELECT id FROM projects WHERE id IN ({','.join('?' * len(ids))})", ids)}
+        except sqlite3.Error:
+            existing = set(ids)
+        kept = [(project_id, line) for project_id, line in edits if project_id in existing]
+        self._pending = kept + self._pending
+        return len(kept)
+
+    def _write_lines(self, edits):
+        touched = set()
+        with self._conn:
+            for project_id, line in edits:
+                touched.add(project_id)
+                (position,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM cart_lines WHERE project_id = ?",
+                    (project_id,)).fetchone()
+                self._conn.execute(
+                    "INSERT INTO cart_lines (project_id, position, category, subcategory, task, quantity, "
+                    "phase, direct_cost, modifiers_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    _line_row(project_id, position, line))
+            now = time.time()
+            self._conn.executemany("UPDATE projects SET updated_at = ? WHERE id = ?",
+                                   [(now, project_id) for project_id in touched])
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=STORE_PATH):
+    """
+    Returns the process-wide ProjectStore for ``path``.
+    """
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = ProjectStore(path)
+        return store
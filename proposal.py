@@ -0,0 +1,374 @@
+"""
+Proposal prompt and document construction.
+
+Builds the AI prompt and the Markdown proposal document from the scope,
+phases, sprint log and cart totals without touching Streamlit, so the app and
+the batch quoting CLI render identical output. The AI prompt comes either as
+one whole-proposal prompt or as one sub-prompt per proposal section for
+parallel generation. The document itself is written incrementally to any
+file-like sink as Markdown or HTML, with the budget table also available as
+CSV or XLSX.
+"""
+import csv
+import io
+from collections import namedtuple
+from html import escape
+
+from burn import burn_rows, monthly, quarterly
+from metrics import span
+
+HISTORICAL_INSPIRATION = (
+    "Our previous proposal, 'A Vision for the Development of a Protocol for a Longitudinal Healthy Aging Study in The Villages, Florida,' "
+    "was structured around key sections including Approach, Proposed Work Plan, Project Timeline, Coordination Plan, Budget/Cost-Estimate, "
+    "Material Assumptions, Staffing and Roles, and Prior Work & Established Expertise. These themes should inspire the tone, depth, and structure of the new proposal."
+)
+
+# (section title, context blocks it needs, what to write)
+PROPOSAL_SECTIONS = [
+    ("Introduction", ("overview",),
+     "Introduce the project, the partner and the problem it addresses."),
+    ("Approach", ("overview", "tasks"),
+     "Describe the methodological approach and why it fits the project type and sample size."),
+    ("Proposed Work Plan", ("phases", "tasks"),
+     "Lay out the work plan phase by phase, naming the tasks carried out in each."),
+    ("Project Timeline", ("overview", "phases"),
+     "Summarize the schedule, key milestones and phase dates."),
+    ("Coordination Plan", ("overview", "phases"),
+     "Explain how the team will coordinate with the partner, communicate progress and manage risks."),
+    ("Budget/Cost-Estimate", ("tasks", "costs"),
+     "Present and justify the budget, including direct costs, overhead and the total project cost."),
+    ("Material Assumptions", ("overview", "tasks"),
+     "List the assumptions the scope and cost estimate depend on."),
+    ("Staffing and Roles", ("tasks",),
+     "Describe the staffing model and the responsibilities of each role."),
+    ("Prior Work & Established Expertise", ("overview",),
+     "Summarize the team's relevant prior work and established expertise."),
+]
+
+
+# ----------------- Context Blocks -----------------
+def _overview_block(scope):
+    return [
+        f"Project Name: {scope.get('Project Name', 'Untitled Project')}\n",
+        f"Project Description: {scope.get('Project Description', '')}\n",
+        f"Partner: {scope.get('Partner Name', 'N/A')}\n",
+        f"Project Type: {scope.get('Project Type', 'N/A')}\n",
+        f"Target Sample Size: {scope.get('Estimated N', 'N/A')}\n",
+        f"Budget: ${scope.get('Budget Estimate', 'N/A')}\n",
+        f"Study Length: {scope.get('Study Length (Months)', 'N/A')} months (from {scope.get('Project Start Date', 'N/A')} to {scope.get('Project End Date', 'N/A')})\n\n",
+    ]
+
+
+def _phases_block(phases):
+    parts = ["Phases:\n"]
+    for phase in phases:
+        if phase.get("Title"):
+            parts.append(f"- {phase['Title']}: {phase['Description']} (from {phase['Start']} to {phase['End']})\n")
+    return parts
+
+
+def _tasks_block(sprint_log):
+    parts = ["\nTasks:\n"]
+    for task in sprint_log:
+        phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
+        parts.append(f"- {task['Task']}{phase_info}: Quantity {task['Quantity']}, Direct Cost ${task['Direct Cost']}\n")
+        if task.get("Modifiers"):
+            parts.append(f"  - Notes: {task['Modifiers'].get('Custom Notes', '')}\n")
+    return parts
+
+
+def _costs_block(totals, overhead_percent):
+    return [
+        "\nCost Summary:\n",
+        f"Total Direct Cost: ${totals.direct_cost:,.2f}\n",
+        f"Overhead ({overhead_percent}%): ${totals.overhead(overhead_percent):,.2f}\n",
+        f"Total Project Cost: ${totals.total(overhead_percent):,.2f}\n\n",
+    ]
+
+
+# ----------------- Prompts -----------------
+def generate_ai_prompt(scope, phases, sprint_log, totals, overhead_percent):
+    """
+    Builds the single prompt that asks for the whole proposal narrative.
+    """
+    parts = ["Generate a detailed, professional proposal for the following project using the provided structured data and historical inspiration.\n\n"]
+    parts += _overview_block(scope)
+    parts += _phases_block(phases)
+    parts += _tasks_block(sprint_log)
+    parts += _costs_block(totals, overhead_percent)
+    parts += ["Historical Inspiration:\n", HISTORICAL_INSPIRATION + "\n\n"]
+    parts.append("Based on these details, generate a detailed proposal narrative that includes the following sections: "
+                 "Introduction, Approach, Proposed Work Plan, Project Timeline, Coordination Plan, Budget/Cost-Estimate, "
+                 "Material Assumptions, Staffing and Roles, and Prior Work & Established Expertise. The narrative should be persuasive, "
+                 "professional, and structured for a multi-page document.")
+    return "".join(parts)
+
+
+def section_prompts(scope, phases, sprint_log, totals, overhead_percent):
+    """
+    Builds one sub-prompt per proposal section, each carrying only the
+    context blocks that section needs.
+
+    Returns: a list of (section title, prompt) in proposal order.
+    """
+    blocks = {
+        "overview": "".join(_overview_block(scope)),
+        "phases": "".join(_phases_block(phases)),
+        "tasks": "".join(_tasks_block(sprint_log)),
+        "costs": "".join(_costs_block(totals, overhead_percent)),
+    }
+    prompts = []
+    for title, needs, instruction in PROPOSAL_SECTIONS:
+        parts = [f"You are writing the '{title}' section of a professional research services proposal for the following project.\n\n"]
+        parts += [blocks[name] for name in needs]
+        parts += ["\nHistorical Inspiration:\n", HISTORICAL_INSPIRATION + "\n\n"]
+        parts.append(f"{instruction} Write only this section, without a heading, in a persuasive and professional tone.")
+        prompts.append((title, "".join(parts)))
+    return prompts
+
+
+# ----------------- Proposal Document -----------------
+INTRODUCTION = ("This proposal outlines our comprehensive approach for the project, including methodology, timeline, and cost breakdown. "
+                "Our team is committed to delivering high-quality outcomes tailored to your needs.")
+TIMELINE_NOTE = "A detailed timeline and deliverables will be provided upon project initiation."
+CONCLUSION = ("Based on our experience and the defined scope, we are confident that our approach will maximize ROI "
+              "and deliver actionable outcomes for your organization.")
+BUDGET_COLUMNS = ["Task", "Category", "Subcategory", "Phase", "Quantity", "Direct Cost", "Total Cost (with overhead)", "Modifiers"]
+
+BURN_COLUMNS = ["Period", "Direct Cost", "Overhead", "Total Cost", "Cumulative"]
+
+ProposalModel = namedtuple("ProposalModel", ["scope", "phases", "tasks", "totals", "overhead_percent", "burn"],
+                           defaults=[None])
+
+
+def build_proposal_model(scope, phases, sprint_log, totals, overhead_percent, burn=None):
+    """
+    Collects everything a proposal renders from. The cart lines are
+    referenced, not copied, so building a model is O(1) in the cart size.
+    ``burn`` is an optional burn.BurnProjection; with it the documents gain
+    a quarterly spending projection and the XLSX a monthly Cash Flow sheet.
+    """
+    return ProposalModel(scope, [phase for phase in phases if phase.get("Title")], sprint_log, totals, overhead_percent,
+                         burn)
+
+
+def _overview_items(scope):
+    return [
+        ("Partner", scope.get("Partner Name", "")),
+        ("Project Type", scope.get("Project Type", "")),
+        ("Target Sample Size (N)", scope.get("Estimated N", "")),
+        ("Timeline", scope.get("Timeline", "")),
+        ("Study Length (Months)", scope.get("Study Length (Months)", "")),
+        ("Budget Estimate", f"${scope.get('Budget Estimate', 0):,}"),
+        ("Project Dates", f"{scope.get('Project Start Date', '')} to {scope.get('Project End Date', '')}"),
+    ]
+
+
+def _line_total(task, overhead_percent):
+    return round(task["Direct Cost"]*(1+overhead_percent/100), 2)
+
+
+def _modifier_notes(task):
+    return task["Modifiers"].get("Custom Notes", "") if task.get("Modifiers") else ""
+
+
+class _Sink:
+    """
+    Forwards writes to a file-like sink and remembers where each named
+    section starts and ends, so one render pass can serve both a full
+    document and an excerpt of it.
+    """
+
+    def __init__(self, sink):
+        self.write_through = sink.write
+        self.position = 0
+        self.spans = {}
+
+    def write(self, text):
+        self.write_through(text)
+        self.position += len(text)
+
+    def start(self, name):
+        self.spans[name] = (self.position, None)
+
+    def end(self, name):
+        self.spans[name] = (self.spans[name][0], self.position)
+
+
+def write_markdown(model, sink):
+    """
+    Streams the proposal as Markdown to ``sink`` (anything with ``write``).
+
+    Returns: {section name: (start, end)} character offsets of the
+    "overview", "phases", "tasks" and "costs" sections (and "burn" when the
+    model has a projection) within the output.
+    """
+    out = _Sink(sink)
+    write = out.write
+    scope, overhead_percent = model.scope, model.overhead_percent
+    write(f"# Proposal for {scope.get('Project Name', 'Untitled Project')}\n\n")
+    write(f"## Introduction\n{INTRODUCTION}\n\n")
+
+    out.start("overview")
+    write("## Project Overview\n")
+    for label, value in _overview_items(scope):
+        write(f"- **{label}:** {value}\n")
+    write("\n")
+    out.end("overview")
+
+    out.start("phases")
+    write("## Project Phases\n")
+    for phase in model.phases:
+        write(f"### {phase['Title']}\n{phase['Description']}\n**Dates:** {phase['Start']} to {phase['End']}\n\n")
+    out.end("phases")
+
+    write(f"## Broad Project Goals\n{scope.get('Project Goals', '')}\n\n")
+
+    write("## Detailed Task Breakdown\n")
+    out.start("tasks")
+    for task in model.tasks:
+        phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
+        modifiers = f"- **Modifiers:** {_modifier_notes(task)}\n" if task.get("Modifiers") else ""
+        write(f"### {task['Task']} (Category: {task['Category']}){phase_info}\n"
+              f"- **Quantity:** {task['Quantity']}\n"
+              f"- **Direct Cost:** ${task['Direct Cost']}\n"
+              f"- **Total Cost (with overhead):** ${_line_total(task, overhead_percent)}\n"
+              f"{modifiers}\n")
+    out.end("tasks")
+
+    out.start("costs")
+    totals = model.totals
+    write("## Cost Breakdown\n"
+          f"**Total Direct Cost:** ${totals.direct_cost:,.2f}\n\n"
+          f"**Overhead ({overhead_percent}%):** ${totals.overhead(overhead_percent):,.2f}\n\n"
+          f"**Total Project Cost:** ${totals.total(overhead_percent):,.2f}\n\n")
+    out.end("costs")
+
+    if model.burn is not None:
+        out.start("burn")
+        write(f"## Projected Spending by Quarter\n{_burn_note(model.burn)}\n\n"
+              "| " + " | ".join(BURN_COLUMNS) + " |\n|" + "---|" * len(BURN_COLUMNS) + "\n")
+        for period, *amounts in burn_rows(quarterly(model.burn)):
+            write(f"| {period} | " + " | ".join(f"${amount:,.2f}" for amount in amounts) + " |\n")
+        write("\n")
+        out.end("burn")
+
+    write(f"## Timeline & Deliverables\n{TIMELINE_NOTE}\n\n")
+    write(f"## Conclusion\n{CONCLUSION}\n\n")
+    write("*(End of Proposal)*\n")
+    return out.spans
+
+
+def write_html(model, sink):
+    """
+    Streams the proposal as a standalone HTML document to ``sink``.
+    """
+    write = sink.write
+    scope, overhead_percent = model.scope, model.overhead_percent
+    title = escape(f"Proposal for {scope.get('Project Name', 'Untitled Project')}")
+    write(f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>{title}</title></head>\n<body>\n")
+    write(f"<h1>{title}</h1>\n<h2>Introduction</h2>\n<p>{escape(INTRODUCTION)}</p>\n")
+    write("<h2>Project Overview</h2>\n<ul>\n")
+    for label, value in _overview_items(scope):
+        write(f"<li><strong>{escape(label)}:</strong> {escape(str(value))}</li>\n")
+    write("</ul>\n<h2>Project Phases</h2>\n")
+    for phase in model.phases:
+        write(f"<h3>{escape(phase['Title'])}</h3>\n<p>{escape(phase['Description'])}</p>\n"
+              f"<p><strong>Dates:</strong> {phase['Start']} to {phase['End']}</p>\n")
+    write(f"<h2>Broad Project Goals</h2>\n<p>{escape(scope.get('Project Goals', ''))}</p>\n")
+    write("<h2>Detailed Task Breakdown</h2>\n<table>\n<thead><tr>")
+    write("".join(f"<th>{escape(col)}</th>" for col in BUDGET_COLUMNS))
+    write("</tr></thead>\n<tbody>\n")
+    for row in budget_rows(model):
+        write("<tr>" + "".join(f"<td>{escape(str(value))}</td>" for value in row) + "</tr>\n")
+    totals = model.totals
+    write("</tbody>\n</table>\n<h2>Cost Breakdown</h2>\n"
+          f"<p><strong>Total Direct Cost:</strong> ${totals.direct_cost:,.2f}</p>\n"
+          f"<p><strong>Overhead ({overhead_percent}%):</strong> ${totals.overhead(overhead_percent):,.2f}</p>\n"
+          f"<p><strong>Total Project Cost:</strong> ${totals.total(overhead_percent):,.2f}</p>\n")
+    if model.burn is not None:
+        write(f"<h2>Projected Spending by Quarter</h2>\n<p>{escape(_burn_note(model.burn))}</p>\n<table>\n<thead><tr>")
+        write("".join(f"<th>{escape(col)}</th>" for col in BURN_COLUMNS))
+        write("</tr></thead>\n<tbody>\n")
+        for period, *amounts in burn_rows(quarterly(model.burn)):
+            write(f"<tr><td>{escape(period)}</td>" + "".join(f"<td>${amount:,.2f}</td>" for amount in amounts) + "</tr>\n")
+        write("</tbody>\n</table>\n")
+    write(f"<h2>Timeline &amp; Deliverables</h2>\n<p>{escape(TIMELINE_NOTE)}</p>\n")
+    write(f"<h2>Conclusion</h2>\n<p>{escape(CONCLUSION)}</p>\n")
+    write("<p><em>(End of Proposal)</em></p>\n</body>\n</html>\n")
+
+
+def budget_rows(model):
+    """
+    Yields one budget-table row per cart line, in BUDGET_COLUMNS order.
+    """
+    for task in model.tasks:
+        yield (task["Task"], task["Category"], task.get("Subcategory", ""), task.get("Phase", ""), task["Quantity"],
+               task["Direct Cost"], _line_total(task, model.overhead_percent), _modifier_notes(task))
+
+
+def _burn_note(burn):
+    escalation = f" with {burn.escalation_percent}% annual rate escalation" if burn.escalation_percent else ""
+    return (f"Direct costs are spread evenly over each task's phase{escalation}, "
+            f"plus {burn.overhead_percent}% overhead.")
+
+
+def _budget_summary(model):
+    totals, overhead_percent = model.totals, model.overhead_percent
+    return [
+        ("Total Direct Cost", round(totals.direct_cost, 2)),
+        (f"Overhead ({overhead_percent}%)", round(totals.overhead(overhead_percent), 2)),
+        ("Total Project Cost", round(totals.total(overhead_percent), 2)),
+    ]
+
+
+def write_budget_csv(model, sink):
+    """
+    Streams the budget table (one row per cart line, then the cost summary
+    and, with a projection, the monthly burn) as CSV to a text sink.
+    """
+    writer = csv.writer(sink)
+    writer.writerow(BUDGET_COLUMNS)
+    writer.writerows(budget_rows(model))
+    writer.writerow([])
+    for label, amount in _budget_summary(model):
+        writer.writerow([label, "", "", "", "", amount])
+    if model.burn is not None:
+        writer.writerow([])
+        writer.writerow(BURN_COLUMNS)
+        writer.writerows(burn_rows(monthly(model.burn)))
+
+
+def write_budget_xlsx(model, sink):
+    """
+    Writes the budget table as an .xlsx workbook to a binary sink (a path or
+    a BytesIO), plus monthly and quarterly Cash Flow sheets when the model
+    has a projection. Needs the optional openpyxl package.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Budget")
+    sheet.append(BUDGET_COLUMNS)
+    for row in budget_rows(model):
+        sheet.append(list(row))
+    sheet.append([])
+    for label, amount in _budget_summary(model):
+        sheet.append([label, None, None, None, None, amount])
+    if model.burn is not None:
+        for title, periods in (("Cash Flow", monthly(model.burn)), ("Cash Flow by Quarter", quarterly(model.burn))):
+            sheet = workbook.create_sheet(title)
+            sheet.append(BURN_COLUMNS)
+            for row in burn_rows(periods):
+                sheet.append(list(row))
+    workbook.save(sink)
+
+
+def generate_proposal(scope, phases, sprint_log, totals, overhead_percent, burn=None):
+    """
+    Builds the Markdown proposal document from the structured project data.
+    """
+    with span("generate_proposal"):
+        buf = io.StringIO()
+        write_markdown(build_proposal_model(scope, phases, sprint_log, totals, overhead_percent, burn), buf)
+        return buf.getvalue()
@@ -0,0 +1,115 @@
+"""
+Reactive computation graph for the app's derived values.
+
+Inputs (rates, overhead, scope, phases, the cart) carry a version that only
+moves when their value actually changes. Derived nodes declare the inputs or
+nodes they read and are recomputed lazily, and only when one of those
+versions moved since their last run; a node whose new value equals the old
+one keeps its version, so an unchanged result stops the change from
+spreading further. One graph lives in each Streamlit session, which turns a
+full script rerun into a handful of dictionary lookups for everything the
+change did not touch.
+"""
+import copy
+from collections import Counter
+
+import numpy as np
+
+from metrics import span
+
+
+def _same(a, b):
+    if a is b:
+        return True
+    try:
+        if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+            return np.array_equal(a, b)
+        return bool(a == b)
+    except (TypeError, ValueError):
+        return False
+
+
+class ReactiveGraph:
+    """
+    Inputs are set with ``set_input`` (or read on demand through ``source``),
+    derived values are declared with ``node`` and read with ``get``. Node
+    functions receive their dependencies' values positionally and must not
+    read anything they don't declare.
+    """
+
+    def __init__(self):
+        self._inputs = {}    # name -> [token, value, version]
+        self._sources = {}   # name -> read() returning (value, token)
+        self._nodes = {}     # name -> (deps, fn)
+        self._memo = {}      # name -> (dependency versions, value, version)
+        self.recomputed = Counter()
+
+    def set_input(self, name, value, token=None):
+        """
+        Sets an input. Changes are detected by comparing ``token`` (default:
+        a deep copy of the value) with the previous one, so pass a cheap
+        token such as a revision number for large values.
+        """
+        token = copy.deepcopy(value) if token is None else token
+        current = self._inputs.get(name)
+        if current is None:
+            self._inputs[name] = [token, value, 1]
+        elif _same(current[0], token):
+            current[1] = value
+        else:
+            self._inputs[name] = [token, value, current[2] + 1]
+
+    def source(self, name, read):
+        """
+        Registers an input that is re-read each time it is consulted;
+        ``read()`` returns (value, token).
+        """
+        self._sources[name] = read
+
+    def node(self, name, deps, fn):
+        """
+        Declares (or re-declares, e.g. on every rerun) a derived value.
+        Re-declaring keeps the memoized value as long as ``deps`` are the same.
+        """
+        deps = tuple(deps)
+        previous = self._nodes.get(name)
+        if previous is not None and previous[0] != deps:
+            self._memo.pop(name, None)
+        self._nodes[name] = (deps, fn)
+
+    def version(self, name):
+        if name in self._sources:
+            self.set_input(name, *self._sources[name]())
+        if name in self._inputs:
+            return self._inputs[name][2]
+        self.get(name)
+        return self._memo[name][2]
+
+    def get(self, name):
+        if name in self._sources or name in self._inputs:
+            self.version(name)
+            return self._inputs[name][1]
+        deps, fn = self._nodes[name]
+        dep_versions = tuple(self.version(dep) for dep in deps)
+        memo = self._memo.get(name)
+        if memo is not None and memo[0] == dep_versions:
+            return memo[1]
+        args = [self.get(dep) for dep in deps]
+        with span("graph_node", node=name):
+            value = fn(*args)
+        self.recomputed[name] += 1
+        if memo is None:
+            version = 1
+        else:
+            version = memo[2] if _same(memo[1], value) else memo[2] + 1
+        self._memo[name] = (dep_versions, value, version)
+        return value
+
+    def invalidate(self, name=None):
+        """
+        Forgets memoized values (all of them without ``name``).
+        """
+        if name is None:
+            self._memo.clear()
+        else:
+            self._memo.pop(name, None)
@@ -0,0 +1,127 @@
+"""
+Scenario snapshots, undo/redo and scenario comparison.
+
+A Snapshot is an immutable view of the editable project state: the cart
+lines, their CartTotals rollups, the phases, the task modifiers and the
+scope. Cart lines are shared rather than copied: a snapshot holds a tuple of
+references to the same line dicts as the live cart, which is safe because
+cart edits replace a line's dict instead of changing it (see
+cart.edit_cart). Taking a snapshot of a 1,000-line cart therefore copies
+1,000 pointers, and a snapshot of an unchanged cart (same totals revision)
+reuses the previous snapshot's tuple and rollups outright. Only the small
+per-project structures (phases, modifiers, scope) are copied.
+
+Undo/redo keeps two unbounded stacks of these snapshots, and the comparison
+view diffs the snapshots' category and phase rollups directly instead of
+re-aggregating their lines.
+"""
+import copy
+from collections import namedtuple
+
+Snapshot = namedtuple("Snapshot", ["lines", "totals", "phases", "task_modifiers", "scope", "label"])
+
+
+def _frozen(value, previous):
+    # Small structures are copied, but an unchanged one is shared with the previous snapshot.
+    if previous is not None and previous == value:
+        return previous
+    return copy.deepcopy(value)
+
+
+def take_snapshot(lines, totals, phases, task_modifiers, scope, label="", previous=None):
+    """
+    Freezes the live project state. Pass the most recent snapshot as
+    ``previous`` to share whatever hasn't changed since it was taken.
+    """
+    if previous is not None and previous.totals.revision == totals.revision:
+        frozen_lines, frozen_totals = previous.lines, previous.totals
+    else:
+        frozen_lines, frozen_totals = tuple(lines), totals.copy()
+    return Snapshot(frozen_lines, frozen_totals,
+                    _frozen(tuple(phases), previous.phases if previous else None),
+                    _frozen(dict(task_modifiers), previous.task_modifiers if previous else None),
+                    _frozen(dict(scope), previous.scope if previous else None),
+                    label)
+
+
+def restore(snapshot):
+    """
+    Live (mutable) copies of a snapshot's state; the snapshot itself stays
+    untouched by later edits.
+
+    Returns: lines, totals, phases, task_modifiers, scope
+    """
+    return (list(snapshot.lines), snapshot.totals.copy(), copy.deepcopy(list(snapshot.phases)),
+            copy.deepcopy(snapshot.task_modifiers), copy.deepcopy(snapshot.scope))
+
+
+def same_state(a, b):
+    return (a.totals.revision == b.totals.revision and a.phases == b.phases
+            and a.task_modifiers == b.task_modifiers and a.scope == b.scope)
+
+
+class History:
+    """
+    Unlimited undo/redo over snapshots. Call ``checkpoint`` with the state
+    just before an edit; ``undo`` and ``redo`` take the current state (so it
+    can be returned to) and give back the snapshot to restore, or None.
+    """
+
+    def __init__(self):
+        self.undo_stack = []
+        self.redo_stack = []
+
+    @property
+    def latest(self):
+        return self.undo_stack[-1] if self.undo_stack else None
+
+    def checkpoint(self, snapshot):
+        if self.undo_stack and same_state(self.undo_stack[-1], snapshot):
+            return
+        self.undo_stack.append(snapshot)
+        self.redo_stack.clear()
+
+    def undo(self, current):
+        if not self.undo_stack:
+            return None
+        self.redo_stack.append(current)
+        return self.undo_stack.pop()
+
+    def redo(self, current):
+        if not self.redo_stack:
+            return None
+        self.undo_stack.append(current)
+        return self.redo_stack.pop()
+
+
+# ----------------- Scenario Comparison -----------------
+def _diff_rows(key_name, rollups, names):
+    keys = list(dict.fromkeys(key for rollup in rollups for key in rollup))
+    rows = []
+    for key in keys:
+        row = {key_name: key or "(None)"}
+        values = [rollup.get(key, 0.0) for rollup in rollups]
+        for name, value in zip(names, values):
+            row[name] = round(value, 2)
+        for name, value in zip(names[1:], values[1:]):
+            row[f"Δ {name}"] = round(value - values[0], 2)
+        rows.append(row)
+    return rows
+
+
+def compare_snapshots(snapshots, overhead_percent):
+    """
+    Diffs scenarios against the first one, straight from their rollups.
+
+    Returns: (summary rows, category rows, phase rows); every row has one
+    column per scenario (named by its label) and a "Δ <label>" column per
+    later scenario with its difference from the first.
+    """
+    names = [snapshot.label for snapshot in snapshots]
+    measures = [("Lines", lambda totals: totals.line_count), ("Direct Cost", lambda totals: totals.direct_cost),
+                (f"Overhead ({overhead_percent}%)", lambda totals: totals.overhead(overhead_percent)),
+                ("Total Cost", lambda totals: totals.total(overhead_percent))]
+    summary_rows = _diff_rows("Measure", [{label: measure(s.totals) for label, measure in measures} for s in snapshots],
+                              names)
+    return (summary_rows, _diff_rows("Category", [s.totals.by_category for s in snapshots], names),
+            _diff_rows("Phase", [s.totals.by_phase for s in snapshots], names))
@@ -0,0 +1,323 @@
+"""
+Dependency-aware scheduling engine.
+
+Turns activities (durations in days plus predecessor lists) into a DAG,
+topologically sorts it level by level and runs the critical path method:
+earliest/latest start and finish, slack and the critical path. Each level of
+the DAG is processed as one NumPy operation over its edges, so schedules of
+thousands of activities stay fast, and dates are produced with vectorized
+datetime64 arithmetic.
+"""
+import math
+import re
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+HOURS_PER_DAY = 8
+
+Schedule = namedtuple("Schedule", ["order", "early_start", "early_finish", "late_start", "late_finish",
+                                   "slack", "critical", "critical_path", "finish"])
+# tasks / phases: predecessor task and phase indices per activity; unresolved: (activity, clause) pairs.
+DependencyRefs = namedtuple("DependencyRefs", ["tasks", "phases", "unresolved"])
+# warnings: dependency problems the schedule worked around, as messages for the user.
+ProjectPlan = namedtuple("ProjectPlan", ["rows", "schedule", "warnings"])
+
+
+class DependencyCycleError(ValueError):
+    """Raised when the activities' dependencies contain a cycle."""
+
+
+def _edges(dependencies):
+    src = [pred for succ, preds in enumerate(dependencies) for pred in preds]
+    dst = [succ for succ, preds in enumerate(dependencies) for _ in preds]
+    return np.asarray(src, dtype=np.intp), np.asarray(dst, dtype=np.intp)
+
+
+def _gather(offsets, nodes):
+    """
+    Edge positions for ``nodes`` in a CSR layout given by ``offsets``.
+    """
+    starts = offsets[nodes]
+    lengths = offsets[nodes + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.intp)
+    shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return shifts + np.arange(total)
+
+
+def topological_levels(n, src, dst):
+    """
+    Kahn's algorithm, one frontier at a time.
+
+    Returns: a list of index arrays, one per level; every activity's
+    predecessors sit in earlier levels.
+    """
+    by_src = np.argsort(src, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n))))
+    indegree = np.bincount(dst, minlength=n)
+    frontier = np.flatnonzero(indegree == 0)
+    levels, seen = [], 0
+    while frontier.size:
+        levels.append(frontier)
+        seen += frontier.size
+        succ = dst[by_src[_gather(offsets, frontier)]]
+        np.subtract.at(indegree, succ, 1)
+        frontier = np.unique(succ[indegree[succ] == 0])
+    if seen < n:
+        raise DependencyCycleError(np.flatnonzero(indegree > 0).tolist())
+    return levels
+
+
+def schedule(durations, dependencies, release=None, start_dependencies=None):
+    """
+    Critical path schedule in days from the project start.
+
+    ``dependencies[i]`` lists the activities that must finish before ``i``
+    starts (finish-to-start); ``start_dependencies[i]`` optionally lists
+    activities that must start before ``i`` does (start-to-start, e.g. a
+    task within its phase); ``release[i]`` optionally holds ``i`` back to a
+    minimum start day.
+
+    Returns: Schedule with per-activity arrays (early/late start and finish,
+    slack, a critical mask), the critical path as a list of indices and the
+    overall finish day.
+    """
+    durations = np.asarray(durations, dtype=float)
+    n = len(durations)
+    src, dst = _edges(dependencies)
+    # An edge's lag is how long after its predecessor's start the successor may start.
+    lag = durations[src]
+    if start_dependencies is not None:
+        ss_src, ss_dst = _edges(start_dependencies)
+        src, dst = np.concatenate((src, ss_src)), np.concatenate((dst, ss_dst))
+        lag = np.concatenate((lag, np.zeros(len(ss_src))))
+    levels = topological_levels(n, src, dst)
+    order = np.concatenate(levels) if levels else np.empty(0, dtype=np.intp)
+    level_of = np.empty(n, dtype=np.intp)
+    for depth, nodes in enumerate(levels):
+        level_of[nodes] = depth
+
+    # Forward pass: edges grouped by the level of their successor.
+    early_start = np.zeros(n) if release is None else np.asarray(release, dtype=float).copy()
+    by_dst_level = np.argsort(level_of[dst], kind="stable") if len(dst) else dst
+    dst_bounds = np.searchsorted(level_of[dst][by_dst_level], np.arange(len(levels) + 1)) if len(dst) else None
+    for depth in range(1, len(levels)):
+        if dst_bounds is None:
+            break
+        edges = by_dst_level[dst_bounds[depth]:dst_bounds[depth + 1]]
+        np.maximum.at(early_start, dst[edges], early_start[src[edges]] + lag[edges])
+    early_finish = early_start + durations
+
+    finish = float(early_finish.max()) if n else 0.0
+
+    # Backward pass: edges grouped by the level of their predecessor.
+    late_start = np.full(n, finish) - durations
+    by_src_level = np.argsort(level_of[src], kind="stable") if len(src) else src
+    src_bounds = np.searchsorted(level_of[src][by_src_level], np.arange(len(levels) + 1)) if len(src) else None
+    for depth in range(len(levels) - 2, -1, -1):
+        if src_bounds is None:
+            break
+        edges = by_src_level[src_bounds[depth]:src_bounds[depth + 1]]
+        np.minimum.at(late_start, src[edges], late_start[dst[edges]] - lag[edges])
+    late_finish = late_start + durations
+
+    slack = late_start - early_start
+    critical = np.isclose(slack, 0)
+    return Schedule(order, early_start, early_finish, late_start, late_finish, slack, critical,
+                    _critical_path(early_start, early_finish, critical, src, dst, lag, finish), finish)
+
+
+def _critical_path(early_start, early_finish, critical, src, dst, lag, finish):
+    """
+    Walks back from a critical activity that ends the project through tight
+    critical predecessors.
+    """
+    ends = np.flatnonzero(critical & np.isclose(early_finish, finish))
+    if not ends.size:
+        return []
+    tight = critical[src] & critical[dst] & np.isclose(early_start[src] + lag, early_start[dst])
+    predecessor = np.full(len(critical), -1)
+    predecessor[dst[tight]] = src[tight]
+    predecessor = predecessor.tolist()
+    path = [int(ends[0])]
+    while predecessor[path[-1]] >= 0:
+        path.append(predecessor[path[-1]])
+    return path[::-1]
+
+
+def to_dates(start_date, days):
+    """
+    Converts day offsets from ``start_date`` into datetime.date values, in one
+    datetime64 operation.
+    """
+    offsets = np.floor(np.asarray(days, dtype=float)).astype("timedelta64[D]")
+    return (np.datetime64(start_date, "D") + offsets).astype(date).tolist()
+
+
+# ----------------- Dependency Text -----------------
+# Trailing words that describe the state of a prerequisite rather than naming it.
+STATUS_WORDS = {"approved", "finalized", "final", "complete", "completed", "done", "ready", "signed", "available",
+                "received", "finished"}
+ORDINAL_REFERENCE = re.compile(r"phase (\d+)")
+
+
+def dependency_clauses(text):
+    """
+    Splits a free-text Dependencies cell ("IRB approved, screener finalized")
+    into its comma- or semicolon-separated prerequisites.
+    """
+    return [clause.strip() for clause in re.split(r"[,;]", text or "") if clause.strip()]
+
+
+def reference_key(text):
+    """
+    A name or prerequisite clause reduced to lowercase words, without
+    punctuation or trailing status words: "Research goals finalized" and
+    "Research Goals" both become "research goals".
+    """
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    while words and words[-1] in STATUS_WORDS:
+        words.pop()
+    return " ".join(words)
+
+
+def resolve_dependencies(texts, names, phase_titles=()):
+    """
+    Matches each activity's Dependencies text against the other activities'
+    names and the phase titles. A prerequisite has to name an activity or a
+    phase exactly (see reference_key) or be an ordinal "Phase N"; anything
+    else is reported as unresolved rather than guessed at.
+
+    Returns: DependencyRefs(tasks, phases, unresolved) with predecessor task
+    and phase index lists aligned with ``texts``.
+    """
+    by_name, by_title = {}, {}
+    for i, name in enumerate(names):
+        by_name.setdefault(reference_key(name), []).append(i)
+    for p, title in enumerate(phase_titles):
+        by_title.setdefault(reference_key(title), p)
+    by_name.pop("", None)
+    by_title.pop("", None)
+    tasks, phases, unresolved = [], [], []
+    for i, text in enumerate(texts):
+        task_preds, phase_preds = set(), set()
+        for clause in dependency_clauses(text):
+            key = reference_key(clause)
+            ordinal = ORDINAL_REFERENCE.fullmatch(key)
+            if key in by_name:
+                task_preds.update(by_name[key])
+            elif key in by_title:
+                phase_preds.add(by_title[key])
+            elif ordinal and 1 <= int(ordinal.group(1)) <= len(phase_titles):
+                phase_preds.add(int(ordinal.group(1)) - 1)
+            else:
+                unresolved.append((i, clause))
+        task_preds.discard(i)
+        tasks.append(sorted(task_preds))
+        phases.append(sorted(phase_preds))
+    return DependencyRefs(tasks, phases, unresolved)
+
+
+def cycle_members(dependencies, stuck):
+    """
+    Narrows the activities topological_levels couldn't order (``stuck``, the
+    DependencyCycleError payload) to those on a cycle, dropping the ones
+    that are only downstream of it.
+    """
+    members = set(stuck)
+    while True:
+        feeding = {pred for i in members for pred in dependencies[i] if pred in members}
+        if feeding == members:
+            return sorted(members)
+        members = feeding
+
+
+# ----------------- Project Plans -----------------
+def task_duration_days(estimated_hours):
+    return max(1, math.ceil(float(estimated_hours or 0) / HOURS_PER_DAY))
+
+
+def cart_tasks(sprint_log, catalog):
+    """
+    Scheduling inputs for the cart lines: duration from the task's (possibly
+    modified) Estimated Hours and Dependencies text from the task library.
+    """
+    tasks = []
+    for line in sprint_log:
+        try:
+            record = catalog.task(line.get("Category", ""), line.get("Subcategory"), line.get("Task", ""))
+        except KeyError:
+            record = {}
+        hours = (line.get("Modifiers") or {}).get("Estimated Hours", record.get("Estimated Hours", 0))
+        dependencies = record.get("Dependencies")
+        tasks.append({"Task": line.get("Task", ""), "Phase": line.get("Phase"), "DurationDays": task_duration_days(hours),
+                      "Dependencies": dependencies if isinstance(dependencies, str) else ""})
+    return tasks
+
+
+def plan_project(project_start, phases, tasks=()):
+    """
+    Schedules phases and cart tasks together.
+
+    ``phases`` are phase dicts with DurationWeeks and an optional DependsOn
+    list of phase indices (default: the previous phase, i.e. end to end).
+    ``tasks`` are dicts with Task, Phase (title or None), DurationDays and
+    Dependencies (free text naming other tasks or phases, see
+    resolve_dependencies). A task cannot start before its phase does.
+    Prerequisites that name nothing are skipped, and tasks on a dependency
+    cycle are scheduled without their task dependencies; both are listed in
+    ``warnings``.
+
+    Returns: ProjectPlan(rows, schedule, warnings) where rows are dicts with
+    Kind, Title, Start, End, Slack and Critical in activity order (phases
+    first).
+    """
+    phase_count = len(phases)
+    durations = [int(phase.get("DurationWeeks", 4)) * 7 for phase in phases]
+    dependencies = []
+    for i, phase in enumerate(phases):
+        depends_on = phase.get("DependsOn")
+        if depends_on is None:
+            depends_on = [i - 1] if i else []
+        dependencies.append([d for d in depends_on if 0 <= d < phase_count and d != i])
+
+    phase_index = {phase.get("Title"): i for i, phase in enumerate(phases) if phase.get("Title")}
+    tasks = list(tasks)
+    refs = resolve_dependencies([task.get("Dependencies", "") for task in tasks], [task["Task"] for task in tasks],
+                                [phase.get("Title") for phase in phases])
+    task_deps = refs.tasks
+    warnings = []
+    for i, clause in refs.unresolved:
+        message = f"{tasks[i]['Task']}: no task in the cart or phase matches the dependency {clause!r}."
+        if message not in warnings:
+            warnings.append(message)
+    try:
+        topological_levels(len(tasks), *_edges(task_deps))
+    except DependencyCycleError as e:
+        cycle = cycle_members(task_deps, e.args[0])
+        warnings.append("Task dependencies form a cycle: " + ", ".join(tasks[i]["Task"] for i in cycle)
+                        + ". These tasks are scheduled without their task dependencies until it is resolved.")
+        task_deps = [[] if i in cycle else preds for i, preds in enumerate(task_deps)]
+    # A task starts no earlier than its phase: a start-to-start link, so slack and the critical path see it too.
+    start_dependencies = [[] for _ in phases]
+    for task, preds, phase_preds in zip(tasks, task_deps, refs.phases):
+        durations.append(task.get("DurationDays", 1))
+        dependencies.append([phase_count + p for p in preds] + phase_preds)
+        phase = phase_index.get(task.get("Phase"))
+        start_dependencies.append([phase] if phase is not None else [])
+    plan = schedule(durations, dependencies, start_dependencies=start_dependencies)
+
+    starts = to_dates(project_start, plan.early_start)
+    # Inclusive end dates, matching the Scope tab's "start + weeks*7 - 1".
+    ends = to_dates(project_start, np.maximum(plan.early_finish - 1, plan.early_start))
+    rows = []
+    for i in range(len(durations)):
+        is_phase = i < phase_count
+        rows.append({"Kind": "Phase" if is_phase else "Task",
+                     "Title": phases[i].get("Title", "") if is_phase else tasks[i - phase_count]["Task"],
+                     "Start": starts[i], "End": ends[i], "Slack": float(plan.slack[i]),
+                     "Critical": bool(plan.critical[i])})
+    return ProjectPlan(rows, plan, warnings)
@@ -0,0 +1,257 @@
+"""
+What-if sensitivity sweeps over the project cart.
+
+The cart's cost is linear in the sweep parameters, so it is reduced once to
+a handful of coefficients (a CartCostModel) and any number of scenarios
+(tier rates, overhead, sample size, unit price) are then evaluated as one
+matrix expression. Large sweeps are generated and evaluated a chunk at a
+time in-process, so only their totals are ever held in memory. Results come
+back as a cost distribution, a tornado (one-at-a-time) sensitivity summary
+and the largest sample size that fits a budget.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from pricing_engine import default_templates
+
+PARAMETERS = ("tier1_rate", "tier2_rate", "tier3_rate", "overhead_percent", "sample_size", "unit_price")
+PARAMETER_LABELS = {
+    "tier1_rate": "Tier 1 Rate",
+    "tier2_rate": "Tier 2 Rate",
+    "tier3_rate": "Tier 3 Rate",
+    "overhead_percent": "Overhead %",
+    "sample_size": "Sample Size (N)",
+    "unit_price": "Unit Price",
+}
+# Scenarios generated and evaluated at a time; a chunk's parameters take about 50 MB.
+CHUNK_SIZE = 1_000_000
+# Largest full-factorial grid evaluated in one request; bigger sweeps should sample instead.
+MAX_GRID_SCENARIOS = 10_000_000
+
+# fixed_cost: base-cost lines ($); fixed_hours / scaled_hours: Tier 1-3 hours
+# that stay put / grow in proportion to N; base_n: the N the cart was built at;
+# unit_price_units: sample units priced at the unit price (0 leaves it out).
+CartCostModel = namedtuple("CartCostModel", ["fixed_cost", "fixed_hours", "scaled_hours", "base_n", "unit_price_units"])
+
+
+def build_cost_model(sprint_log, base_n, include_unit_price=False, templates=None):
+    """
+    Reduces a cart to the coefficients of its cost.
+
+    Template-priced lines are re-expressed as hours so they follow the swept
+    rates; their per-unit hours scale with the sample size, their fixed hours
+    don't. Every other line keeps its stored Direct Cost. With
+    ``include_unit_price`` each of the N sample units is also charged the
+    sidebar Unit Price.
+    """
+    if templates is None:
+        templates = default_templates()
+    fixed_cost = 0.0
+    fixed_hours = np.zeros(3)
+    scaled_hours = np.zeros(3)
+    for line in sprint_log:
+        key = (line.get("Category", ""), line.get("Subcategory", ""))
+        if key not in templates.template_priced:
+            fixed_cost += float(line.get("Direct Cost", 0))
+            continue
+        row = templates.lookup(*key)
+        fixed = templates.fixed[row].copy()
+        per_unit = templates.per_unit[row].copy()
+        modifiers = line.get("Modifiers") or {}
+        for t, tier in enumerate(("tier1", "tier2", "tier3")):
+            fixed[t] = modifiers.get(f"{tier}_fixed", fixed[t])
+            per_unit[t] = modifiers.get(f"{tier}_per_unit", per_unit[t])
+        fixed_hours += fixed
+        scaled_hours += per_unit * float(line.get("Quantity", 0))
+    return CartCostModel(fixed_cost, fixed_hours, scaled_hours, float(base_n), 1.0 if include_unit_price else 0.0)
+
+
+# ----------------- Scenario Generation -----------------
+def _is_ranged(value):
+    return isinstance(value, (tuple, list)) and value[0] != value[1]
+
+
+def grid_size(ranges, steps):
+    """
+    Number of scenarios grid_scenarios(ranges, steps) would generate.
+    """
+    return int(np.prod([steps if _is_ranged(ranges[name]) else 1 for name in PARAMETERS]))
+
+
+def _grid_axes(ranges, steps):
+    axes = []
+    for name in PARAMETERS:
+        value = ranges[name]
+        if _is_ranged(value):
+            axes.append(np.linspace(value[0], value[1], steps))
+        else:
+            axes.append(np.array([value[0] if isinstance(value, (tuple, list)) else value], dtype=float))
+    return axes
+
+
+def grid_chunk(ranges, steps, start, stop):
+    """
+    Scenarios ``start`` to ``stop`` of grid_scenarios(ranges, steps), built
+    from their flat positions without materializing the rest of the grid.
+    """
+    axes = _grid_axes(ranges, steps)
+    positions = np.unravel_index(np.arange(start, stop), [len(axis) for axis in axes])
+    return {name: axis[pos] for name, axis, pos in zip(PARAMETERS, axes, positions)}
+
+
+def grid_scenarios(ranges, steps=5, max_scenarios=MAX_GRID_SCENARIOS):
+    """
+    Full factorial grid. ``ranges`` maps parameter -> (low, high) or a single
+    fixed value; every ranged parameter gets ``steps`` evenly spaced points.
+    Raises ValueError when the grid would exceed ``max_scenarios``; check
+    grid_size first.
+
+    Returns: {parameter: 1-D array}, all of length prod(steps).
+    """
+    size = grid_size(ranges, steps)
+    if size > max_scenarios:
+        raise ValueError(f"A {size:,}-scenario grid exceeds the limit of {max_scenarios:,}.")
+    mesh = np.meshgrid(*_grid_axes(ranges, steps), indexing="ij")
+    return {name: axis.ravel() for name, axis in zip(PARAMETERS, mesh)}
+
+
+def monte_carlo_scenarios(ranges, n, seed=None):
+    """
+    ``n`` scenarios with every ranged parameter drawn uniformly from its
+    (low, high) range. ``seed`` may also be a numpy Generator to draw from.
+    """
+    rng = np.random.default_rng(seed)
+    scenarios = {}
+    for name in PARAMETERS:
+        value = ranges[name]
+        if isinstance(value, (tuple, list)):
+            scenarios[name] = rng.uniform(value[0], value[1], n)
+        else:
+            scenarios[name] = np.full(n, float(value))
+    return scenarios
+
+
+# ----------------- Evaluation -----------------
+def evaluate(model, scenarios):
+    """
+    Cost of every scenario in one vectorized pass.
+
+    Returns: (direct_cost, total_cost) arrays aligned with the scenarios.
+    """
+    rates = np.column_stack([scenarios["tier1_rate"], scenarios["tier2_rate"], scenarios["tier3_rate"]])
+    n = np.asarray(scenarios["sample_size"], dtype=float)
+    scale = n / model.base_n if model.base_n else np.ones_like(n)
+    direct = (model.fixed_cost
+              + rates @ model.fixed_hours
+              + scale * (rates @ model.scaled_hours)
+              + model.unit_price_units * n * scenarios["unit_price"])
+    total = direct * (1 + np.asarray(scenarios["overhead_percent"], dtype=float) / 100)
+    return direct, total
+
+
+def _sweep_totals(model, size, make_chunk, chunk_size):
+    # evaluate() is memory-bound, so a process pool only adds the cost of shipping
+    # arrays between processes; chunking here keeps the working set small instead.
+    totals = np.empty(size)
+    for start in range(0, size, chunk_size):
+        stop = min(size, start + chunk_size)
+        totals[start:stop] = evaluate(model, make_chunk(start, stop))[1]
+    return totals
+
+
+def grid_sweep(model, ranges, steps=5, max_scenarios=MAX_GRID_SCENARIOS, chunk_size=CHUNK_SIZE):
+    """
+    Total cost of every grid_scenarios(ranges, steps) scenario, in grid
+    order, generating ``chunk_size`` scenarios at a time. Raises ValueError
+    past ``max_scenarios`` like grid_scenarios.
+
+    Returns: total cost array
+    """
+    size = grid_size(ranges, steps)
+    if size > max_scenarios:
+        raise ValueError(f"A {size:,}-scenario grid exceeds the limit of {max_scenarios:,}.")
+    return _sweep_totals(model, size, lambda start, stop: grid_chunk(ranges, steps, start, stop), chunk_size)
+
+
+def monte_carlo_sweep(model, ranges, n, seed=None, chunk_size=CHUNK_SIZE):
+    """
+    Total cost of ``n`` Monte Carlo scenarios over ``ranges``, drawn and
+    evaluated ``chunk_size`` at a time from one seeded generator.
+
+    Returns: total cost array
+    """
+    rng = np.random.default_rng(seed)
+    return _sweep_totals(model, n, lambda start, stop: monte_carlo_scenarios(ranges, stop - start, rng), chunk_size)
+
+
+# ----------------- Summaries -----------------
+def summarize(total_cost, budget=None):
+    """
+    Distribution summary of scenario totals; ``within_budget`` is the share
+    of scenarios at or under ``budget``.
+    """
+    p5, p25, p50, p75, p95 = np.percentile(total_cost, [5, 25, 50, 75, 95])
+    summary = {"scenarios": int(len(total_cost)), "mean": float(np.mean(total_cost)),
+               "min": float(np.min(total_cost)), "p5": float(p5), "p25": float(p25), "median": float(p50),
+               "p75": float(p75), "p95": float(p95), "max": float(np.max(total_cost))}
+    if budget:
+        summary["within_budget"] = float(np.mean(total_cost <= budget))
+    return summary
+
+
+def tornado(model, base, ranges):
+    """
+    One-at-a-time sensitivity: each ranged parameter is moved to its low and
+    high value with the others held at ``base``.
+
+    Returns: [(parameter, total at low, total at high)] sorted by swing,
+    largest first.
+    """
+    names = [name for name in PARAMETERS if isinstance(ranges.get(name), (tuple, list))]
+    if not names:
+        return []
+    scenarios = {name: np.full(2 * len(names), float(base[name])) for name in PARAMETERS}
+    for i, name in enumerate(names):
+        scenarios[name][2 * i] = ranges[name][0]
+        scenarios[name][2 * i + 1] = ranges[name][1]
+    _, total = evaluate(model, scenarios)
+    bars = [(name, float(total[2 * i]), float(total[2 * i + 1])) for i, name in enumerate(names)]
+    return sorted(bars, key=lambda bar: abs(bar[2] - bar[1]), reverse=True)
+
+
+def max_sample_size(model, base, budget):
+    """
+    Largest whole N whose total cost stays within ``budget`` with every other
+    parameter at ``base``. The total is linear in N, so this is solved
+    directly. Returns None if even N = 0 is over budget.
+    """
+    rates = np.array([base["tier1_rate"], base["tier2_rate"], base["tier3_rate"]], dtype=float)
+    markup = 1 + base["overhead_percent"] / 100
+    intercept = (model.fixed_cost + rates @ model.fixed_hours) * markup
+    per_n = ((rates @ model.scaled_hours) / model.base_n if model.base_n else 0.0) + model.unit_price_units * base["unit_price"]
+    per_n *= markup
+    if intercept > budget:
+        return None
+    if per_n <= 0:
+        return float("inf")
+    return int(np.floor((budget - intercept) / per_n))
+
+
+def ranges_around(base, spreads):
+    """
+    Builds sweep ranges of ``base`` +/- ``spreads[name]`` percent; parameters
+    without a spread are held fixed.
+    """
+    ranges = {}
+    for name in PARAMETERS:
+        spread = spreads.get(name, 0)
+        if spread:
+            low = base[name] * (1 - spread / 100)
+            high = base[name] * (1 + spread / 100)
+            if name == "sample_size":
+                low = max(1, low)
+            ranges[name] = (max(0.0, low), high)
+        else:
+            ranges[name] = base[name]
+    return ranges
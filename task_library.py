@@ -0,0 +1,363 @@
+"""
+Task library (service catalog) loader.
+
+Parses ResearchCenter_ServiceMenu_Template(Task Library).csv once, merges it
+with the built-in service templates and builds category -> subcategory ->
+task indexes so the Manual Builder dropdowns are dictionary lookups. Parsed
+catalogs are cached at module level, which Streamlit shares across reruns and
+sessions, and are rebuilt only when the file's mtime or content hash changes.
+
+The library has no Base Cost column: a task's base cost is its Estimated
+Hours at the default rate card's rate for its lead staff role. Tasks missing
+either can't be priced; they stay in the catalog (``Priced`` is False) but
+are kept out of quoting and the optimizer until a line gives them a Base Cost.
+
+Built catalogs are also kept on disk as JSON, keyed by the CSV's content
+hash, so a fresh process (a new container, a restarted server) loads the
+prebuilt records instead of importing pandas and reparsing the CSV. Run
+``python task_library.py`` at image build time to prebuild it.
+"""
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+
+from pricing_engine import DEFAULT_RATE_CARD, STAFF_ROLE_TIERS, staff_role_rate
+from task_search import TaskSearchIndex
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "ResearchCenter_ServiceMenu_Template(Task Library).csv")
+
+# Column layout used throughout the app; CSV columns that aren't listed are kept as extras.
+CATALOG_COLUMNS = ["Category", "Subcategory", "Task Name", "Purpose", "Complexity", "Estimated Hours",
+                   "Base Cost", "Staff Role(s)", "Participant Involvement", "Deliverables", "Notes"]
+NUMERIC_COLUMNS = ["Estimated Hours", "Base Cost"]
+PREBUILT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "catalog")
+# Bump when the build steps change so older prebuilt catalogs are ignored.
+PREBUILT_FORMAT = 2
+
+# The library spreadsheet spells a few categories differently from the app.
+CATEGORY_ALIASES = {
+    "Stakeholder and Community Engagement": "Stakeholder & Community Engagement",
+    "Data Collection and Managment": "Data Collection & Management",
+    "Data Collection and Management": "Data Collection & Management",
+}
+
+# ----------------- Built-in Service Templates -----------------
+BUILTIN_SERVICES = [
+    {
+        "Category": "Discovery & Design",
+        "Subcategory": "",
+        "Task Name": "Initial Needs Assessment",
+        "Purpose": "Determine client requirements and market opportunities.",
+        "Complexity": "Medium",
+        "Estimated Hours": 20,
+        "Base Cost": 2000,
+        "Staff Role(s)": "Strategy Consultant, Analyst",
+        "Participant Involvement": "No",
+        "Deliverables": "Needs Assessment Report, Strategic Recommendations",
+        "Notes": "Ideal for early-stage projects."
+    },
+    {
+        "Category": "Stakeholder & Community Engagement",
+        "Subcategory": "",
+        "Task Name": "Community Focus Group",
+        "Purpose": "Gather insights from community members.",
+        "Complexity": "Medium",
+        "Estimated Hours": 25,
+        "Base Cost": 2500,
+        "Staff Role(s)": "Facilitator, Analyst",
+        "Participant Involvement": "Yes ($50 per participant)",
+        "Deliverables": "Focus Group Report, Transcripts",
+        "Notes": "Adjust group size based on client needs."
+    },
+    {
+        "Category": "Study Planning & IRB",
+        "Subcategory": "",
+        "Task Name": "Protocol Development",
+        "Purpose": "Develop research protocols and study designs.",
+        "Complexity": "High",
+        "Estimated Hours": 40,
+        "Base Cost": 4000,
+        "Staff Role(s)": "Research Scientist, IRB Specialist",
+        "Participant Involvement": "No",
+        "Deliverables": "Study Protocol Document, IRB Submission Package",
+        "Notes": "Essential for clinical research."
+    },
+    {
+        "Category": "Data Collection & Management",
+        "Subcategory": "Self-Reported Survey",
+        "Task Name": "Self-Reported Survey Administration",
+        "Purpose": "Administer surveys to collect self-reported data.",
+        "Complexity": "Low",
+        "Estimated Hours": 10,
+        "Base Cost": 1000,
+        "Staff Role(s)": "Survey Administrator, Analyst",
+        "Participant Involvement": "Yes ($25 per participant)",
+        "Deliverables": "Survey Data, Summary Report",
+        "Notes": "Low cost and scalable."
+    },
+    {
+        "Category": "Data Collection & Management",
+        "Subcategory": "Clinical Measure",
+        "Task Name": "Point-of-Care Blood Test",
+        "Purpose": "Conduct a point-of-care blood test.",
+        "Complexity": "Medium",
+        "Estimated Hours": 3,
+        "Base Cost": 1500,
+        "Staff Role(s)": "Lab Technician, Nurse",
+        "Participant Involvement": "Yes (incentivized)",
+        "Deliverables": "Test Results, Report",
+        "Notes": "Advanced options available."
+    },
+    {
+        "Category": "Strategic Advisory & Program Management",
+        "Subcategory": "",
+        "Task Name": "Project Coordination & Roadmap Development",
+        "Purpose": "Manage project timelines and develop strategic roadmaps.",
+        "Complexity": "Medium",
+        "Estimated Hours": 30,
+        "Base Cost": 2500,
+        "Staff Role(s)": "Project Manager, Advisor",
+        "Participant Involvement": "No",
+        "Deliverables": "Project Roadmap, Coordination Report",
+        "Notes": "Ideal for complex projects."
+    }
+]
+
+
+# ----------------- CSV Parsing -----------------
+def _decode(raw):
+    """
+    The library is exported from Excel, so it is usually cp1252 rather than
+    UTF-8 (curly quotes and dashes in the SOW text).
+    """
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("latin-1")
+
+
+def read_task_library(raw):
+    """
+    Parses the raw bytes of a task library CSV into the catalog layout.
+    Quoted multi-line SOW fields are handled by the CSV parser; blank cells
+    become "" and the numeric columns become 0. Rows without a Base Cost get
+    Estimated Hours x their lead staff role's rate (see staff_role_rate).
+    """
+    import pandas as pd
+
+    df = pd.read_csv(io.StringIO(_decode(raw)), dtype=str, keep_default_na=False)
+    df.columns = [col.strip() for col in df.columns]
+    for col in df.columns:
+        df[col] = df[col].str.strip()
+    df = df[df["Task Name"] != ""]
+    df["Category"] = df["Category"].replace(CATEGORY_ALIASES)
+    if "Subcategory" not in df.columns:
+        df["Subcategory"] = ""
+    if "Purpose" not in df.columns:
+        df["Purpose"] = df.get("Brief Description (Visuals)", "")
+    for col in CATALOG_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    rates = df["Staff Role(s)"].map(lambda roles: staff_role_rate(roles, DEFAULT_RATE_CARD))
+    derive = (df["Base Cost"] <= 0) & (df["Estimated Hours"] > 0) & rates.notna()
+    df.loc[derive, "Base Cost"] = df.loc[derive, "Estimated Hours"] * rates[derive].astype(float)
+    extras = [col for col in df.columns if col not in CATALOG_COLUMNS]
+    return df[CATALOG_COLUMNS + extras]
+
+
+class Catalog:
+    """
+    The merged service catalog plus its lookup indexes.
+
+    ``records`` holds one dict per task (with the keys in ``columns``) and
+    the indexes map category -> subcategory -> task name -> record position;
+    ``df`` builds the tabular form on first use for anything that wants a
+    DataFrame. Catalogs are shared between sessions, so treat everything here
+    as read-only.
+    """
+
+    def __init__(self, records, columns, fingerprint=None):
+        self.records = records
+        self.columns = list(columns)
+        self.fingerprint = fingerprint
+        self._df = None
+        self._index = {}
+        self._search_index = None
+        self._search_lock = threading.Lock()
+        for pos, record in enumerate(self.records):
+            by_sub = self._index.setdefault(record["Category"], {})
+            by_sub.setdefault(record["Subcategory"], {}).setdefault(record["Task Name"], pos)
+
+    @classmethod
+    def from_frame(cls, df, fingerprint=None):
+        df = df.reset_index(drop=True)
+        return cls(df.to_dict("records"), df.columns, fingerprint)
+
+    @property
+    def df(self):
+        if self._df is None:
+            import pandas as pd
+
+            self._df = pd.DataFrame(self.records, columns=self.columns)
+        return self._df
+
+    def __len__(self):
+        return len(self.records)
+
+    def categories(self):
+        return list(self._index)
+
+    def subcategories(self, category):
+        return list(self._index.get(category, {}))
+
+    def has_subcategories(self, category):
+        return any(sub != "" for sub in self._index.get(category, {}))
+
+    def task_names(self, category, subcategory=None):
+        """
+        Task names for a category, optionally narrowed to one subcategory.
+        """
+        by_sub = self._index.get(category, {})
+        if subcategory is not None:
+            return list(by_sub.get(subcategory, {}))
+        return [name for tasks in by_sub.values() for name in tasks]
+
+    def task(self, category, subcategory, task_name):
+        """
+        Returns the record for a task; with ``subcategory=None`` the first
+        match across the category's subcategories is used.
+        """
+        by_sub = self._index.get(category, {})
+        subs = [subcategory] if subcategory is not None else list(by_sub)
+        for sub in subs:
+            pos = by_sub.get(sub, {}).get(task_name)
+            if pos is not None:
+                return self.records[pos]
+        raise KeyError(f"Unknown task {task_name!r} in {category!r}.")
+
+    @property
+    def search_index(self):
+        """
+        Full-text index over the records, built on first use and kept with
+        the (cached) catalog.
+        """
+        if self._search_index is None:
+            with self._search_lock:
+                if self._search_index is None:
+                    self._search_index = TaskSearchIndex(self.records)
+        return self._search_index
+
+    def search(self, query, limit=20):
+        """
+        Returns: SearchResult(position, score) tuples for ``query``, best
+        first; ``records[position]`` is the task.
+        """
+        return self.search_index.search(query, limit)
+
+
+def build_catalog(raw, fingerprint=None):
+    import pandas as pd
+
+    library = read_task_library(raw)
+    df = pd.concat([pd.DataFrame(BUILTIN_SERVICES), library], ignore_index=True)
+    # Built-in services have no CSV-only columns (Tags, Dependencies, ...); blank them rather than NaN.
+    df = df.fillna("")
+    df = df.drop_duplicates(subset=["Category", "Subcategory", "Task Name"], keep="first")
+    df["Priced"] = df["Base Cost"] > 0
+    return Catalog.from_frame(df, fingerprint)
+
+
+def unpriced(record, modifiers=None, template_priced=()):
+    """
+    True for a task that can't be priced: no Base Cost in the library or in
+    the line's ``modifiers``, and no rate template of its own
+    (``template_priced`` is RateTemplateTable.template_priced).
+    """
+    if (record["Category"], record["Subcategory"]) in template_priced:
+        return False
+    return not record.get("Priced") and "Base Cost" not in (modifiers or {})
+
+
+# ----------------- Prebuilt Catalogs -----------------
+def _prebuilt_path(digest):
+    # The built-in services and the base cost rates are part of the build, so they are part of the key too.
+    inputs = json.dumps([BUILTIN_SERVICES, STAFF_ROLE_TIERS, list(DEFAULT_RATE_CARD)], sort_keys=True)
+    builtins = hashlib.sha256(inputs.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(PREBUILT_DIR, f"{digest}-{builtins}-v{PREBUILT_FORMAT}.json")
+
+
+def _load_prebuilt(digest):
+    # Plain JSON, so a file planted in the cache directory is at worst a wrong catalog, never code.
+    try:
+        with open(_prebuilt_path(digest), encoding="utf-8") as f:
+            data = json.load(f)
+        records, columns = data["records"], data["columns"]
+        if not all(isinstance(record, dict) for record in records):
+            return None
+        return Catalog(records, columns, digest)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_prebuilt(catalog):
+    path = _prebuilt_path(catalog.fingerprint)
+    try:
+        os.makedirs(PREBUILT_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"records": catalog.records, "columns": catalog.columns}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # A read-only checkout just rebuilds the catalog in every new process.
+
+
+# ----------------- Cached Loader -----------------
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_catalog(path=CATALOG_PATH):
+    """
+    Returns the catalog for ``path``, parsing the CSV only when it changed.
+
+    The cheap (mtime, size) check runs on every call; when it differs the
+    file is hashed and only reparsed if the content actually changed (a
+    touched-but-identical file keeps the cached catalog).
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[2]
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached and cached[1] == digest:
+            _cache[path] = (stamp, digest, cached[2])
+            return cached[2]
+        catalog = _load_prebuilt(digest)
+        if catalog is None:
+            catalog = build_catalog(raw, fingerprint=digest)
+            _save_prebuilt(catalog)
+        _cache[path] = (stamp, digest, catalog)
+        return catalog
+
+
+if __name__ == "__main__":
+    for catalog_path in sys.argv[1:] or [CATALOG_PATH]:
+        built = load_catalog(catalog_path)
+        print(f"Prebuilt {len(built)} tasks from {catalog_path} into {_prebuilt_path(built.fingerprint)}")
+        missing = [record["Task Name"] for record in built.records if not record["Priced"]]
+        if missing:
+            print(f"{len(missing)} tasks have no Estimated Hours or known staff role and can't be priced: "
+                  + ", ".join(missing))
@@ -0,0 +1,67 @@
+import pytest
+
+from cart import CartTotals, add_to_cart, edit_cart, remove_from_cart
+
+
+def line(cost, category="Discovery & Design", phase=None, quantity=1, **extra):
+    entry = {"Category": category, "Subcategory": "", "Task": "Task", "Quantity": quantity, "Direct Cost": cost, **extra}
+    if phase:
+        entry["Phase"] = phase
+    return entry
+
+
+def test_rollups_are_kept_in_cents():
+    lines, totals = [], CartTotals()
+    for _ in range(1000):
+        add_to_cart(lines, totals, line(0.1, phase="Launch"))
+    assert totals.direct_cost == 100.0
+    assert totals.by_phase == {"Launch": 100.0}
+    for _ in range(999):
+        remove_from_cart(lines, totals, 0)
+    assert totals.direct_cost == 0.1
+    assert totals.by_category == {"Discovery & Design": 0.1}
+
+
+def test_empty_groups_drop_out_and_unphased_lines_are_left_out():
+    totals = CartTotals.from_lines([line(10.25, "A", "Launch"), line(5.5, "B")])
+    assert totals.by_category == {"A": 10.25, "B": 5.5}
+    assert totals.by_phase == {"Launch": 10.25}
+    totals.remove(line(10.25, "A", "Launch"))
+    assert totals.by_category == {"B": 5.5}
+    assert totals.by_phase == {}
+    assert totals.line_count == 1
+
+
+def test_overhead_and_total():
+    totals = CartTotals.from_lines([line(1000), line(999.99)])
+    assert totals.direct_cost == 1999.99
+    assert totals.overhead(39) == pytest.approx(779.9961)
+    assert totals.total(39) == pytest.approx(2779.9861)
+
+
+def test_revisions_change_on_every_edit_and_copies_keep_theirs():
+    totals = CartTotals()
+    first = totals.revision
+    totals.add(line(1))
+    assert totals.revision != first
+    copy = totals.copy()
+    assert copy.revision == totals.revision
+    copy.add(line(2))
+    assert copy.revision != totals.revision
+    assert totals.direct_cost == 1
+
+
+def test_edit_cart_reprices_requantified_lines_and_matches_a_rebuild():
+    lines = [line(2000, quantity=1), line(600, "Data Collection & Management", quantity=5,
+                                          Subcategory="Clinical Measure"), line(3.33, phase="Launch")]
+    totals = CartTotals.from_lines(lines)
+    original = lines[0]
+    updated, removed = edit_cart(lines, totals, {0: {"Quantity": 3}, 1: {"Quantity": 2}, 2: {"Phase": ""}}, [2])
+    assert (updated, removed) == ([0, 1], [2])
+    # Base-cost lines keep their per-unit cost; template lines are repriced from their template's hours.
+    assert [entry["Direct Cost"] for entry in lines] == [6000.0, 600.0]
+    assert original["Direct Cost"] == 2000
+    rebuilt = CartTotals.from_lines(lines)
+    assert totals.direct_cost == rebuilt.direct_cost == 6600.0
+    assert totals.by_category == rebuilt.by_category
+    assert totals.by_phase == rebuilt.by_phase == {}
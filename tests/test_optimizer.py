@@ -0,0 +1,76 @@
+import itertools
+
+import pytest
+
+from optimizer import TaskChoice, choices_from_catalog, optimize_cart
+from task_library import Catalog
+
+
+def choice(name, cost, weight=1.0, low=0, high=1, category="Study Planning & IRB", subcategory=""):
+    return TaskChoice(category, subcategory, name, cost, {}, weight, low, high)
+
+
+def brute_force_value(choices, direct_budget):
+    best = 0.0
+    for quantities in itertools.product(*[range(c.min_qty, c.max_qty + 1) for c in choices]):
+        cost = sum(c.base_cost * q for c, q in zip(choices, quantities))
+        if cost <= direct_budget + 1e-9:
+            best = max(best, sum(c.weight * q / c.max_qty for c, q in zip(choices, quantities)))
+    return best
+
+
+@pytest.mark.parametrize("budget", [0, 999, 2500, 4170, 7000, 20000])
+def test_carts_fit_the_budget_and_match_brute_force(budget):
+    choices = [choice("A", 1000, 1.0), choice("B", 2500, 3.0), choice("C", 1200.5, 1.5, high=3),
+               choice("D", 4000, 2.0), choice("E", 333.33, 0.4, high=2)]
+    result = optimize_cart(choices, budget, overhead_percent=20)
+    assert result.feasible
+    assert result.total_cost <= budget + 0.005
+    assert result.total_cost == pytest.approx(round(result.direct_cost * 1.2, 2))
+    assert result.value == pytest.approx(brute_force_value(choices, budget / 1.2), abs=1e-6)
+
+
+def test_locked_lines_and_minimums_over_budget_are_infeasible():
+    locked = [{"Category": "Discovery & Design", "Task": "Kept", "Quantity": 1, "Direct Cost": 900.0}]
+    result = optimize_cart([choice("A", 200, low=1)], 1000, locked_lines=locked)
+    assert not result.feasible
+    assert result.method == "minimum"
+    assert "exceed the budget" in result.message
+    assert result.total_cost == 1100.0
+
+
+def test_a_spent_budget_keeps_only_locked_lines():
+    locked = [{"Category": "Discovery & Design", "Task": "Kept", "Quantity": 1, "Direct Cost": 1000.0}]
+    result = optimize_cart([choice("A", 200)], 1000, locked_lines=locked)
+    assert result.feasible
+    assert result.lines == locked
+
+
+def test_required_categories_get_a_unit():
+    choices = [choice("A", 100, 5.0), choice("B", 900, 0.1, category="Discovery & Design")]
+    result = optimize_cart(choices, 1000, required_categories=["Discovery & Design"])
+    assert {line["Task"] for line in result.lines} == {"A", "B"}
+    result = optimize_cart(choices, 1000, required_categories=["Nowhere"])
+    assert "No selectable tasks" in result.message
+
+
+def test_template_priced_tasks_are_costed_from_their_template():
+    survey = choice("Survey", 0, high=50, category="Data Collection & Management", subcategory="Self-Reported Survey")
+    result = optimize_cart([survey], 1500)
+    (line,) = result.lines
+    # $800 of fixed oversight plus $20 per survey.
+    assert line["Direct Cost"] == 800 + 20 * line["Quantity"]
+    assert result.direct_cost <= 1500
+
+
+def test_catalog_choices_skip_tasks_without_a_price():
+    records = [{"Category": "Study Planning & IRB", "Subcategory": "", "Task Name": "Priced", "Base Cost": 500.0,
+                "Priced": True},
+               {"Category": "Study Planning & IRB", "Subcategory": "", "Task Name": "Unpriced", "Base Cost": 0.0,
+                "Priced": False},
+               {"Category": "Data Collection & Management", "Subcategory": "Self-Reported Survey",
+                "Task Name": "Survey", "Base Cost": 0.0, "Priced": False}]
+    catalog = Catalog(records, ["Category", "Subcategory", "Task Name", "Base Cost", "Priced"])
+    assert [c.task for c in choices_from_catalog(catalog)] == ["Priced", "Survey"]
+    with_cost = choices_from_catalog(catalog, task_modifiers={"Unpriced": {"Base Cost": 75}})
+    assert [(c.task, c.base_cost) for c in with_cost][1] == ("Unpriced", 75.0)
@@ -0,0 +1,105 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from pricing_engine import (DEFAULT_RATE_CARD, RateCard, RateTemplateTable, default_templates, price_cart_lines,
+                            price_lines, price_task, staff_role_rate)
+
+
+def baseline_compute_task_cost(task_category, subcategory, num_units, custom_overrides=None,
+                               tier1_rate=300, tier2_rate=200, tier3_rate=100):
+    """
+    compute_task_cost as the app shipped it before the pricing engine, with
+    the sidebar rates as arguments.
+    """
+    if task_category == "Data Collection & Management":
+        if subcategory == "Self-Reported Survey":
+            defaults = {"tier1_fixed": 2, "tier2_fixed": 1, "tier3_per_unit": 0.2}
+        else:
+            defaults = {"tier1_fixed": 1, "tier2_fixed": 1, "tier3_fixed": 1}
+    elif task_category == "Discovery & Design":
+        defaults = {"tier1_fixed": 4, "tier2_fixed": 2, "tier3_fixed": 1}
+    else:
+        defaults = {"tier1_fixed": 1, "tier2_fixed": 1, "tier3_fixed": 1}
+    if custom_overrides:
+        defaults.update(custom_overrides)
+    tier1_hours = defaults.get("tier1_fixed", 1)
+    tier2_hours = defaults.get("tier2_fixed", 1)
+    if task_category == "Data Collection & Management" and subcategory == "Self-Reported Survey":
+        tier3_hours = num_units * defaults.get("tier3_per_unit", 0.2)
+    else:
+        tier3_hours = defaults.get("tier3_fixed", 1)
+    labor_cost = tier1_hours * tier1_rate + tier2_hours * tier2_rate + tier3_hours * tier3_rate
+    return labor_cost, tier1_hours, tier2_hours, tier3_hours
+
+
+PAIRS = [("Data Collection & Management", "Self-Reported Survey"), ("Data Collection & Management", "Clinical Measure"),
+         ("Data Collection & Management", ""), ("Discovery & Design", ""), ("Study Planning & IRB", ""),
+         ("Unknown Category", "Unknown Sub")]
+OVERRIDES = [None, {}, {"tier1_fixed": 3}, {"tier1_fixed": 0.5, "tier2_fixed": 0}]
+SURVEY = ("Data Collection & Management", "Self-Reported Survey")
+
+
+def tier3_override(category, subcategory):
+    # The baseline only read tier3_per_unit for surveys and tier3_fixed for everything else.
+    return {"tier3_per_unit": 0.5} if (category, subcategory) == SURVEY else {"tier3_fixed": 7}
+RATE_CARDS = [DEFAULT_RATE_CARD, RateCard(250, 175, 90)]
+
+
+@pytest.mark.parametrize("category,subcategory", PAIRS)
+def test_price_task_matches_baseline(category, subcategory):
+    overrides_to_try = OVERRIDES + [tier3_override(category, subcategory)]
+    for units, overrides, rates in itertools.product([0, 1, 37, 500], overrides_to_try, RATE_CARDS):
+        expected = baseline_compute_task_cost(category, subcategory, units, overrides, *rates)
+        assert price_task(category, subcategory, units, overrides, rates) == pytest.approx(expected)
+
+
+def test_price_lines_batch_matches_single_lines():
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, len(PAIRS), 200)
+    units = rng.integers(0, 300, 200)
+    categories = [PAIRS[i][0] for i in picks]
+    subcategories = [PAIRS[i][1] for i in picks]
+    overrides = [(OVERRIDES + [tier3_override(c, s)])[k]
+                 for c, s, k in zip(categories, subcategories, rng.integers(0, len(OVERRIDES) + 1, 200))]
+    priced = price_lines(categories, subcategories, units, overrides, DEFAULT_RATE_CARD)
+    for i in range(200):
+        expected = baseline_compute_task_cost(categories[i], subcategories[i], units[i], overrides[i])
+        assert priced.labor_cost[i] == pytest.approx(expected[0])
+
+
+def test_price_lines_with_several_rate_cards():
+    priced = price_lines(["Discovery & Design"], [""], [1], rate_cards=np.array(RATE_CARDS))
+    assert priced.labor_cost.shape == (1, 2)
+    assert priced.labor_cost[0, 1] == pytest.approx(baseline_compute_task_cost("Discovery & Design", "", 1, None,
+                                                                               *RATE_CARDS[1])[0])
+
+
+def test_price_cart_lines_uses_base_cost_outside_template_rows():
+    costs = price_cart_lines(["Data Collection & Management", "Discovery & Design", "Data Collection & Management"],
+                             ["Self-Reported Survey", "", "Clinical Measure"], [50, 3, 5], [1000, 2000.333, 1500])
+    assert costs[0] == pytest.approx(baseline_compute_task_cost("Data Collection & Management",
+                                                                "Self-Reported Survey", 50)[0])
+    assert costs[1] == pytest.approx(6001.0)
+    assert costs[2] == pytest.approx(600.0)
+
+
+def test_template_priced_rows_come_from_the_table():
+    templates = default_templates()
+    assert ("Data Collection & Management", "Self-Reported Survey") in templates.template_priced
+    assert ("Discovery & Design", "") not in templates.template_priced
+    assert templates.unit_labels[("Data Collection & Management", "Clinical Measure")] == "Tests"
+
+
+def test_template_table_requires_a_catch_all_row():
+    with pytest.raises(ValueError):
+        RateTemplateTable({("Discovery & Design", ""): {"tier1_fixed": 1}})
+
+
+def test_staff_role_rate_uses_the_lead_role():
+    assert staff_role_rate("Coordinator, PI") == DEFAULT_RATE_CARD.tier3_rate
+    assert staff_role_rate(" pi ") == DEFAULT_RATE_CARD.tier1_rate
+    assert staff_role_rate("Analyst", RateCard(1, 2, 3)) == 2
+    assert staff_role_rate("") is None
+    assert staff_role_rate("Astronaut, PI") is None
@@ -0,0 +1,96 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from project_store import ProjectStore, WriteBehindError
+
+SCOPE = {"Project Name": "Pilot", "Partner Name": "Clinic", "Project Type": "Pilot Study",
+         "Project Start Date": date(2026, 1, 5), "Project End Date": date(2027, 1, 5), "Estimated N": 200}
+PHASES = [{"Title": "Plan", "Description": "Set up.", "Start": date(2026, 1, 5), "End": date(2026, 2, 1),
+           "DurationWeeks": 4},
+          {"Title": "Collect", "Description": "", "Start": date(2026, 2, 2), "End": date(2026, 3, 1),
+           "DurationWeeks": 4, "DependsOn": [0]}]
+LINES = [{"Category": "Discovery & Design", "Subcategory": "", "Task": "Initial Needs Assessment", "Quantity": 1,
+          "Direct Cost": 2000.0, "Modifiers": {}, "Phase": "Plan"},
+         {"Category": "Data Collection & Management", "Subcategory": "Self-Reported Survey",
+          "Task": "Self-Reported Survey Administration", "Quantity": 50, "Direct Cost": 1800.0,
+          "Modifiers": {"Custom Notes": "Online"}, "Phase": "Collect"}]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProjectStore(str(tmp_path / "projects.db"), batch_size=50, flush_interval=60)
+    yield store
+    store.close()
+
+
+def test_save_and_load_round_trip(store):
+    project_id = store.save_project(SCOPE, PHASES, LINES, {"Initial Needs Assessment": {"Base Cost": 2500}}, 39)
+    saved = store.load_project(project_id)
+    assert saved["scope"] == SCOPE
+    assert saved["phases"] == PHASES
+    assert saved["sprint_log"] == LINES
+    assert saved["task_modifiers"] == {"Initial Needs Assessment": {"Base Cost": 2500}}
+    assert saved["overhead_percent"] == 39
+
+
+def test_saving_again_replaces_the_project(store):
+    project_id = store.save_project(SCOPE, PHASES, LINES)
+    assert store.save_project(dict(SCOPE, **{"Project Name": "Renamed"}), PHASES[:1], LINES[:1], project_id=project_id) == project_id
+    saved = store.load_project(project_id)
+    assert saved["scope"]["Project Name"] == "Renamed"
+    assert len(saved["phases"]) == 1 and len(saved["sprint_log"]) == 1
+    with pytest.raises(KeyError):
+        store.load_project(project_id + 1)
+
+
+def test_queued_lines_are_read_before_and_after_the_flush(store):
+    project_id = store.save_project(SCOPE, PHASES, LINES[:1], overhead_percent=10)
+    store.queue_add_line(project_id, LINES[1])
+    for flushed in (False, True):
+        if flushed:
+            store.flush()
+        assert store.load_project(project_id)["sprint_log"] == LINES
+        (listed,) = store.list_projects()
+        assert (listed["lines"], listed["direct_cost"], listed["total_cost"]) == (2, 3800.0, 4180.0)
+        assert store.cost_by_phase([project_id]) == {project_id: {"Plan": 2000.0, "Collect": 1800.0}}
+        assert [p["id"] for p in store.list_projects(phase="Collect")] == [project_id]
+
+
+def test_list_projects_filters(store):
+    first = store.save_project(SCOPE, PHASES, LINES)
+    second = store.save_project(dict(SCOPE, **{"Partner Name": "Lab"}), [], LINES[:1])
+    assert [p["id"] for p in store.list_projects()] == [second, first]
+    assert [p["id"] for p in store.list_projects(partner="Lab")] == [second]
+    assert [p["id"] for p in store.list_projects(category="Data Collection & Management")] == [first]
+    assert store.cost_by_category([first, second])[second] == {"Discovery & Design": 2000.0}
+
+
+def test_edit_lines_updates_removes_and_renumbers(store):
+    project_id = store.save_project(SCOPE, PHASES, LINES + [dict(LINES[0], Task="Third")])
+    store.edit_lines(project_id, {1: dict(LINES[1], Quantity=60, **{"Direct Cost": 2000.0})}, removals=[0])
+    sprint_log = store.load_project(project_id)["sprint_log"]
+    assert [(line["Task"], line["Quantity"], line["Direct Cost"]) for line in sprint_log] == [
+        ("Self-Reported Survey Administration", 60, 2000.0), ("Third", 1, 2000.0)]
+    store.queue_add_line(project_id, LINES[0])
+    store.flush()
+    assert len(store.load_project(project_id)["sprint_log"]) == 3
+
+
+def test_a_failed_background_flush_is_kept_and_reported(store):
+    kept = store.save_project(SCOPE, [], [])
+    deleted = store.save_project(SCOPE, [], [])
+    store.queue_add_line(kept, LINES[0])
+    store.queue_add_line(deleted, LINES[1])
+    # Another process deletes a project while its lines are still queued.
+    other = sqlite3.connect(store.path)
+    other.execute("DELETE FROM projects WHERE id = ?", (deleted,))
+    other.commit()
+    other.close()
+    store._flush_in_background()
+    with pytest.raises(WriteBehindError, match="1 will be retried and 1 for deleted projects"):
+        store.load_project(kept)
+    assert store.load_project(kept)["sprint_log"] == LINES[:1]
+    store.flush()
+    assert store.list_projects()[0]["lines"] == 1
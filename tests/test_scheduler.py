@@ -0,0 +1,77 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from scheduler import (DependencyCycleError, cycle_members, plan_project, resolve_dependencies, schedule,
+                       topological_levels)
+
+
+def test_critical_path_of_a_diamond():
+    # 0 -> (1, 2) -> 3; the long branch through 1 is critical, 2 has slack.
+    plan = schedule([2, 5, 1, 3], [[], [0], [0], [1, 2]])
+    assert plan.early_start.tolist() == [0, 2, 2, 7]
+    assert plan.finish == 10
+    assert plan.slack.tolist() == [0, 0, 4, 0]
+    assert plan.critical.tolist() == [True, True, False, True]
+    assert plan.critical_path == [0, 1, 3]
+
+
+def test_release_days_hold_activities_back():
+    plan = schedule([2, 2], [[], [0]], release=[0, 5])
+    assert plan.early_start.tolist() == [0, 5]
+    assert plan.critical_path == [1]
+
+
+def test_start_to_start_links_have_no_lag():
+    # Activity 1 starts with 0 (start-to-start) and 2 follows 1.
+    plan = schedule([10, 3, 4], [[], [], [1]], start_dependencies=[[], [0], []])
+    assert plan.early_start.tolist() == [0, 0, 3]
+    assert plan.finish == 10
+    assert plan.slack.tolist() == [0, 3, 3]
+    assert plan.critical_path == [0]
+
+
+def test_cycles_are_reported():
+    with pytest.raises(DependencyCycleError) as error:
+        schedule([1, 1, 1, 1], [[], [2], [1], [2]])
+    assert sorted(error.value.args[0]) == [1, 2, 3]
+    assert cycle_members([[], [2], [1], [2]], error.value.args[0]) == [1, 2]
+
+
+def test_topological_levels():
+    levels = topological_levels(4, np.array([0, 0, 1, 2]), np.array([1, 2, 3, 3]))
+    assert [level.tolist() for level in levels] == [[0], [1, 2], [3]]
+
+
+def test_dependencies_match_exact_names_and_phase_ordinals_only():
+    refs = resolve_dependencies(["Design Focus Group Guide finalized, IRB approved", "phase 2; Plan", "Phase 9", ""],
+                                ["Recruit Participants", "Design Focus Group Guide", "Guide", "Focus"],
+                                ["Plan", "Launch"])
+    assert refs.tasks == [[1], [], [], []]
+    assert refs.phases == [[], [0, 1], [], []]
+    assert refs.unresolved == [(0, "IRB approved"), (2, "Phase 9")]
+
+
+def test_shared_words_alone_create_no_dependency():
+    refs = resolve_dependencies(["focus group materials"], ["Conduct Focus Group"])
+    assert refs.tasks == [[]]
+    assert refs.unresolved == [(0, "focus group materials")]
+
+
+def test_plan_project_keeps_dependencies_outside_a_cycle_and_warns():
+    tasks = [{"Task": "A", "DurationDays": 1, "Dependencies": "B"},
+             {"Task": "B", "DurationDays": 1, "Dependencies": "A"},
+             {"Task": "C", "DurationDays": 1, "Dependencies": "A, screener finalized"},
+             {"Task": "D", "DurationDays": 2, "Dependencies": "Phase 1", "Phase": "Build"}]
+    phases = [{"Title": "Plan", "DurationWeeks": 1}, {"Title": "Build", "DurationWeeks": 2}]
+    rows, plan, warnings = plan_project(date(2026, 1, 5), phases, tasks)
+    starts = {row["Title"]: row["Start"] for row in rows}
+    assert starts["Plan"] == date(2026, 1, 5)
+    assert starts["Build"] == date(2026, 1, 12)
+    assert starts["C"] == date(2026, 1, 6)
+    assert starts["D"] == date(2026, 1, 12)
+    assert len(warnings) == 2
+    assert "'screener finalized'" in warnings[0]
+    assert "cycle: A, B" in warnings[1]
+    assert plan.finish == 21
@@ -0,0 +1,54 @@
+from task_search import TaskSearchIndex, tokenize
+
+RECORDS = [
+    {"Task Name": "Focus Group Facilitation", "Tags": "qualitative, groups",
+     "Longer Description (SOW)": "Moderated sessions with participants."},
+    {"Task Name": "Survey Programming", "Tags": "quantitative",
+     "Longer Description (SOW)": "Build the instrument and pilot it with a focus group."},
+    {"Task Name": "Interview Transcription", "Tags": "qualitative",
+     "Longer Description (SOW)": "Verbatim transcripts of recorded interviews."},
+    {"Task Name": "Statistical Analysis", "Category": "Analysis",
+     "Longer Description (SOW)": "Regression models for the survey data."},
+]
+
+
+def positions(index, query):
+    return [result.position for result in index.search(query)]
+
+
+def test_tokenize_drops_stop_words_and_punctuation():
+    assert tokenize("Analysis of the IRB-approved Survey") == ["analysis", "irb", "approved", "survey"]
+
+
+def test_name_hits_outrank_sow_hits():
+    index = TaskSearchIndex(RECORDS)
+    assert positions(index, "focus group") == [0, 1]
+    assert positions(index, "survey") == [1, 3]
+
+
+def test_tasks_covering_more_terms_come_first():
+    index = TaskSearchIndex(RECORDS)
+    # Task 3 only mentions "survey" in its SOW but also matches "regression".
+    assert positions(index, "survey regression")[0] == 3
+
+
+def test_prefixes_match_while_typing():
+    index = TaskSearchIndex(RECORDS)
+    assert positions(index, "transcri") == [2]
+    prefix_score = index.search("transcri")[0].score
+    assert prefix_score < index.search("transcription")[0].score
+
+
+def test_one_edit_typos_still_match():
+    index = TaskSearchIndex(RECORDS)
+    assert positions(index, "statistcal") == [3]
+    assert positions(index, "intervew")[0] == 2
+
+
+def test_queries_without_matches_return_nothing():
+    index = TaskSearchIndex(RECORDS)
+    assert index.search("") == []
+    assert index.search("the and of") == []
+    assert index.search("zebra") == []
+    assert TaskSearchIndex([]).search("survey") == []
+    assert len(index.search("qualitative", limit=1)) == 1
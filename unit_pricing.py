@@ -1,13 +1,50 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from datetime import date, timedelta
+import asyncio
+import copy
+import importlib.util
+import io
+import json
+import time
+import numpy as np
+from datetime import date
 from dateutil.relativedelta import relativedelta
-import openai
 
-# Set your OpenAI API key securely from Streamlit secrets.
-openai.api_key = st.secrets["openai"]["api_key"]
+from pricing_engine import RateCard, default_templates, price_task
+from task_library import load_catalog, unpriced
+from cart import CartTotals, add_to_cart, edit_cart
+from burn import monthly, project_burn, quarterly
+from chart_cache import MAX_GANTT_ROWS, burn_png, category_bar_png, cost_histogram_png, gantt_png, phase_pie_png, tornado_png
+from ai_client import (AIGenerationError, ResponseCache, assemble_sections, generate_completion,
+                       generate_sections, settings_from_mapping)
+from project_store import WriteBehindError, get_store
+from sensitivity import (MAX_GRID_SCENARIOS, PARAMETER_LABELS, build_cost_model, evaluate, grid_size, grid_sweep,
+                         max_sample_size, monte_carlo_sweep, ranges_around, summarize, tornado)
+from optimizer import choices_from_catalog, optimize_cart
+from reactive import ReactiveGraph
+from scenarios import History, compare_snapshots, restore, take_snapshot
+from metrics import prometheus_text, registry, snapshot, span, timed
+from scheduler import DependencyCycleError, cart_tasks, plan_project
+from proposal import (build_proposal_model, generate_ai_prompt, section_prompts, write_budget_csv, write_budget_xlsx,
+                      write_html, write_markdown)
+
+rerun_started = time.perf_counter()
+ai_cache = ResponseCache()
+
+
+def ai_settings():
+    """
+    Reads the AI settings from Streamlit secrets when generation is first
+    requested, so the app renders without them. The OpenAI key goes under
+    [openai] api_key; optional keys there (backend, base_url, model,
+    max_tokens, temperature, timeout, max_retries, backoff) tune generation.
+
+    Returns: backend, AIParams, RetryPolicy, or None if [openai] is missing.
+    """
+    try:
+        settings = st.secrets["openai"]
+    except (KeyError, FileNotFoundError):
+        return None
+    return settings_from_mapping(settings)
 
 # ----------------- Page Configuration -----------------
 st.set_page_config(page_title="Dynamic Research Project Scoping Tool", layout="wide")
@@ -21,7 +58,10 @@ with st.sidebar:
     tier2_rate = st.number_input("Tier 2 (Leadership) Rate ($/hr)", value=200)
     tier3_rate = st.number_input("Tier 3 (Coordinator) Rate ($/hr)", value=100)
     overhead_percent = st.number_input("Overhead / Indirect (%)", min_value=0, max_value=100, value=39, step=1)
+    escalation_percent = st.number_input("Annual Rate Escalation (%)", min_value=0.0, max_value=25.0, value=0.0, step=0.5,
+                                         help="Applied to spending from the second project year on, compounding yearly.")
     unit_price = st.number_input("Unit Price ($ per unit)", min_value=100, step=100, value=5000)
+    rate_card = RateCard(tier1_rate, tier2_rate, tier3_rate)
 
 # ----------------- Running Cost Summary Container in Sidebar -----------------
 cost_container = st.sidebar.container()
@@ -35,144 +75,217 @@ if "task_modifiers" not in st.session_state:
     st.session_state.task_modifiers = {}
 if "phases" not in st.session_state:
     st.session_state.phases = []  # List of phase dictionaries
+# Running rollups shared by the dashboard, the AI prompt and the proposal document.
+if "cart_totals" not in st.session_state or st.session_state.cart_totals.line_count != len(st.session_state.sprint_log):
+    st.session_state.cart_totals = CartTotals.from_lines(st.session_state.sprint_log)
+if "project_id" not in st.session_state:
+    st.session_state.project_id = None  # Saved project this session's cart edits are written behind to
+if "cart_editor_version" not in st.session_state:
+    st.session_state.cart_editor_version = 0  # Bumped whenever the cart is replaced or bulk-edited
+if "history" not in st.session_state:
+    st.session_state.history = History()  # Undo/redo snapshots of the cart, phases, modifiers and scope
+if "scenarios" not in st.session_state:
+    st.session_state.scenarios = {}  # Named snapshots for side-by-side comparison
+
+CURRENT_SCENARIO = "Current cart"
+
+
+def current_snapshot(label=""):
+    """
+    Snapshot of the live project state, sharing cart lines with the latest
+    undo snapshot where nothing changed.
+    """
+    return take_snapshot(st.session_state.sprint_log, st.session_state.cart_totals, st.session_state.phases,
+                         st.session_state.task_modifiers, st.session_state.scope_info, label,
+                         previous=st.session_state.history.latest)
+
+
+def checkpoint():
+    # Call right before an edit so Undo returns to the state it replaces.
+    st.session_state.history.checkpoint(current_snapshot())
+
+
+def reset_phase_widgets():
+    # Drop the phase widgets' own state so they pick up replaced phases.
+    for key in [k for k in st.session_state if str(k).startswith(("phase_title_", "phase_desc_", "duration_", "depends_"))]:
+        del st.session_state[key]
+
+
+def restore_snapshot(snapshot):
+    (st.session_state.sprint_log, st.session_state.cart_totals, st.session_state.phases,
+     st.session_state.task_modifiers, st.session_state.scope_info) = restore(snapshot)
+    st.session_state.cart_editor_version += 1
+    reset_phase_widgets()
+    if st.session_state.project_id is not None:
+        project_store.save_project(st.session_state.scope_info, st.session_state.phases, st.session_state.sprint_log,
+                                   st.session_state.task_modifiers, overhead_percent, st.session_state.project_id)
+
+# ----------------- Saved Projects in Sidebar -----------------
+project_store = get_store()
+with st.sidebar:
+    st.header("📁 Saved Projects")
+    if st.button("Save Project" if st.session_state.project_id is None else "Save Changes to Project"):
+        try:
+            st.session_state.project_id = project_store.save_project(
+                st.session_state.scope_info, st.session_state.phases, st.session_state.sprint_log,
+                st.session_state.task_modifiers, overhead_percent, st.session_state.project_id)
+            st.success("Project saved.")
+        except WriteBehindError as e:
+            st.error(f"Project not saved: {e}")
+    saved_projects = project_store.list_projects()
+    if saved_projects:
+        project_to_open = st.selectbox(
+            "Open Saved Project", saved_projects,
+            format_func=lambda p: f"{p['name'] or 'Untitled'} ({p['partner'] or 'no partner'}) — ${p['total_cost']:,.0f}")
+        if st.button("Open Project"):
+            try:
+                saved = project_store.load_project(project_to_open["id"])
+            except WriteBehindError as e:
+                saved = None
+                st.error(f"Project not opened: {e}")
+            if saved is not None:
+                checkpoint()
+                st.session_state.scope_info = saved["scope"]
+                st.session_state.phases = saved["phases"]
+                st.session_state.sprint_log = saved["sprint_log"]
+                st.session_state.task_modifiers = saved["task_modifiers"]
+                st.session_state.cart_totals = CartTotals.from_lines(saved["sprint_log"])
+                st.session_state.project_id = project_to_open["id"]
+                st.session_state.cart_editor_version += 1
+                reset_phase_widgets()
+                st.rerun()
+
+# ----------------- Undo / Redo in Sidebar -----------------
+with st.sidebar:
+    st.header("🕘 History")
+    history = st.session_state.history
+    undo_col, redo_col = st.columns(2)
+    if undo_col.button(f"↶ Undo ({len(history.undo_stack)})", disabled=not history.undo_stack, key="undo"):
+        restore_snapshot(history.undo(current_snapshot()))
+        st.rerun()
+    if redo_col.button(f"↷ Redo ({len(history.redo_stack)})", disabled=not history.redo_stack, key="redo"):
+        restore_snapshot(history.redo(current_snapshot()))
+        st.rerun()
 
 # ----------------- Default Template Cost Function -----------------
+@timed("compute_task_cost")
 def compute_task_cost(task_category, subcategory, num_units, custom_overrides=None):
     """
-    Computes labor cost based on default templates.
-    For Data Collection & Management tasks:
-      - "Self-Reported Survey": fixed overhead for Tier 1 and Tier 2 plus variable hours for Tier 3 per unit.
-      - "Clinical Measure": fixed hours for all tiers.
-    For other categories, fixed defaults are used.
+    Computes labor cost based on default templates, priced against the
+    sidebar rate card. The hour templates and the vectorized batch version
+    live in pricing_engine.
     
     Returns: labor_cost, tier1_hours, tier2_hours, tier3_hours
     """
-    if task_category == "Data Collection & Management":
-        if subcategory == "Self-Reported Survey":
-            defaults = {"tier1_fixed": 2, "tier2_fixed": 1, "tier3_per_unit": 0.2}
-        elif subcategory == "Clinical Measure":
-            defaults = {"tier1_fixed": 1, "tier2_fixed": 1, "tier3_fixed": 1}
-        else:
-            defaults = {"tier1_fixed": 1, "tier2_fixed": 1, "tier3_fixed": 1}
-    elif task_category == "Discovery & Design":
-        defaults = {"tier1_fixed": 4, "tier2_fixed": 2, "tier3_fixed": 1}
-    else:
-        defaults = {"tier1_fixed": 1, "tier2_fixed": 1, "tier3_fixed": 1}
-    
-    if custom_overrides:
-        defaults.update(custom_overrides)
-    
-    if task_category == "Data Collection & Management":
-        if subcategory == "Self-Reported Survey":
-            tier1_hours = defaults.get("tier1_fixed", 2)
-            tier2_hours = defaults.get("tier2_fixed", 1)
-            tier3_hours = num_units * defaults.get("tier3_per_unit", 0.2)
-        elif subcategory == "Clinical Measure":
-            tier1_hours = defaults.get("tier1_fixed", 1)
-            tier2_hours = defaults.get("tier2_fixed", 1)
-            tier3_hours = defaults.get("tier3_fixed", 1)
-        else:
-            tier1_hours = defaults.get("tier1_fixed", 1)
-            tier2_hours = defaults.get("tier2_fixed", 1)
-            tier3_hours = defaults.get("tier3_fixed", 1)
-    else:
-        tier1_hours = defaults.get("tier1_fixed", 1)
-        tier2_hours = defaults.get("tier2_fixed", 1)
-        tier3_hours = defaults.get("tier3_fixed", 1)
-    
-    labor_cost = (tier1_hours * tier1_rate) + (tier2_hours * tier2_rate) + (tier3_hours * tier3_rate)
-    return labor_cost, tier1_hours, tier2_hours, tier3_hours
+    return price_task(task_category, subcategory, num_units, custom_overrides, rate_card)
 
 # ----------------- Comprehensive Service Database -----------------
-data = [
-    {
-        "Category": "Discovery & Design",
-        "Subcategory": "",
-        "Task Name": "Initial Needs Assessment",
-        "Purpose": "Determine client requirements and market opportunities.",
-        "Complexity": "Medium",
-        "Estimated Hours": 20,
-        "Base Cost": 2000,
-        "Staff Role(s)": "Strategy Consultant, Analyst",
-        "Participant Involvement": "No",
-        "Deliverables": "Needs Assessment Report, Strategic Recommendations",
-        "Notes": "Ideal for early-stage projects."
-    },
-    {
-        "Category": "Stakeholder & Community Engagement",
-        "Subcategory": "",
-        "Task Name": "Community Focus Group",
-        "Purpose": "Gather insights from community members.",
-        "Complexity": "Medium",
-        "Estimated Hours": 25,
-        "Base Cost": 2500,
-        "Staff Role(s)": "Facilitator, Analyst",
-        "Participant Involvement": "Yes ($50 per participant)",
-        "Deliverables": "Focus Group Report, Transcripts",
-        "Notes": "Adjust group size based on client needs."
-    },
-    {
-        "Category": "Study Planning & IRB",
-        "Subcategory": "",
-        "Task Name": "Protocol Development",
-        "Purpose": "Develop research protocols and study designs.",
-        "Complexity": "High",
-        "Estimated Hours": 40,
-        "Base Cost": 4000,
-        "Staff Role(s)": "Research Scientist, IRB Specialist",
-        "Participant Involvement": "No",
-        "Deliverables": "Study Protocol Document, IRB Submission Package",
-        "Notes": "Essential for clinical research."
-    },
-    {
-        "Category": "Data Collection & Management",
-        "Subcategory": "Self-Reported Survey",
-        "Task Name": "Self-Reported Survey Administration",
-        "Purpose": "Administer surveys to collect self-reported data.",
-        "Complexity": "Low",
-        "Estimated Hours": 10,
-        "Base Cost": 1000,
-        "Staff Role(s)": "Survey Administrator, Analyst",
-        "Participant Involvement": "Yes ($25 per participant)",
-        "Deliverables": "Survey Data, Summary Report",
-        "Notes": "Low cost and scalable."
-    },
-    {
-        "Category": "Data Collection & Management",
-        "Subcategory": "Clinical Measure",
-        "Task Name": "Point-of-Care Blood Test",
-        "Purpose": "Conduct a point-of-care blood test.",
-        "Complexity": "Medium",
-        "Estimated Hours": 3,
-        "Base Cost": 1500,
-        "Staff Role(s)": "Lab Technician, Nurse",
-        "Participant Involvement": "Yes (incentivized)",
-        "Deliverables": "Test Results, Report",
-        "Notes": "Advanced options available."
-    },
-    {
-        "Category": "Strategic Advisory & Program Management",
-        "Subcategory": "",
-        "Task Name": "Project Coordination & Roadmap Development",
-        "Purpose": "Manage project timelines and develop strategic roadmaps.",
-        "Complexity": "Medium",
-        "Estimated Hours": 30,
-        "Base Cost": 2500,
-        "Staff Role(s)": "Project Manager, Advisor",
-        "Participant Involvement": "No",
-        "Deliverables": "Project Roadmap, Coordination Report",
-        "Notes": "Ideal for complex projects."
-    }
-]
-
-df_services = pd.DataFrame(data)
+# Parsed once per process and reused until the task library CSV changes.
+catalog = load_catalog()
+
+# ----------------- Derived Values -----------------
+# Derived values live in a per-session reactive graph: each node names the inputs it
+# reads and is recomputed only when one of them changed since the previous rerun.
+if "graph" not in st.session_state:
+    st.session_state.graph = ReactiveGraph()
+graph = st.session_state.graph
+graph.set_input("rate_card", rate_card)
+graph.set_input("overhead_percent", overhead_percent)
+graph.set_input("escalation_percent", escalation_percent)
+graph.set_input("catalog", catalog, token=catalog.fingerprint)
+graph.set_input("task_modifiers", st.session_state.task_modifiers)
+graph.source("cart", lambda: ((st.session_state.sprint_log, st.session_state.cart_totals), st.session_state.cart_totals.revision))
+graph.source("scope", lambda: (st.session_state.scope_info, copy.deepcopy(st.session_state.scope_info)))
+graph.source("phases", lambda: (st.session_state.phases, copy.deepcopy(st.session_state.phases)))
+
+
+def schedule_phases(start_date, phase_inputs):
+    """
+    Returns: (schedule rows, phase indices of a dependency cycle or None);
+    a cycle falls back to laying the phases end to end.
+    """
+    try:
+        return plan_project(start_date, phase_inputs).rows, None
+    except DependencyCycleError as e:
+        return plan_project(start_date, [{**phase, "DependsOn": None} for phase in phase_inputs]).rows, e.args[0]
+
+
+def project_gantt(start_date, phase_inputs, cart, catalog):
+    """
+    Returns: dict with the Gantt PNG, an optional caption, the scheduled
+    finish date, the critical path length and the schedule's dependency
+    warnings, or None without titled phases.
+    """
+    if not any(phase.get("Title") for phase in phase_inputs):
+        return None
+    sprint_log, _ = cart
+    scheduled_tasks = cart_tasks(sprint_log, catalog)
+    try:
+        schedule_rows, plan, warnings = plan_project(start_date, phase_inputs, scheduled_tasks)
+    except DependencyCycleError:
+        schedule_rows, plan, warnings = plan_project(start_date, [{**phase, "DependsOn": None} for phase in phase_inputs],
+                                                     scheduled_tasks)
+    chart_rows = [row for row in schedule_rows if row["Kind"] == "Task" or row["Title"]]
+    caption = None
+    if len(chart_rows) > MAX_GANTT_ROWS:
+        chart_rows = [row for row in chart_rows if row["Kind"] == "Phase" or row["Critical"]][:MAX_GANTT_ROWS]
+        caption = f"Showing phases and critical-path tasks ({len(chart_rows)} of {len(schedule_rows)} activities)."
+    return {"png": gantt_png(chart_rows), "caption": caption, "finish": max(row["End"] for row in schedule_rows),
+            "critical": len(plan.critical_path), "warnings": warnings}
+
+
+def cart_rows(cart, overhead_percent):
+    sprint_log, _ = cart
+    return [{"Remove": False, "Task": task["Task"], "Category": task["Category"], "Phase": task.get("Phase", ""),
+             "Quantity": task["Quantity"], "Direct Cost": task["Direct Cost"],
+             "Total Cost": round(task["Direct Cost"]*(1+overhead_percent/100), 2),
+             "Notes": (task.get("Modifiers") or {}).get("Custom Notes", "")} for task in sprint_log]
+
+
+def proposal_document(scope, phases, cart, overhead_percent, burn):
+    """
+    Returns: (proposal model, Markdown text, section spans); one render pass
+    feeds both the Exports preview and the Markdown download.
+    """
+    sprint_log, totals = cart
+    # The same build and render generate_proposal times, so it is recorded under the same span.
+    with span("generate_proposal"):
+        model = build_proposal_model(scope, phases, sprint_log, totals, overhead_percent, burn)
+        buffer = io.StringIO()
+        spans = write_markdown(model, buffer)
+    return model, buffer.getvalue(), spans
+
+
+def simulated_task_cost(category, subcategory, num_units, modifiers):
+    """
+    compute_task_cost for the Manual Builder's cost simulation, memoized on
+    the task, units, modifiers and rate card.
+    """
+    graph.set_input("simulated_task", (category, subcategory, num_units, modifiers))
+    return graph.get("simulated_cost")
+
+
+graph.node("simulated_cost", ["simulated_task", "rate_card"], lambda task, _rate_card: compute_task_cost(*task))
+graph.node("phase_schedule", ["project_start", "phase_inputs"], schedule_phases)
+graph.node("gantt", ["project_start", "phase_inputs", "cart", "catalog"], project_gantt)
+graph.node("category_chart", ["cart"], lambda cart: category_bar_png(cart[1].by_category))
+graph.node("phase_chart", ["cart"], lambda cart: phase_pie_png(cart[1].by_phase) if cart[1].by_phase else None)
+graph.node("cart_rows", ["cart", "overhead_percent"], cart_rows)
+graph.node("burn", ["cart", "phases", "project_start", "study_months", "overhead_percent", "escalation_percent"],
+           lambda cart, phases, start, months, overhead, escalation: project_burn(cart[0], phases, start, months,
+                                                                                 overhead, escalation))
+graph.node("proposal", ["scope", "phases", "cart", "overhead_percent", "burn"], proposal_document)
+graph.node("ai_prompt", ["scope", "phases", "cart", "overhead_percent"],
+           lambda scope, phases, cart, overhead: generate_ai_prompt(scope, phases, cart[0], cart[1], overhead))
+graph.node("ai_sections", ["scope", "phases", "cart", "overhead_percent"],
+           lambda scope, phases, cart, overhead: section_prompts(scope, phases, cart[0], cart[1], overhead))
 
 # ----------------- Define Tabs -----------------
 # Renaming Tab 2 to "Project Cart and Dashboard"
 tab0, tab1, tab2, tab3 = st.tabs(["📋 Scope Setup", "🧩 Manual Builder", "🛒 Project Cart and Dashboard", "📤 Exports"])
 
 # ----------------- Tab 0: Scope Setup -----------------
-with tab0:
+with tab0, span("tab", tab="scope_setup"):
     st.subheader("Define Project Scope")
     st.markdown("Enter high-level project details that will inform your proposal and planning. These details will automatically influence other sections of the app.")
     
@@ -204,22 +317,42 @@ with tab0:
     if len(st.session_state.phases) != num_phases:
         st.session_state.phases = [{"Title": "", "Description": "", "DurationWeeks": 4} for _ in range(num_phases)]
     
-    current_start = project_start_date
     for idx, phase in enumerate(st.session_state.phases):
         with st.expander(f"Phase {idx+1} Details"):
             phase_title = st.text_input("Phase Title", value=phase.get("Title", ""), key=f"phase_title_{idx}")
             phase_desc = st.text_area("Phase Description", value=phase.get("Description", ""), key=f"phase_desc_{idx}")
             duration_weeks = st.number_input("Duration (weeks)", min_value=1, value=phase.get("DurationWeeks", 4), key=f"duration_{idx}")
-            phase_end = current_start + timedelta(days=duration_weeks*7 - 1)
-            st.write(f"**Computed Phase Dates:** {current_start} to {phase_end}")
+            other_phases = [f"Phase {i+1}" for i in range(len(st.session_state.phases)) if i != idx]
+            default_deps = phase.get("DependsOn")
+            if default_deps is None:
+                default_deps = [idx - 1] if idx else []
+            depends_on = st.multiselect("Starts after", options=other_phases,
+                                        default=[f"Phase {i+1}" for i in default_deps if f"Phase {i+1}" in other_phases],
+                                        key=f"depends_{idx}")
+            depends_on = [int(label.split()[1]) - 1 for label in depends_on]
             st.session_state.phases[idx] = {
                 "Title": phase_title,
                 "Description": phase_desc,
-                "Start": current_start,
-                "End": phase_end,
-                "DurationWeeks": duration_weeks
+                "Start": phase.get("Start"),
+                "End": phase.get("End"),
+                "DurationWeeks": duration_weeks,
+                "DependsOn": depends_on
             }
-            current_start = phase_end + timedelta(days=1)
+    
+    # Phase dates come from the dependency schedule rather than a fixed end-to-end chain.
+    graph.set_input("project_start", project_start_date)
+    graph.set_input("study_months", study_length)
+    graph.set_input("phase_inputs", [{key: phase.get(key) for key in ("Title", "DurationWeeks", "DependsOn")}
+                                     for phase in st.session_state.phases])
+    phase_schedule, phase_cycle = graph.get("phase_schedule")
+    if phase_cycle:
+        st.error("Phase dependencies form a cycle: " + ", ".join(f"Phase {i+1}" for i in phase_cycle) + ". Phases are laid end to end until it is resolved.")
+    for phase, row in zip(st.session_state.phases, phase_schedule):
+        phase["Start"], phase["End"] = row["Start"], row["End"]
+    st.markdown("**Computed Phase Dates**")
+    st.dataframe([{"Phase": f"Phase {i+1}", "Title": row["Title"], "Start": row["Start"], "End": row["End"],
+                   "Slack (days)": int(row["Slack"]), "Critical": "Yes" if row["Critical"] else ""}
+                  for i, row in enumerate(phase_schedule)])
     
     st.markdown("---")
     st.markdown("### Broad Project Goals")
@@ -227,6 +360,7 @@ with tab0:
                                  value=st.session_state.scope_info.get("Project Goals", ""))
     
     if st.button("Save / Update Scope Setup"):
+        checkpoint()
         st.session_state.scope_info = {
             "Project Name": project_name,
             "Project Description": project_description,
@@ -243,21 +377,43 @@ with tab0:
         st.success("Scope Setup saved or updated!")
 
 # ----------------- Tab 1: Manual Builder -----------------
-with tab1:
+# A fragment: browsing, searching and simulating costs rerun only this tab.
+@st.fragment
+@timed("fragment", fragment="manual_builder")
+def manual_builder():
     st.subheader("Manual Builder & Service Selection")
+    if "builder_notice" in st.session_state:
+        st.success(st.session_state.pop("builder_notice"))
+    
+    st.markdown("#### Search the Task Library")
+    search_query = st.text_input("Search tasks", placeholder="e.g. focus group, IRB, survey", key="task_search_query")
+    if search_query:
+        search_results = catalog.search(search_query, limit=25)
+        if search_results:
+            def jump_to_search_result():
+                # Point the category/subcategory/task selectors at the chosen match before they render.
+                picked = catalog.records[st.session_state.task_search_pick]
+                st.session_state.builder_category = picked["Category"]
+                st.session_state.builder_subcategory = picked["Subcategory"]
+                st.session_state.builder_task = picked["Task Name"]
+            st.selectbox("Matching Tasks", [result.position for result in search_results], index=None,
+                         placeholder=f"{len(search_results)} match(es) — pick one to open it",
+                         format_func=lambda pos: f"{catalog.records[pos]['Task Name']} — {catalog.records[pos]['Category']}",
+                         key="task_search_pick", on_change=jump_to_search_result)
+        else:
+            st.caption("No matching tasks.")
     
     st.markdown("#### 1. Choose a Core Service Category")
-    core_categories = df_services["Category"].unique()
-    selected_category = st.selectbox("Core Category", core_categories)
+    core_categories = catalog.categories()
+    selected_category = st.selectbox("Core Category", core_categories, key="builder_category")
     
-    filtered_services = df_services[df_services["Category"] == selected_category]
-    if filtered_services["Subcategory"].nunique() > 1 or (filtered_services["Subcategory"].nunique() == 1 and filtered_services.iloc[0]["Subcategory"] != ""):
-        subcategories = filtered_services["Subcategory"].unique()
-        selected_subcategory = st.selectbox("Subcategory", subcategories)
-        filtered_services = filtered_services[filtered_services["Subcategory"] == selected_subcategory]
+    selected_subcategory = None
+    if catalog.has_subcategories(selected_category):
+        subcategories = catalog.subcategories(selected_category)
+        selected_subcategory = st.selectbox("Subcategory", subcategories, format_func=lambda sub: sub or "General", key="builder_subcategory")
     
-    selected_task = st.selectbox("Select Task", filtered_services["Task Name"].unique())
-    task_info = filtered_services[filtered_services["Task Name"] == selected_task].iloc[0]
+    selected_task = st.selectbox("Select Task", catalog.task_names(selected_category, selected_subcategory), key="builder_task")
+    task_info = catalog.task(selected_category, selected_subcategory, selected_task)
     
     overrides = st.session_state.task_modifiers.get(selected_task, {})
     effective_hours = overrides.get("Estimated Hours", task_info.get("Estimated Hours", 0))
@@ -298,33 +454,27 @@ with tab1:
     
     st.markdown("---")
     st.markdown("### Cost Simulation")
-    if task_info["Category"] == "Data Collection & Management":
-        if task_info["Subcategory"] == "Self-Reported Survey":
-            num_units = st.number_input("Number of Surveys", min_value=1, value=st.session_state.scope_info.get("Estimated N", 50))
-            labor_cost, t1, t2, t3 = compute_task_cost(task_info["Category"], task_info["Subcategory"], num_units, st.session_state.task_modifiers.get(selected_task, {}))
-            direct_cost = labor_cost  # Direct cost (without overhead)
-            st.markdown(f"**Computed Labor Cost:** ${labor_cost:,.2f}")
-            st.markdown(f"Breakdown: Tier 1 = {t1} hrs, Tier 2 = {t2} hrs, Tier 3 = {t3} hrs")
-            st.markdown(f"**Direct Cost:** ${direct_cost:,.2f}")
-            quantity = num_units
-        elif task_info["Subcategory"] == "Clinical Measure":
-            num_units = st.number_input("Number of Tests", min_value=1, value=5)
-            labor_cost, t1, t2, t3 = compute_task_cost(task_info["Category"], task_info["Subcategory"], num_units, st.session_state.task_modifiers.get(selected_task, {}))
-            direct_cost = labor_cost
-            st.markdown(f"**Computed Labor Cost:** ${labor_cost:,.2f}")
-            st.markdown(f"Breakdown: Tier 1 = {t1} hrs, Tier 2 = {t2} hrs, Tier 3 = {t3} hrs")
-            st.markdown(f"**Direct Cost:** ${direct_cost:,.2f}")
-            quantity = num_units
-        else:
-            quantity = st.number_input("Quantity", min_value=1, value=1)
-            direct_cost = effective_base_cost * quantity
-            st.markdown(f"**Direct Cost:** ${direct_cost:,.2f}")
+    rate_templates = default_templates()
+    template_key = (task_info["Category"], task_info["Subcategory"])
+    if template_key in rate_templates.template_priced:
+        default_units = rate_templates.default_units[template_key] or st.session_state.scope_info.get("Estimated N", 50)
+        num_units = st.number_input(f"Number of {rate_templates.unit_labels[template_key]}", min_value=1, value=int(default_units))
+        labor_cost, t1, t2, t3 = simulated_task_cost(task_info["Category"], task_info["Subcategory"], num_units, st.session_state.task_modifiers.get(selected_task, {}))
+        direct_cost = labor_cost  # Direct cost (without overhead)
+        st.markdown(f"**Computed Labor Cost:** ${labor_cost:,.2f}")
+        st.markdown(f"Breakdown: Tier 1 = {t1} hrs, Tier 2 = {t2} hrs, Tier 3 = {t3} hrs")
+        st.markdown(f"**Direct Cost:** ${direct_cost:,.2f}")
+        quantity = num_units
     else:
         quantity = st.number_input("Quantity", min_value=1, value=1)
         direct_cost = effective_base_cost * quantity
         st.markdown(f"**Direct Cost:** ${direct_cost:,.2f}")
     
-    if st.button("➕ Add Task to Project"):
+    cannot_price = unpriced(task_info, overrides, rate_templates.template_priced)
+    if cannot_price:
+        st.warning("This task has no Estimated Hours or known staff role in the task library, so it has no "
+                   "Base Cost. Set one under Edit Task Details before adding it.")
+    if st.button("➕ Add Task to Project", disabled=cannot_price):
         task_entry = {
             "Category": task_info["Category"],
             "Subcategory": task_info["Subcategory"],
@@ -335,11 +485,229 @@ with tab1:
         }
         if phase_assignment:
             task_entry["Phase"] = phase_assignment
-        st.session_state.sprint_log.append(task_entry)
-        st.success("Task added to project!")
+        checkpoint()
+        add_to_cart(st.session_state.sprint_log, st.session_state.cart_totals, task_entry)
+        if st.session_state.project_id is not None:
+            project_store.queue_add_line(st.session_state.project_id, task_entry)
+        # The cart feeds the sidebar and the other tabs, so this change reruns the whole app.
+        st.session_state.builder_notice = "Task added to project!"
+        st.rerun()
+
+with tab1, span("tab", tab="manual_builder"):
+    manual_builder()
 
 # ----------------- Tab 2: Project Cart and Dashboard -----------------
-with tab2:
+@st.fragment
+@timed("fragment", fragment="cart_editor")
+def cart_editor():
+    # A fragment: paging through and editing the table reruns only the table until changes are applied.
+    st.markdown("### Project Cart")
+    cart_size = len(st.session_state.sprint_log)
+    page_cols = st.columns(2)
+    with page_cols[0]:
+        page_size = st.selectbox("Rows per Page", [25, 50, 100, 250], index=1, key="cart_page_size")
+    page_count = (cart_size - 1) // page_size + 1
+    with page_cols[1]:
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="cart_page") if page_count > 1 else 1
+    page_start = (page - 1) * page_size
+    page_rows = graph.get("cart_rows")[page_start:page_start + page_size]
+    phase_titles = [phase["Title"] for phase in st.session_state.phases if phase.get("Title")]
+    # A new key after every applied edit resets the editor to the updated cart.
+    editor_key = f"cart_editor_{st.session_state.cart_editor_version}_{page}"
+    st.data_editor(
+        page_rows,
+        column_config={
+            "Remove": st.column_config.CheckboxColumn("Remove"),
+            "Phase": st.column_config.SelectboxColumn("Phase", options=[""] + phase_titles),
+            "Quantity": st.column_config.NumberColumn("Quantity", min_value=1, step=1),
+            "Direct Cost": st.column_config.NumberColumn("Direct Cost", format="$%.2f"),
+            "Total Cost": st.column_config.NumberColumn("Total Cost", format="$%.2f"),
+        },
+        disabled=["Task", "Category", "Direct Cost", "Total Cost", "Notes"],
+        hide_index=True, key=editor_key)
+    st.caption(f"Lines {page_start + 1}–{page_start + len(page_rows)} of {cart_size}. Apply edits before changing pages.")
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    if st.button("Apply Cart Changes", disabled=not edited_rows):
+        cart_updates, cart_removals = {}, []
+        for row, changes in edited_rows.items():
+            idx = page_start + int(row)
+            if changes.get("Remove"):
+                cart_removals.append(idx)
+            fields = {field: changes[field] for field in ("Quantity", "Phase") if field in changes}
+            if fields:
+                cart_updates[idx] = fields
+        checkpoint()
+        updated, removed = edit_cart(st.session_state.sprint_log, st.session_state.cart_totals,
+                                     cart_updates, cart_removals, rate_card)
+        if st.session_state.project_id is not None:
+            project_store.edit_lines(st.session_state.project_id,
+                                     {idx: st.session_state.sprint_log[idx - sum(r < idx for r in removed)] for idx in updated},
+                                     removed)
+        st.session_state.cart_editor_version += 1
+        st.rerun()
+
+
+@st.fragment
+@timed("fragment", fragment="sensitivity_sweep")
+def sensitivity_sweep():
+    with st.expander("What-If Sensitivity Sweep"):
+        st.markdown("Evaluate the current cart across ranges of rates, overhead, sample size and unit price in one pass.")
+        sweep_base = {"tier1_rate": tier1_rate, "tier2_rate": tier2_rate, "tier3_rate": tier3_rate,
+                      "overhead_percent": overhead_percent,
+                      "sample_size": scope.get("Estimated N", target_sample_size), "unit_price": unit_price}
+        sweep_budget = scope.get("Budget Estimate", rough_budget)
+        spread_cols = st.columns(3)
+        spreads = {}
+        for i, (name, default_spread) in enumerate([("tier1_rate", 20), ("tier2_rate", 20), ("tier3_rate", 20),
+                                                    ("overhead_percent", 10), ("sample_size", 50), ("unit_price", 0)]):
+            with spread_cols[i % 3]:
+                spreads[name] = st.number_input(f"{PARAMETER_LABELS[name]} ± %", min_value=0, max_value=100,
+                                                value=default_spread, key=f"sweep_spread_{name}")
+        include_unit_price = st.checkbox("Charge the Unit Price for each of the N sample units", key="sweep_unit_price")
+        sweep_mode = st.radio("Sweep Type", ["Grid", "Monte Carlo"], horizontal=True, key="sweep_mode")
+        if sweep_mode == "Grid":
+            sweep_steps = st.number_input("Points per Parameter", min_value=2, max_value=25, value=7, key="sweep_steps")
+        else:
+            sweep_samples = st.number_input("Scenarios", min_value=1000, max_value=20_000_000, value=200_000, step=10_000, key="sweep_samples")
+        if st.button("Run Sweep"):
+            cost_model = build_cost_model(st.session_state.sprint_log, sweep_base["sample_size"], include_unit_price)
+            sweep_ranges = ranges_around(sweep_base, spreads)
+            if sweep_mode == "Grid" and grid_size(sweep_ranges, sweep_steps) > MAX_GRID_SCENARIOS:
+                st.info(f"{sweep_steps} points per parameter makes a {grid_size(sweep_ranges, sweep_steps):,}-scenario grid; "
+                        f"sampling {MAX_GRID_SCENARIOS:,} Monte Carlo scenarios over the same ranges instead.")
+                scenario_totals = monte_carlo_sweep(cost_model, sweep_ranges, MAX_GRID_SCENARIOS)
+            elif sweep_mode == "Grid":
+                scenario_totals = grid_sweep(cost_model, sweep_ranges, sweep_steps)
+            else:
+                scenario_totals = monte_carlo_sweep(cost_model, sweep_ranges, sweep_samples)
+            summary = summarize(scenario_totals, sweep_budget)
+            metric_cols = st.columns(4)
+            metric_cols[0].metric("Median Total", f"${summary['median']:,.0f}")
+            metric_cols[1].metric("5th–95th Percentile", f"${summary['p5']:,.0f} – ${summary['p95']:,.0f}")
+            if "within_budget" in summary:
+                metric_cols[2].metric("Scenarios Within Budget", f"{summary['within_budget']:.0%}")
+            fitting_n = max_sample_size(cost_model, sweep_base, sweep_budget) if sweep_budget else None
+            metric_cols[3].metric("Max N Within Budget", "—" if fitting_n is None else f"{fitting_n:,}" if fitting_n != float("inf") else "Unlimited")
+            counts, edges = np.histogram(scenario_totals, bins=40)
+            st.image(cost_histogram_png(edges.tolist(), counts.tolist(), sweep_budget or None))
+            _, base_total = evaluate(cost_model, {name: np.array([float(value)]) for name, value in sweep_base.items()})
+            bars = [(PARAMETER_LABELS[name], low, high) for name, low, high in tornado(cost_model, sweep_base, sweep_ranges)]
+            if bars:
+                st.image(tornado_png(float(base_total[0]), bars))
+            st.caption(f"{summary['scenarios']:,} scenarios evaluated.")
+
+
+@st.fragment
+@timed("fragment", fragment="budget_optimizer")
+def budget_optimizer():
+    with st.expander("Budget Optimizer"):
+        st.markdown("Build a cart from the task library that maximizes coverage (or your weights) within the budget, overhead included.")
+        optimizer_budget = st.number_input("Budget ($)", min_value=0.0, value=float(scope.get("Budget Estimate", 0) or 0), step=1000.0, key="optimizer_budget")
+        required_categories = st.multiselect("Required Categories", catalog.categories(), key="optimizer_required")
+        keep_cart = st.checkbox("Keep the current cart lines", value=True, key="optimizer_keep_cart")
+        template_units = int(scope.get("Estimated N", target_sample_size) or 1)
+        st.caption(f"A task earns its full weight at its Max Qty. Template-priced tasks (surveys, clinical measures) default to 0–{template_units} units.")
+        optimizer_table = st.data_editor(
+            [{"Category": choice.category, "Task": choice.task, "Weight": choice.weight, "Min Qty": choice.min_qty, "Max Qty": choice.max_qty}
+             for choice in choices_from_catalog(catalog, st.session_state.task_modifiers, template_units=template_units)],
+            disabled=["Category", "Task"], key="optimizer_table")
+        if st.button("Optimize Cart"):
+            choices = choices_from_catalog(
+                catalog, st.session_state.task_modifiers,
+                weights={row["Task"]: row["Weight"] for row in optimizer_table},
+                bounds={row["Task"]: (row["Min Qty"], row["Max Qty"]) for row in optimizer_table},
+                template_units=template_units)
+            st.session_state.optimized_cart = optimize_cart(
+                choices, optimizer_budget, overhead_percent, required_categories,
+                st.session_state.sprint_log if keep_cart else (), rate_card)
+        optimized = st.session_state.get("optimized_cart")
+        if optimized is not None:
+            if not optimized.feasible:
+                st.error(optimized.message)
+            elif optimized.message:
+                st.warning(optimized.message)
+            metric_cols = st.columns(3)
+            metric_cols[0].metric("Optimized Total", f"${optimized.total_cost:,.2f}")
+            metric_cols[1].metric("Tasks", len(optimized.lines))
+            metric_cols[2].metric("Value Score", f"{optimized.value:,.1f}")
+            st.dataframe([{"Category": line["Category"], "Task": line["Task"], "Quantity": line["Quantity"],
+                           "Direct Cost": line["Direct Cost"]} for line in optimized.lines])
+            st.caption(f"Solved with the {optimized.method} method.")
+            if optimized.feasible and st.button("Use This Cart"):
+                checkpoint()
+                st.session_state.sprint_log = [dict(line) for line in optimized.lines]
+                st.session_state.cart_totals = CartTotals.from_lines(st.session_state.sprint_log)
+                if st.session_state.project_id is not None:
+                    project_store.save_project(st.session_state.scope_info, st.session_state.phases, st.session_state.sprint_log,
+                                               st.session_state.task_modifiers, overhead_percent, st.session_state.project_id)
+                del st.session_state.optimized_cart
+                st.session_state.cart_editor_version += 1
+                st.rerun()
+
+
+@st.fragment
+@timed("fragment", fragment="scenario_manager")
+def scenario_manager():
+    # A fragment: naming, saving and comparing scenarios rerun only this panel; switching reruns the app.
+    with st.expander("🔀 Scenarios"):
+        st.markdown("Save the current cart, phases and scope as a named scenario (e.g. *Expedited* or *N=500*), "
+                    "switch between scenarios, and compare their costs by category and phase.")
+        scenarios = st.session_state.scenarios
+        scenario_name = st.text_input("Scenario Name", key="scenario_name")
+        if st.button("Save Current as Scenario"):
+            label = scenario_name.strip() or f"Scenario {len(scenarios) + 1}"
+            if label == CURRENT_SCENARIO:
+                label += " (saved)"
+            scenarios[label] = current_snapshot(label)
+            st.success(f"Saved scenario {label!r}.")
+        if not scenarios:
+            return
+        picked = st.selectbox("Saved Scenario", list(scenarios), key="scenario_pick")
+        switch_col, delete_col = st.columns(2)
+        if switch_col.button("Switch to Scenario"):
+            checkpoint()
+            restore_snapshot(scenarios[picked])
+            st.rerun()
+        if delete_col.button("Delete Scenario"):
+            del scenarios[picked]
+            st.rerun()
+
+        compared = st.multiselect("Compare", [CURRENT_SCENARIO] + list(scenarios), default=[CURRENT_SCENARIO, picked],
+                                  key="scenario_compare", help="Differences are shown against the first scenario listed.")
+        if len(compared) >= 2:
+            snapshots = [current_snapshot(CURRENT_SCENARIO) if name == CURRENT_SCENARIO else scenarios[name]
+                         for name in compared]
+            summary_rows, category_rows, phase_rows = compare_snapshots(snapshots, overhead_percent)
+            st.dataframe(summary_rows)
+            st.markdown("**Direct Cost by Category**")
+            st.dataframe(category_rows)
+            if phase_rows:
+                st.markdown("**Direct Cost by Phase**")
+                st.dataframe(phase_rows)
+
+
+@st.fragment
+@timed("fragment", fragment="compare_saved_projects")
+def compare_saved_projects():
+    with st.expander("Compare Saved Projects"):
+        compared = st.multiselect("Projects to Compare", saved_projects,
+                                  format_func=lambda p: f"{p['name'] or 'Untitled'} (#{p['id']})")
+        if compared:
+            compared_ids = [p["id"] for p in compared]
+            by_category = project_store.cost_by_category(compared_ids)
+            by_phase = project_store.cost_by_phase(compared_ids)
+            st.markdown("**Totals**")
+            st.dataframe([{"Project": p["name"], "Partner": p["partner"], "Lines": p["lines"],
+                           "Direct Cost": p["direct_cost"], "Overhead": p["overhead"], "Total Cost": p["total_cost"]}
+                          for p in compared])
+            st.markdown("**Direct Cost by Category**")
+            st.dataframe([{"Project": p["name"], **by_category[p["id"]]} for p in compared])
+            st.markdown("**Direct Cost by Phase**")
+            st.dataframe([{"Project": p["name"], **{phase or "(No Phase)": cost for phase, cost in by_phase[p["id"]].items()}}
+                          for p in compared])
+
+
+with tab2, span("tab", tab="cart_dashboard"):
     st.subheader("Project Cart and Dashboard")
     
     scope = st.session_state.scope_info
@@ -362,66 +730,139 @@ with tab2:
         st.markdown(scope.get("Project Goals", ""))
     
     if st.session_state.sprint_log:
-        st.markdown("### Project Cart")
-        for idx, task in enumerate(st.session_state.sprint_log):
-            col1, col2 = st.columns([8, 2])
-            with col1:
-                phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
-                st.markdown(f"**{task['Task']}** (Category: {task['Category']}){phase_info} — Qty: {task['Quantity']}, Direct Cost: ${task['Direct Cost']}, Total Cost: ${round(task['Direct Cost']*(1+overhead_percent/100),2)}")
-                if task.get("Modifiers"):
-                    st.markdown(f"*Modifiers:* {task['Modifiers'].get('Custom Notes', '')}")
-            with col2:
-                if st.button("Remove", key=f"remove_task_{idx}"):
-                    st.session_state.sprint_log.pop(idx)
-                    st.experimental_rerun()
-                    
-        df_log = pd.DataFrame(st.session_state.sprint_log)
-        total_direct_cost = df_log["Direct Cost"].sum() if not df_log.empty else 0
-        overhead_amount = total_direct_cost * (overhead_percent / 100)
-        total_project_cost = total_direct_cost + overhead_amount
+        cart_editor()
+        
+        cart_summary = st.session_state.cart_totals
+        total_direct_cost = cart_summary.direct_cost
+        overhead_amount = cart_summary.overhead(overhead_percent)
+        total_project_cost = cart_summary.total(overhead_percent)
         st.markdown(f"**Total Direct Cost:** ${total_direct_cost:,.2f}")
         st.markdown(f"**Overhead:** ${overhead_amount:,.2f}")
         st.markdown(f"**Total Project Cost:** ${total_project_cost:,.2f}")
         if scope and total_project_cost > scope.get("Budget Estimate", float('inf')):
             st.warning("Total project cost exceeds your rough budget estimate. Consider adjusting your cart.")
         
-        cost_by_category = df_log.groupby("Category")["Direct Cost"].sum().reset_index()
-        fig, ax = plt.subplots(figsize=(5, 3))
-        ax.bar(cost_by_category["Category"], cost_by_category["Direct Cost"])
-        ax.set_xlabel("Category")
-        ax.set_ylabel("Direct Cost ($)")
-        ax.set_title("Direct Cost by Category")
-        st.pyplot(fig)
+        st.image(graph.get("category_chart"))
         
-        if "Phase" in df_log.columns and df_log["Phase"].notna().any():
-            cost_by_phase = df_log.groupby("Phase")["Direct Cost"].sum()
-            fig2, ax2 = plt.subplots()
-            ax2.pie(cost_by_phase, labels=cost_by_phase.index, autopct="%1.1f%%", startangle=90)
-            ax2.set_title("Direct Cost Distribution by Phase")
-            st.pyplot(fig2)
+        phase_chart = graph.get("phase_chart")
+        if phase_chart:
+            st.image(phase_chart)
         
-        phases_list = [phase for phase in st.session_state.phases if phase.get("Title")]
-        if phases_list:
+        gantt = graph.get("gantt")
+        if gantt:
             st.markdown("### Project Timeline (Gantt Chart)")
-            fig3, ax3 = plt.subplots(figsize=(10, len(phases_list) * 0.5 + 1))
-            for i, phase in enumerate(phases_list):
-                if phase["Start"] and phase["End"]:
-                    start_num = mdates.date2num(phase["Start"])
-                    end_num = mdates.date2num(phase["End"])
-                    duration = end_num - start_num
-                    ax3.barh(i, duration, left=start_num, height=0.3, color="skyblue")
-                    ax3.text(start_num + duration/2, i, phase["Title"], va="center", ha="center", color="black")
-            ax3.set_yticks(range(len(phases_list)))
-            ax3.set_yticklabels([phase["Title"] for phase in phases_list])
-            ax3.xaxis_date()
-            ax3.set_xlabel("Date")
-            ax3.set_title("Project Timeline")
-            st.pyplot(fig3)
+            if gantt["caption"]:
+                st.caption(gantt["caption"])
+            st.image(gantt["png"])
+            st.markdown(f"**Scheduled Finish:** {gantt['finish']} ({gantt['critical']} activities on the critical path)")
+            if gantt["finish"] > project_end_date:
+                st.warning("The dependency schedule runs past the computed project end date.")
+            if gantt["warnings"]:
+                st.warning("Some task dependencies couldn't be scheduled:\n" + "\n".join(f"- {w}" for w in gantt["warnings"]))
+        
+        st.markdown("### Projected Spending")
+        burn_period = st.radio("Period", ["Monthly", "Quarterly"], horizontal=True, key="burn_period")
+        burn_periods = (monthly if burn_period == "Monthly" else quarterly)(graph.get("burn"))
+        st.image(burn_png(burn_periods))
+        st.caption(f"The chart shows direct costs; the table adds {overhead_percent}% overhead.")
+        st.dataframe([{"Period": label, "Direct Cost": round(float(direct), 2), "Overhead": round(float(overhead), 2),
+                       "Total Cost": round(float(total), 2), "Cumulative": round(float(cumulative), 2)}
+                      for label, direct, overhead, total, cumulative in zip(*burn_periods)])
+        if escalation_percent:
+            st.caption(f"With {escalation_percent}% annual escalation the projected total is "
+                       f"${burn_periods.cumulative[-1]:,.2f}.")
+        
+        sensitivity_sweep()
     else:
         st.info("No tasks have been added to the project yet.")
+    
+    budget_optimizer()
+    
+    scenario_manager()
+    
+    if saved_projects:
+        compare_saved_projects()
 
 # ----------------- Tab 3: Exports & Proposal Generation -----------------
-with tab3:
+@st.fragment
+@timed("fragment", fragment="ai_proposal")
+def ai_proposal():
+    # AI Proposal Generation Section
+    parallel_sections = st.checkbox("Generate sections in parallel",
+                                    help="Writes each proposal section with its own request, all at once, instead of one long completion.")
+
+    if st.button("Generate Proposal with AI"):
+        settings = ai_settings()
+        if settings is None:
+            st.warning("AI generation isn't configured: add an [openai] section with an api_key to the Streamlit secrets.")
+            return
+        ai_backend, ai_params, ai_retry = settings
+        if parallel_sections:
+            sections = graph.get("ai_sections")
+            with st.expander("Prompts sent to AI"):
+                for title, prompt in sections:
+                    st.markdown(f"**{title}**")
+                    st.code(prompt)
+            # One placeholder per section, filled in as each request completes.
+            section_placeholders = [st.empty() for _ in sections]
+            for placeholder, (title, _) in zip(section_placeholders, sections):
+                placeholder.info(f"Writing {title}…")
+            try:
+                results = asyncio.run(generate_sections(
+                    sections, ai_backend, ai_params, cache=ai_cache, retry=ai_retry,
+                    on_section=lambda idx, title, text: section_placeholders[idx].markdown(f"## {title}\n\n{text}")))
+            except AIGenerationError as e:
+                st.error(str(e))
+            else:
+                for placeholder in section_placeholders:
+                    placeholder.empty()
+                st.text_area("AI-Generated Proposal", assemble_sections(results), height=400)
+        else:
+            prompt = graph.get("ai_prompt")
+            st.markdown("**Prompt sent to AI:**")
+            st.code(prompt)
+            # Tokens are streamed into the placeholder, which becomes the text area once the reply is complete.
+            proposal_placeholder = st.empty()
+            try:
+                ai_proposal, from_cache = generate_completion(
+                    prompt, ai_backend, ai_params, cache=ai_cache, retry=ai_retry,
+                    on_text=lambda text: proposal_placeholder.markdown(text + "▌"))
+            except AIGenerationError as e:
+                proposal_placeholder.error(str(e))
+            else:
+                proposal_placeholder.text_area("AI-Generated Proposal", ai_proposal, height=400)
+                if from_cache:
+                    st.caption("Loaded from the proposal cache; the same prompt and model settings were generated before.")
+
+
+@st.fragment
+@timed("fragment", fragment="proposal_downloads")
+def proposal_downloads():
+    st.markdown("---")
+    st.markdown("### Proposal Document")
+    export_formats = ["Markdown", "HTML", "Budget CSV"]
+    if importlib.util.find_spec("openpyxl") is not None:
+        export_formats.append("Budget XLSX")
+    export_format = st.selectbox("Export Format", export_formats)
+    proposal_model, proposal_markdown, _ = graph.get("proposal")
+    if export_format == "Markdown":
+        st.download_button("Download Proposal Markdown", proposal_markdown, file_name="proposal.md", mime="text/markdown")
+    elif export_format == "HTML":
+        html_buffer = io.StringIO()
+        write_html(proposal_model, html_buffer)
+        st.download_button("Download Proposal HTML", html_buffer.getvalue(), file_name="proposal.html", mime="text/html")
+    elif export_format == "Budget CSV":
+        csv_buffer = io.StringIO()
+        write_budget_csv(proposal_model, csv_buffer)
+        st.download_button("Download Budget CSV", csv_buffer.getvalue(), file_name="proposal_budget.csv", mime="text/csv")
+    else:
+        xlsx_buffer = io.BytesIO()
+        write_budget_xlsx(proposal_model, xlsx_buffer)
+        st.download_button("Download Budget XLSX", xlsx_buffer.getvalue(), file_name="proposal_budget.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+with tab3, span("tab", tab="exports"):
     st.subheader("Export & Proposal Generation")
     scope = st.session_state.scope_info
     sprint_log = st.session_state.sprint_log
@@ -448,127 +889,45 @@ with tab3:
     
     st.markdown("---")
     st.markdown("### Task Breakdown")
+    _, proposal_markdown, proposal_spans = graph.get("proposal")
     if sprint_log:
-        for task in sprint_log:
-            phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
-            st.markdown(f"**{task['Task']}** (Category: {task['Category']}){phase_info} — Qty: {task['Quantity']}, Direct Cost: ${task['Direct Cost']}, Total Cost: ${round(task['Direct Cost']*(1+overhead_percent/100),2)}")
-            if task.get("Modifiers"):
-                st.markdown(f"*Modifiers:* {task['Modifiers'].get('Custom Notes', '')}")
+        tasks_start, tasks_end = proposal_spans["tasks"]
+        st.markdown(proposal_markdown[tasks_start:tasks_end])
     else:
         st.info("No tasks added to the project.")
     
-    # AI Proposal Generation Section
-    def generate_ai_prompt(scope, sprint_log):
-        historical_inspiration = (
-            "Our previous proposal, 'A Vision for the Development of a Protocol for a Longitudinal Healthy Aging Study in The Villages, Florida,' "
-            "was structured around key sections including Approach, Proposed Work Plan, Project Timeline, Coordination Plan, Budget/Cost-Estimate, "
-            "Material Assumptions, Staffing and Roles, and Prior Work & Established Expertise. These themes should inspire the tone, depth, and structure of the new proposal."
-        )
-        prompt = f"Generate a detailed, professional proposal for the following project using the provided structured data and historical inspiration.\n\n"
-        prompt += f"Project Name: {scope.get('Project Name', 'Untitled Project')}\n"
-        prompt += f"Project Description: {scope.get('Project Description', '')}\n"
-        prompt += f"Partner: {scope.get('Partner Name', 'N/A')}\n"
-        prompt += f"Project Type: {scope.get('Project Type', 'N/A')}\n"
-        prompt += f"Target Sample Size: {scope.get('Estimated N', 'N/A')}\n"
-        prompt += f"Budget: ${scope.get('Budget Estimate', 'N/A')}\n"
-        prompt += f"Study Length: {scope.get('Study Length (Months)', 'N/A')} months (from {scope.get('Project Start Date', 'N/A')} to {scope.get('Project End Date', 'N/A')})\n\n"
-        
-        prompt += "Phases:\n"
-        for phase in st.session_state.phases:
-            if phase.get("Title"):
-                prompt += f"- {phase['Title']}: {phase['Description']} (from {phase['Start']} to {phase['End']})\n"
-        prompt += "\nTasks:\n"
-        for task in sprint_log:
-            phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
-            prompt += f"- {task['Task']}{phase_info}: Quantity {task['Quantity']}, Direct Cost ${task['Direct Cost']}\n"
-            if task.get("Modifiers"):
-                prompt += f"  - Notes: {task['Modifiers'].get('Custom Notes', '')}\n"
-        prompt += "\nCost Summary:\n"
-        df_log = pd.DataFrame(sprint_log)
-        total_direct_cost = df_log["Direct Cost"].sum() if not df_log.empty else 0
-        overhead_amount = total_direct_cost * (overhead_percent / 100)
-        total_project_cost = total_direct_cost + overhead_amount
-        prompt += f"Total Direct Cost: ${total_direct_cost:,.2f}\n"
-        prompt += f"Overhead ({overhead_percent}%): ${overhead_amount:,.2f}\n"
-        prompt += f"Total Project Cost: ${total_project_cost:,.2f}\n\n"
-        
-        prompt += "Historical Inspiration:\n"
-        prompt += historical_inspiration + "\n\n"
-        
-        prompt += ("Based on these details, generate a detailed proposal narrative that includes the following sections: "
-                   "Introduction, Approach, Proposed Work Plan, Project Timeline, Coordination Plan, Budget/Cost-Estimate, "
-                   "Material Assumptions, Staffing and Roles, and Prior Work & Established Expertise. The narrative should be persuasive, "
-                   "professional, and structured for a multi-page document.")
-        return prompt
-
-    if st.button("Generate Proposal with AI"):
-        scope = st.session_state.scope_info
-        sprint_log = st.session_state.sprint_log
-        prompt = generate_ai_prompt(scope, sprint_log)
-        st.markdown("**Prompt sent to AI:**")
-        st.code(prompt)
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1500,
-            temperature=0.7
-        )
-        ai_proposal = response.choices[0].message.content.strip()
-        st.text_area("AI-Generated Proposal", ai_proposal, height=400)
+    ai_proposal()
     
-    if st.button("Generate Proposal Document"):
-        def generate_proposal(scope, sprint_log):
-            proposal = ""
-            proposal += "# Proposal for " + scope.get("Project Name", "Untitled Project") + "\n\n"
-            proposal += "## Introduction\n"
-            proposal += ("This proposal outlines our comprehensive approach for the project, including methodology, timeline, and cost breakdown. "
-                         "Our team is committed to delivering high-quality outcomes tailored to your needs.\n\n")
-            proposal += "## Project Overview\n"
-            proposal += f"- **Partner:** {scope.get('Partner Name', '')}\n"
-            proposal += f"- **Project Type:** {scope.get('Project Type', '')}\n"
-            proposal += f"- **Target Sample Size (N):** {scope.get('Estimated N', '')}\n"
-            proposal += f"- **Timeline:** {scope.get('Timeline', '')}\n"
-            proposal += f"- **Study Length (Months):** {scope.get('Study Length (Months)', '')}\n"
-            proposal += f"- **Budget Estimate:** ${scope.get('Budget Estimate', 0):,}\n"
-            proposal += f"- **Project Dates:** {scope.get('Project Start Date', '')} to {scope.get('Project End Date', '')}\n\n"
-            
-            proposal += "## Project Phases\n"
-            for phase in st.session_state.phases:
-                if phase.get("Title"):
-                    proposal += f"### {phase['Title']}\n"
-                    proposal += f"{phase['Description']}\n"
-                    proposal += f"**Dates:** {phase['Start']} to {phase['End']}\n\n"
-            
-            proposal += "## Broad Project Goals\n"
-            proposal += scope.get("Project Goals", "") + "\n\n"
-            
-            proposal += "## Detailed Task Breakdown\n"
-            for task in sprint_log:
-                phase_info = f" (Phase: {task.get('Phase')})" if task.get("Phase") else ""
-                proposal += f"### {task['Task']} (Category: {task['Category']}){phase_info}\n"
-                proposal += f"- **Quantity:** {task['Quantity']}\n"
-                proposal += f"- **Direct Cost:** ${task['Direct Cost']}\n"
-                proposal += f"- **Total Cost (with overhead):** ${round(task['Direct Cost']*(1+overhead_percent/100),2)}\n"
-                if task.get("Modifiers"):
-                    proposal += f"- **Modifiers:** {task['Modifiers'].get('Custom Notes', '')}\n"
-                proposal += "\n"
-            df_log = pd.DataFrame(sprint_log)
-            if "Direct Cost" not in df_log.columns:
-                df_log["Direct Cost"] = 0
-            total_direct_cost = df_log["Direct Cost"].sum()
-            overhead_amount = total_direct_cost * (overhead_percent / 100)
-            total_project_cost = total_direct_cost + overhead_amount
-            proposal += "## Cost Breakdown\n"
-            proposal += f"**Total Direct Cost:** ${total_direct_cost:,.2f}\n\n"
-            proposal += f"**Overhead ({overhead_percent}%):** ${overhead_amount:,.2f}\n\n"
-            proposal += f"**Total Project Cost:** ${total_project_cost:,.2f}\n\n"
-            proposal += "## Timeline & Deliverables\n"
-            proposal += "A detailed timeline and deliverables will be provided upon project initiation.\n\n"
-            proposal += "## Conclusion\n"
-            proposal += ("Based on our experience and the defined scope, we are confident that our approach will maximize ROI "
-                         "and deliver actionable outcomes for your organization.\n\n")
-            proposal += "*(End of Proposal)*\n"
-            return proposal
-        
-        prop_text = generate_proposal(st.session_state.scope_info, st.session_state.sprint_log)
-        st.download_button("Download Proposal Markdown", prop_text, file_name="proposal.md")
+    proposal_downloads()
+
+# ----------------- Running Cost Summary -----------------
+# Filled last so it reflects any cart edits made during this rerun.
+with cost_container:
+    totals = st.session_state.cart_totals
+    st.header("💰 Running Cost Summary")
+    st.markdown(f"**Tasks in Cart:** {totals.line_count}")
+    st.markdown(f"**Direct Cost:** ${totals.direct_cost:,.2f}")
+    st.markdown(f"**Total with Overhead:** ${totals.total(overhead_percent):,.2f}")
+
+# ----------------- Debug / Metrics Panel -----------------
+# Spans and counters are process-wide; set PROPOSAL_METRICS_LOG to also append them to a JSON-lines file.
+registry.observe("app_rerun", time.perf_counter() - rerun_started)
+with st.sidebar:
+    if st.checkbox("Show debug metrics", key="show_debug_metrics"):
+        with st.expander("🐞 Debug / Metrics", expanded=True):
+            metrics_snapshot = snapshot()
+            st.markdown("**Timing spans**")
+            st.dataframe([{"Span": s["name"], "Labels": ", ".join(f"{k}={v}" for k, v in s["labels"].items()),
+                           "Count": s["count"], "Total (ms)": round(s["total_seconds"] * 1000, 1),
+                           "Mean (ms)": round(s["mean_seconds"] * 1000, 2), "Max (ms)": round(s["max_seconds"] * 1000, 1)}
+                          for s in metrics_snapshot["spans"]])
+            st.markdown("**Counters**")
+            st.dataframe([{"Counter": c["name"], "Labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()),
+                           "Value": c["value"]} for c in metrics_snapshot["counters"]])
+            st.markdown("**Recent spans**")
+            st.dataframe([{"Span": s["span"], "Labels": ", ".join(f"{k}={v}" for k, v in s["labels"].items()),
+                           "ms": round(s["seconds"] * 1000, 2)} for s in reversed(list(registry.recent))][:50])
+            st.download_button("Download Prometheus Metrics", prometheus_text(), file_name="metrics.prom",
+                               mime="text/plain")
+            st.download_button("Download Metrics JSON", json.dumps(metrics_snapshot, indent=2),
+                               file_name="metrics.json", mime="application/json")